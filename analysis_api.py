@@ -0,0 +1,428 @@
+"""
+Local HTTP API around the content analysis engines
+
+Lets other systems (CMS hooks, the publishing pipeline) analyze content
+without the Streamlit UI. Responses carry the same record the app saves
+(build_analysis_result, build_competitor_analysis, build_persona_analysis).
+
+    POST /analyze           one item                -> the analysis record
+    POST /analyze/batch     {"items": [...]}        -> {"results": [...]} in item order
+    POST /jobs              {"items": [...]}        -> 202 {"job_id": ...}
+    GET  /jobs/<id>         job status, with {"results": [...]} once completed
+    DELETE /jobs/<id>       cancel a job
+    GET  /health
+
+An item is {"content": ..., "type": "analysis" | "competitor" | "persona",
+"headings": [...], "source": ..., "target_keywords": [...]} plus
+"competitor_name" for competitors and "persona" (id or name), "asset_type"
+and "asset_url" for persona analyses. With "save": true the record is also
+stored as if it had been analyzed in the app.
+
+Analysis requests arriving within BATCH_WINDOW of each other are grouped and
+run as one task on the shared worker pool: the funnel classifier scores the
+whole batch in one pass and saved records are written in one store update.
+Requests wait at most REQUEST_TIMEOUT seconds.
+
+    python analysis_api.py --port 8502
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import content_store
+import data_store
+import record_store
+import resources
+from job_queue import get_job_queue, COMPLETED
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8502
+# Seconds a request waits for its analysis
+REQUEST_TIMEOUT = 30.0
+# Seconds the batcher waits for more requests after the first arrives
+BATCH_WINDOW = 0.01
+MAX_BATCH_SIZE = 32
+# Requests queued or running before new ones are turned away with 503
+MAX_PENDING = 512
+MAX_ITEMS = 200
+MAX_BODY_BYTES = 10 * 1024 * 1024
+# Optional shared secret; when set, requests need "Authorization: Bearer <token>"
+TOKEN_ENV = 'ANALYZER_API_TOKEN'
+
+# Item type -> data file its records are saved to
+ITEM_TYPES = {
+    'analysis': 'analyses',
+    'competitor': 'competitor_analyses',
+    'persona': 'persona_analyses'
+}
+
+_JOB_PATH = re.compile(r"^/jobs/([0-9a-f]+)$")
+# Marks a request body that could not be read
+_INVALID = object()
+
+
+class Overloaded(Exception):
+    """Raised when too many requests are already waiting"""
+
+
+def _analysis():
+    import analysis_modules
+    return analysis_modules
+
+
+def _headings(value):
+    """Headings as {'text', 'level'} like the extractors give them; plain strings count as 'h2'"""
+    if value is None:
+        return []
+    # A bare string would otherwise be read one character per heading
+    if not isinstance(value, list):
+        raise ValueError("headings must be a list")
+    headings = []
+    for heading in value:
+        if isinstance(heading, str):
+            headings.append({'text': heading, 'level': 'h2'})
+        elif isinstance(heading, dict) and heading.get('text'):
+            headings.append({'text': str(heading['text']), 'level': _heading_level(heading.get('level', 'h2'))})
+        else:
+            raise ValueError("headings must be strings or objects with 'text' and 'level'")
+    return headings
+
+
+def _heading_level(level):
+    """Levels such as 'h3' or 'Heading 1' as given; a bare number n becomes 'hn'"""
+    if isinstance(level, bool) or not isinstance(level, (int, str)) or not str(level).strip():
+        raise ValueError("heading levels must be strings such as 'h2' or numbers")
+    level = str(level).strip()
+    return f"h{level}" if level.isdigit() else level
+
+
+def _find_persona(reference, personas):
+    for persona in personas:
+        if reference in (persona.get('id'), persona.get('name')):
+            return persona
+    raise ValueError(f"Unknown persona: {reference}")
+
+
+def parse_item(item, personas):
+    """Validate one request item; returns its type and the arguments for its build_* function"""
+    if not isinstance(item, dict):
+        raise ValueError("Each item must be a JSON object")
+    content = item.get('content')
+    if not isinstance(content, str) or not content.strip():
+        raise ValueError("content is required")
+    item_type = item.get('type', 'analysis')
+    if item_type not in ITEM_TYPES:
+        raise ValueError(f"type must be one of: {', '.join(ITEM_TYPES)}")
+    keywords = item.get('target_keywords', [])
+    if not isinstance(keywords, list) or not all(isinstance(k, str) for k in keywords):
+        raise ValueError("target_keywords must be a list of strings")
+
+    if item_type == 'analysis':
+        args = (content, _headings(item.get('headings')), item.get('source', 'API'), keywords)
+    elif item_type == 'competitor':
+        if not item.get('competitor_name'):
+            raise ValueError("competitor_name is required for competitor analyses")
+        args = (content, _headings(item.get('headings')), item.get('source', 'API'), item['competitor_name'], keywords)
+    else:
+        if not item.get('persona'):
+            raise ValueError("persona (id or name) is required for persona analyses")
+        args = (content, _find_persona(item['persona'], personas), item.get('asset_type', 'Other'),
+                item.get('asset_url', ''))
+    return item_type, args
+
+
+def analyze_items(items):
+    """Analyze a batch of request items; each result is a record or an error dict"""
+    am = _analysis()
+    builders = {
+        'analysis': am.build_analysis_result,
+        'competitor': am.build_competitor_analysis,
+        'persona': am.build_persona_analysis
+    }
+    personas = data_store.load_data('personas', default=[]) if any(
+        isinstance(item, dict) and item.get('type') == 'persona' for item in items) else []
+
+    results = [None] * len(items)
+    parsed = {}
+    for i, item in enumerate(items):
+        try:
+            parsed[i] = parse_item(item, personas)
+        except (ValueError, TypeError) as e:
+            results[i] = {'success': False, 'error': str(e)}
+
+    # One funnel pass for the batch: vectorized when the trained classifier is enabled
+    funnel_analyses = am.analyze_funnel_stages([args[0] for _, args in parsed.values()])
+    to_save = {}
+    for (i, (item_type, args)), funnel_analysis in zip(parsed.items(), funnel_analyses):
+        try:
+            record = builders[item_type](*args, funnel_analysis=funnel_analysis)
+        except Exception as e:
+            results[i] = {'success': False, 'error': str(e)}
+            continue
+        results[i] = record
+        if items[i].get('save'):
+            content_store.put(args[0])
+            to_save.setdefault(ITEM_TYPES[item_type], []).append(record)
+
+    for data_type, records in to_save.items():
+        record_store.store_records(data_type, records)
+    return results
+
+
+class MicroBatcher:
+    """Groups requests arriving close together into one task on the shared worker pool"""
+
+    def __init__(self, handler, window=BATCH_WINDOW, max_batch=MAX_BATCH_SIZE, max_pending=MAX_PENDING, pool=None):
+        self.handler = handler
+        self.window = window
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.pool = pool
+        self.batches = 0
+        self._condition = threading.Condition()
+        self._queued = []
+        self._outstanding = 0
+        self._thread = threading.Thread(target=self._collect, name='api-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Queue one item; returns a Future for its result"""
+        future = Future()
+        with self._condition:
+            if self._outstanding >= self.max_pending:
+                raise Overloaded(f"{self._outstanding} requests already pending")
+            self._outstanding += 1
+            self._queued.append((item, future))
+            self._condition.notify()
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._condition:
+            self._outstanding -= 1
+
+    def _collect(self):
+        while True:
+            with self._condition:
+                while not self._queued:
+                    self._condition.wait()
+                deadline = time.monotonic() + self.window
+                while len(self._queued) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch, self._queued = self._queued[:self.max_batch], self._queued[self.max_batch:]
+                self.batches += 1
+            (self.pool or resources.worker_pool()).submit(self._run, batch)
+
+    def _run(self, batch):
+        # Requests that timed out while waiting for a worker were cancelled and are dropped here
+        batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            results = self.handler([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+def wait_all(futures, timeout):
+    """Results of futures in order; raises FutureTimeout (after cancelling the rest) if time runs out"""
+    deadline = time.monotonic() + timeout
+    try:
+        return [future.result(timeout=max(deadline - time.monotonic(), 0)) for future in futures]
+    except FutureTimeout:
+        for future in futures:
+            future.cancel()
+        raise
+
+
+def _analysis_job(job, items):
+    """Background job: analyze request items in batches"""
+    results = []
+    for start in range(0, len(items), MAX_BATCH_SIZE):
+        job.report(start / len(items), f"Analyzed {start}/{len(items)} items")
+        results.extend(analyze_items(items[start:start + MAX_BATCH_SIZE]))
+    return {'results': results}
+
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    """JSON endpoints; the server carries the batcher and settings"""
+
+    server_version = 'ContentAnalyzerAPI/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message, headers=None):
+        self._send(status, {'success': False, 'error': message}, headers)
+
+    def _authorized(self):
+        token = self.server.token
+        if token and self.headers.get('Authorization') != f"Bearer {token}":
+            # The body is left unread, so the connection cannot be reused
+            self.close_connection = True
+            self._error(401, "Missing or invalid API token")
+            return False
+        return True
+
+    def _read_json(self):
+        """The request body as JSON, or _INVALID after sending an error"""
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            self._error(413, f"Request body over {MAX_BODY_BYTES // (1024 * 1024)} MB")
+            self.close_connection = True
+            return _INVALID
+        try:
+            return json.loads(self.rfile.read(length) or b'null')
+        except ValueError:
+            self._error(400, "Request body is not valid JSON")
+            return _INVALID
+
+    def _items(self, body):
+        items = body.get('items') if isinstance(body, dict) else None
+        if not isinstance(items, list) or not items:
+            self._error(400, "items must be a non-empty list")
+            return None
+        if len(items) > MAX_ITEMS:
+            self._error(400, f"At most {MAX_ITEMS} items per request")
+            return None
+        return items
+
+    def _client(self):
+        return self.headers.get('X-Client-Id') or self.client_address[0]
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path == '/health':
+            self._send(200, {'status': 'ok', 'batches': self.server.batcher.batches})
+            return
+        match = _JOB_PATH.match(self.path)
+        job = get_job_queue().status(match.group(1)) if match else None
+        if job is None:
+            self._error(404, "Not found")
+            return
+        response = {k: job[k] for k in ('job_id', 'status', 'progress', 'message', 'error',
+                                         'submitted_at', 'started_at', 'finished_at')}
+        if job['status'] == COMPLETED:
+            response['results'] = job['result']['results']
+        self._send(200, response)
+
+    def do_DELETE(self):
+        if not self._authorized():
+            return
+        match = _JOB_PATH.match(self.path)
+        if not match or get_job_queue().status(match.group(1)) is None:
+            self._error(404, "Not found")
+            return
+        self._send(200, {'job_id': match.group(1), 'cancelled': get_job_queue().cancel(match.group(1))})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        if self.path not in ('/analyze', '/analyze/batch', '/jobs'):
+            self.close_connection = True
+            self._error(404, "Not found")
+            return
+        body = self._read_json()
+        if body is _INVALID:
+            return
+
+        if self.path == '/jobs':
+            items = self._items(body)
+            if items is not None:
+                job_id = get_job_queue().submit(self._client(), 'api_analysis', _analysis_job, items,
+                                                description=f"Analyzing {len(items)} items")
+                self._send(202, {'job_id': job_id, 'status_url': f"/jobs/{job_id}"})
+            return
+
+        items = [body] if self.path == '/analyze' else self._items(body)
+        if items is None:
+            return
+        try:
+            futures = [self.server.batcher.submit(item) for item in items]
+        except Overloaded as e:
+            self._error(503, str(e), {'Retry-After': '1'})
+            return
+        try:
+            results = wait_all(futures, self.server.timeout_seconds)
+        except FutureTimeout:
+            self._error(504, f"Analysis did not finish within {self.server.timeout_seconds:g} seconds")
+            return
+        except Exception as e:
+            self._error(500, str(e))
+            return
+
+        if self.path == '/analyze/batch':
+            self._send(200, {'results': results})
+        elif results[0].get('success') is False:
+            self._error(400, results[0]['error'])
+        else:
+            self._send(200, results[0])
+
+
+class AnalysisServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for bursts of connections from many clients at once
+    request_queue_size = 128
+
+
+def create_server(host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=REQUEST_TIMEOUT, window=BATCH_WINDOW,
+                  token=None, verbose=False):
+    """A threaded HTTP server for the API, not yet serving"""
+    server = AnalysisServer((host, port), AnalysisRequestHandler)
+    server.batcher = MicroBatcher(analyze_items, window=window)
+    server.timeout_seconds = timeout
+    server.token = token if token is not None else os.environ.get(TOKEN_ENV)
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP API for content analysis")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--timeout', type=float, default=REQUEST_TIMEOUT, help="Seconds a request may wait")
+    parser.add_argument('--batch-window', type=float, default=BATCH_WINDOW * 1000,
+                        help="Milliseconds to gather requests into one batch")
+    parser.add_argument('--verbose', action='store_true', help="Log every request")
+    args = parser.parse_args(argv)
+
+    server = create_server(args.host, args.port, args.timeout, args.batch_window / 1000, verbose=args.verbose)
+    print(f"🌐 Analysis API listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,41 @@
-import streamlit as st
-import requests
-from bs4 import BeautifulSoup
-import PyPDF2
-import docx
 import io
+import os
 import re
-from datetime import datetime
-import pandas as pd
+import zipfile
+from xml.etree import ElementTree
+from datetime import datetime, timedelta
 from collections import Counter
 import json
+import uuid
+import functools
+import hashlib
+from urllib.parse import urljoin
+
+import competitor_rollups
+import content_store
+import data_store
+import exports
+import funnel_classifier
+import keyword_discovery
+import llm_analysis
+import llm_budget
+import metrics
+import profiling
+import persona_import
+import record_store
+import resources
+import site_crawler
+import topic_clusters
+import tracked_urls
+from bulk_upload import analyze_uploads
+from job_queue import get_job_queue, COMPLETED, FAILED, CANCELLED, FINISHED_STATUSES
+from lazy_imports import lazy_module
+
+# Heavy dependencies are imported on first use so headless callers start fast
+st = lazy_module('streamlit')
+pd = lazy_module('pandas')
+bs4 = lazy_module('bs4')
+PyPDF2 = lazy_module('PyPDF2')
 
 # Funnel stage definitions
 FUNNEL_STAGES = {
@@ -38,41 +65,123 @@ FUNNEL_STAGES = {
     }
 }
 
-def extract_content_from_url(url):
-    """Extract text content from a URL"""
+# Suggestion texts by template id; saved records keep only the ids (see record_schema)
+SUGGESTION_TEMPLATES = {
+    'headings_missing': 'Add clear H1, H2, H3 headings to structure your content',
+    'headings_few': "Add more headings to improve content structure (aim for 3-5 main sections)",
+    'headings_unaligned': "Ensure heading keywords appear in the content below each heading",
+    'headings_good': 'Content structure looks good!',
+    'keyword_low': "Increase usage of '{keyword}' (current: {count} times, {density}%)",
+    'keyword_high': "Reduce usage of '{keyword}' to avoid keyword stuffing (current: {count} times, {density}%)",
+    'keywords_good': "Keyword optimization looks good! Maintain natural usage.",
+    'seo_first_100_words': "Include target keywords in the first 100 words",
+    'seo_headings': "Use keywords in headings (H1, H2, H3)",
+    'seo_meta': "Add keywords to meta title and description",
+    'seo_semantic': "Use semantic variations of your keywords"
+}
+GENERAL_SEO_SUGGESTIONS = ('seo_first_100_words', 'seo_headings', 'seo_meta', 'seo_semantic')
+
+# URL fetching limits
+MAX_DOWNLOAD_BYTES = 10 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml', 'application/xml', 'text/xml', 'text/plain')
+PDF_CONTENT_TYPES = ('application/pdf', 'application/x-pdf')
+
+def _read_limited(response, max_bytes):
+    """Read a streamed response body up to max_bytes, returning (body, truncated)"""
+    buffer = bytearray()
+    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            return bytes(buffer[:max_bytes]), True
+    return bytes(buffer), False
+
+def _page_links(soup, base_url):
+    """Absolute URLs of a page's links, or none if the page asks robots not to follow them"""
+    robots_meta = soup.find('meta', attrs={'name': re.compile('^robots$', re.I)})
+    if robots_meta and 'nofollow' in robots_meta.get('content', '').lower():
+        return []
+    return [urljoin(base_url, a['href']) for a in soup.find_all('a', href=True)]
+
+def extract_content_from_url(url, max_bytes=MAX_DOWNLOAD_BYTES, headers=None):
+    """Extract text content from a URL, streaming at most max_bytes of the body
+
+    headers are extra request headers, e.g. If-None-Match for a conditional
+    request; a 304 answer returns {'success': True, 'not_modified': True}.
+    """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Remove script and style elements
-        for script in soup(["script", "style", "nav", "footer", "header"]):
-            script.decompose()
+        session = resources.http_session()
+        with metrics.track('fetch') as fetch_stage, \
+                session.get(url, timeout=10, stream=True, headers=headers) as response:
+            response.raise_for_status()
+            if response.status_code == 304:
+                return {'success': True, 'not_modified': True, 'url': url}
+            # Validators for conditional re-fetches of the same URL
+            validators = {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+            
+            # Decide what to do from the headers before downloading the body
+            content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+            is_pdf = content_type in PDF_CONTENT_TYPES or (
+                content_type in ('', 'application/octet-stream') and url.lower().split('?')[0].endswith('.pdf')
+            )
+            if not is_pdf and content_type and content_type not in HTML_CONTENT_TYPES:
+                raise ValueError(f"Unsupported content type: {content_type}")
+            
+            declared_length = response.headers.get('Content-Length', '')
+            if is_pdf and declared_length.isdigit() and int(declared_length) > max_bytes:
+                raise ValueError(f"PDF is larger than the {max_bytes:,} byte download limit")
+            
+            body, truncated = _read_limited(response, max_bytes)
+            fetch_stage.bytes = len(body)
+            # Where redirects ended up, for callers that must stay on one site
+            final_url = response.url
         
-        # Extract text
-        text = soup.get_text()
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = ' '.join(chunk for chunk in chunks if chunk)
+        if is_pdf:
+            # A truncated PDF cannot be parsed, so refuse it instead of guessing
+            if truncated:
+                raise ValueError(f"PDF is larger than the {max_bytes:,} byte download limit")
+            result = extract_content_from_pdf(io.BytesIO(body))
+            if result['success']:
+                result['url'] = url
+                result['final_url'] = final_url
+                result.update(validators)
+            return result
         
-        # Extract headings
-        headings = []
-        for tag in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-            for heading in soup.find_all(tag):
-                headings.append({
-                    'level': tag,
-                    'text': heading.get_text().strip()
-                })
+        with metrics.track('parse_html', len(body)):
+            # HTML parsers tolerate a cut-off document, so parse the bounded buffer
+            soup = bs4.BeautifulSoup(body, 'html.parser')
+            
+            # Links are collected before navigation is stripped so crawlers can follow them
+            links = _page_links(soup, final_url)
+            
+            # Remove script and style elements
+            for script in soup(["script", "style", "nav", "footer", "header"]):
+                script.decompose()
+            
+            # Extract text
+            text = soup.get_text()
+            lines = (line.strip() for line in text.splitlines())
+            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+            text = ' '.join(chunk for chunk in chunks if chunk)
+            
+            # Extract headings
+            headings = []
+            for tag in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
+                for heading in soup.find_all(tag):
+                    headings.append({
+                        'level': tag,
+                        'text': heading.get_text().strip()
+                    })
         
         return {
             'success': True,
             'content': text,
             'headings': headings,
-            'url': url
+            'links': links,
+            'url': url,
+            'final_url': final_url,
+            'truncated': truncated,
+            **validators
         }
     except Exception as e:
         return {
@@ -80,6 +189,7 @@ def extract_content_from_url(url):
             'error': str(e)
         }
 
+@metrics.instrument('parse_pdf')
 def extract_content_from_pdf(pdf_file):
     """Extract text content from a PDF file"""
     try:
@@ -100,24 +210,132 @@ def extract_content_from_pdf(pdf_file):
             'error': str(e)
         }
 
+# WordprocessingML parsing
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+MARKUP_COMPATIBILITY_NAMESPACE = '{http://schemas.openxmlformats.org/markup-compatibility/2006}'
+DOCX_EXTRA_PARTS = (
+    ('header', re.compile(r'^word/header\d*\.xml$')),
+    ('footer', re.compile(r'^word/footer\d*\.xml$')),
+    ('footnote', re.compile(r'^word/footnotes\.xml$')),
+    ('endnote', re.compile(r'^word/endnotes\.xml$'))
+)
+
+def _docx_style_names(archive):
+    """Map DOCX style ids to their display names from word/styles.xml"""
+    names = {}
+    if 'word/styles.xml' not in archive.namelist():
+        return names
+    with archive.open('word/styles.xml') as f:
+        for _, elem in ElementTree.iterparse(f):
+            if elem.tag == WORD_NAMESPACE + 'style':
+                name = elem.find(WORD_NAMESPACE + 'name')
+                if name is not None:
+                    names[elem.get(WORD_NAMESPACE + 'styleId')] = name.get(WORD_NAMESPACE + 'val', '')
+                elem.clear()
+    return names
+
+def _heading_level(style_name):
+    """Return 'Heading N' for heading styles (matching python-docx naming), else None"""
+    if style_name and style_name.lower().startswith('heading'):
+        return 'Heading' + style_name[len('heading'):]
+    return None
+
+def _iter_docx_part(xml_file, style_names):
+    """Stream (text, style_name, in_table) for every paragraph in one DOCX XML part"""
+    paragraph_text = []  # stack of text buffers, one per open (possibly nested) paragraph
+    elements = []
+    table_depth = 0
+    fallback_depth = 0
+    
+    for event, elem in ElementTree.iterparse(xml_file, events=('start', 'end')):
+        tag = elem.tag
+        if event == 'start':
+            elements.append(elem)
+            if fallback_depth and tag in (WORD_NAMESPACE + 'p', WORD_NAMESPACE + 'tbl'):
+                # Paragraphs inside a fallback copy are skipped entirely, start and end alike
+                pass
+            elif tag == WORD_NAMESPACE + 'p':
+                paragraph_text.append([])
+            elif tag == WORD_NAMESPACE + 'tbl':
+                table_depth += 1
+            elif tag == MARKUP_COMPATIBILITY_NAMESPACE + 'Fallback':
+                # Text boxes are stored twice (DrawingML choice + VML fallback); read one copy
+                fallback_depth += 1
+            continue
+        
+        elements.pop()
+        if tag == MARKUP_COMPATIBILITY_NAMESPACE + 'Fallback':
+            fallback_depth -= 1
+        elif fallback_depth:
+            pass
+        elif tag == WORD_NAMESPACE + 't' and paragraph_text:
+            paragraph_text[-1].append(elem.text or '')
+        elif tag == WORD_NAMESPACE + 'tab' and paragraph_text:
+            paragraph_text[-1].append('\t')
+        elif tag in (WORD_NAMESPACE + 'br', WORD_NAMESPACE + 'cr') and paragraph_text:
+            paragraph_text[-1].append('\n')
+        elif tag == WORD_NAMESPACE + 'p':
+            style = elem.find(f'{WORD_NAMESPACE}pPr/{WORD_NAMESPACE}pStyle')
+            style_id = style.get(WORD_NAMESPACE + 'val') if style is not None else None
+            yield ''.join(paragraph_text.pop()), style_names.get(style_id, style_id), table_depth > 0
+        elif tag == WORD_NAMESPACE + 'tbl':
+            table_depth -= 1
+        
+        # Drop finished paragraphs and tables so memory stays bounded on huge documents
+        if tag in (WORD_NAMESPACE + 'p', WORD_NAMESPACE + 'tbl'):
+            elem.clear()
+            if elements:
+                elements[-1].remove(elem)
+
+def iter_docx_blocks(docx_file):
+    """Yield paragraphs and headings from a DOCX file in one streaming pass
+
+    Body text (including table cells and text boxes) comes first, followed by
+    headers, footers, footnotes and endnotes. Each block is a dict with type,
+    text, level (for headings), part, in_table and position.
+    """
+    with zipfile.ZipFile(docx_file) as archive:
+        style_names = _docx_style_names(archive)
+        parts = [('document', 'word/document.xml')]
+        for part_name, pattern in DOCX_EXTRA_PARTS:
+            parts.extend((part_name, name) for name in sorted(archive.namelist()) if pattern.match(name))
+        
+        position = 0
+        for part_name, member in parts:
+            with archive.open(member) as xml_file:
+                for text, style_name, in_table in _iter_docx_part(xml_file, style_names):
+                    if not text.strip():
+                        continue
+                    level = _heading_level(style_name) if part_name == 'document' else None
+                    yield {
+                        'type': 'heading' if level else 'paragraph',
+                        'text': text,
+                        'level': level,
+                        'part': part_name,
+                        'in_table': in_table,
+                        'position': position
+                    }
+                    position += 1
+
+@metrics.instrument('parse_docx')
 def extract_content_from_docx(docx_file):
     """Extract text content from a DOCX file"""
     try:
-        doc = docx.Document(docx_file)
-        text = ""
+        parts = []
         headings = []
         
-        for para in doc.paragraphs:
-            text += para.text + "\n"
-            if para.style.name.startswith('Heading'):
+        for block in iter_docx_blocks(docx_file):
+            parts.append(block['text'])
+            if block['type'] == 'heading':
                 headings.append({
-                    'level': para.style.name,
-                    'text': para.text
+                    'level': block['level'],
+                    'text': block['text'],
+                    'position': block['position']
                 })
         
         return {
             'success': True,
-            'content': text,
+            'content': '\n'.join(parts) + '\n' if parts else '',
             'headings': headings,
             'source': 'DOCX Upload'
         }
@@ -127,8 +345,49 @@ def extract_content_from_docx(docx_file):
             'error': str(e)
         }
 
+def extract_content_from_file(file_obj, filename):
+    """Extract text content from a PDF, DOCX or plain-text file based on its name"""
+    name = filename.lower()
+    if name.endswith('.pdf'):
+        return extract_content_from_pdf(file_obj)
+    if name.endswith('.docx'):
+        return extract_content_from_docx(file_obj)
+    if name.endswith(('.txt', '.md')):
+        try:
+            text = file_obj.read()
+            if isinstance(text, bytes):
+                text = text.decode('utf-8', errors='replace')
+            return {
+                'success': True,
+                'content': text,
+                'headings': [],
+                'source': 'Text Upload'
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    return {
+        'success': False,
+        'error': f"Unsupported file type: {filename}"
+    }
+
+@metrics.instrument('funnel')
 def analyze_funnel_stage(content):
-    """Determine the funnel stage of the content"""
+    """Determine the funnel stage of the content, with the trained classifier when it is enabled"""
+    return analyze_funnel_stages([content])[0]
+
+def analyze_funnel_stages(contents):
+    """Funnel stages of several documents, classified in one vectorized pass when the trained classifier is enabled"""
+    model = funnel_classifier.active_model()
+    if model is not None:
+        return [{**result, 'stage_info': FUNNEL_STAGES[result['primary_stage']]}
+                for result in funnel_classifier.classify(model, contents)]
+    return [analyze_funnel_stage_keywords(content) for content in contents]
+
+def analyze_funnel_stage_keywords(content):
+    """Determine the funnel stage of the content from stage keyword counts"""
     content_lower = content.lower()
     scores = {}
     
@@ -148,26 +407,31 @@ def analyze_funnel_stage(content):
         'primary_stage': primary_stage,
         'confidence': confidence,
         'scores': scores,
+        'method': 'keywords',
         'stage_info': FUNNEL_STAGES[primary_stage]
     }
 
+# Entity patterns, compiled once per process
+URL_PATTERN = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+STATISTIC_PATTERN = re.compile(r'\b\d+%|\b\d+\.\d+%|\$\d+|\d+x\b')
+SENTENCE_SPLIT_PATTERN = re.compile(r'[.!?]+')
+
+@metrics.instrument('entities')
 def extract_entities(content):
     """Extract and count different entities from content"""
     # Extract URLs
-    urls = re.findall(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', content)
+    urls = URL_PATTERN.findall(content)
     
     # Extract emails
-    emails = re.findall(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', content)
+    emails = EMAIL_PATTERN.findall(content)
     
     # Extract numbers/statistics
-    numbers = re.findall(r'\b\d+%|\b\d+\.\d+%|\$\d+|\d+x\b', content)
+    numbers = STATISTIC_PATTERN.findall(content)
     
     # Word count and sentence count
     words = content.split()
-    sentences = re.split(r'[.!?]+', content)
-    
-    # Extract potential company names (capitalized words)
-    potential_companies = re.findall(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b', content)
+    sentences = SENTENCE_SPLIT_PATTERN.split(content)
     
     return {
         'total_words': len(words),
@@ -180,13 +444,29 @@ def extract_entities(content):
         'avg_words_per_sentence': len(words) / max(len([s for s in sentences if s.strip()]), 1)
     }
 
+# Heading alignment thresholds: fewer headings, or a lower average of heading words found in the content, get a suggestion
+MIN_HEADINGS = 3
+MIN_HEADING_ALIGNMENT = 3
+# Keyword density band (percent of words) counted as well optimized
+KEYWORD_DENSITY_RANGE = (1, 3)
+# Competitor insight thresholds
+COMPETITOR_THRESHOLDS = {
+    'comprehensive_words': 1500,
+    'data_driven_statistics': 5,
+    'well_structured_headings': 5,
+    'thin_words': 1000,
+    'few_statistics': 3,
+    'few_headings': 3
+}
+
+@metrics.instrument('headings')
 def analyze_heading_alignment(content, headings):
     """Analyze if content is aligned with headings"""
     if not headings:
         return {
             'aligned': False,
             'message': 'No headings found in the content',
-            'suggestions': ['Add clear H1, H2, H3 headings to structure your content']
+            'suggestions': [SUGGESTION_TEMPLATES['headings_missing']]
         }
     
     analysis = []
@@ -204,19 +484,20 @@ def analyze_heading_alignment(content, headings):
         })
     
     # Generate suggestions
-    if len(headings) < 3:
-        suggestions.append("Add more headings to improve content structure (aim for 3-5 main sections)")
+    if len(headings) < MIN_HEADINGS:
+        suggestions.append(SUGGESTION_TEMPLATES['headings_few'])
     
     avg_alignment = sum(h['alignment_score'] for h in analysis) / len(analysis)
-    if avg_alignment < 3:
-        suggestions.append("Ensure heading keywords appear in the content below each heading")
+    if avg_alignment < MIN_HEADING_ALIGNMENT:
+        suggestions.append(SUGGESTION_TEMPLATES['headings_unaligned'])
     
     return {
-        'aligned': avg_alignment >= 3,
+        'aligned': avg_alignment >= MIN_HEADING_ALIGNMENT,
         'heading_analysis': analysis,
-        'suggestions': suggestions if suggestions else ['Content structure looks good!']
+        'suggestions': suggestions if suggestions else [SUGGESTION_TEMPLATES['headings_good']]
     }
 
+@metrics.instrument('keywords')
 def analyze_keyword_optimization(content, target_keywords):
     """Analyze content for keyword optimization"""
     if not target_keywords:
@@ -237,7 +518,8 @@ def analyze_keyword_optimization(content, target_keywords):
         density = (count / total_words) * 100 if total_words > 0 else 0
         
         # Determine if optimization is good (1-3% density is generally good)
-        status = 'good' if 1 <= density <= 3 else ('low' if density < 1 else 'high')
+        low, high = KEYWORD_DENSITY_RANGE
+        status = 'good' if low <= density <= high else ('low' if density < low else 'high')
         
         keyword_analysis.append({
             'keyword': keyword,
@@ -250,20 +532,15 @@ def analyze_keyword_optimization(content, target_keywords):
     suggestions = []
     for kw in keyword_analysis:
         if kw['status'] == 'low':
-            suggestions.append(f"Increase usage of '{kw['keyword']}' (current: {kw['count']} times, {kw['density']}%)")
+            suggestions.append(SUGGESTION_TEMPLATES['keyword_low'].format(**kw))
         elif kw['status'] == 'high':
-            suggestions.append(f"Reduce usage of '{kw['keyword']}' to avoid keyword stuffing (current: {kw['count']} times, {kw['density']}%)")
+            suggestions.append(SUGGESTION_TEMPLATES['keyword_high'].format(**kw))
     
     if not suggestions:
-        suggestions.append("Keyword optimization looks good! Maintain natural usage.")
+        suggestions.append(SUGGESTION_TEMPLATES['keywords_good'])
     
     # Add general SEO suggestions
-    suggestions.extend([
-        "Include target keywords in the first 100 words",
-        "Use keywords in headings (H1, H2, H3)",
-        "Add keywords to meta title and description",
-        "Use semantic variations of your keywords"
-    ])
+    suggestions.extend(SUGGESTION_TEMPLATES[template_id] for template_id in GENERAL_SEO_SUGGESTIONS)
     
     return {
         'optimized': all(kw['status'] == 'good' for kw in keyword_analysis),
@@ -271,31 +548,511 @@ def analyze_keyword_optimization(content, target_keywords):
         'suggestions': suggestions
     }
 
-def call_ai_api(content, prompt, api_provider='openai'):
-    """Call AI API for advanced analysis"""
-    api_keys = st.session_state.api_keys
+def assess_competitor(entity_analysis, headings_count):
+    """Competitor strengths and the opportunities they leave for us"""
+    limits = COMPETITOR_THRESHOLDS
+    strengths = []
+    if entity_analysis['total_words'] > limits['comprehensive_words']:
+        strengths.append(f"✅ Comprehensive content ({entity_analysis['total_words']:,} words)")
+    if entity_analysis['statistics_count'] > limits['data_driven_statistics']:
+        strengths.append(f"✅ Data-driven ({entity_analysis['statistics_count']} statistics)")
+    if headings_count >= limits['well_structured_headings']:
+        strengths.append(f"✅ Well-structured ({headings_count} headings)")
     
-    if api_provider == 'openai' and api_keys.get('openai'):
-        try:
-            import openai
-            openai.api_key = api_keys['openai']
-            
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a content marketing expert analyzing content for funnel stages, optimization, and improvements."},
-                    {"role": "user", "content": f"{prompt}\n\nContent:\n{content[:4000]}"}
-                ],
-                max_tokens=1000
-            )
-            
-            return response.choices[0].message.content
-        except Exception as e:
-            return f"API Error: {str(e)}"
+    opportunities = []
+    if entity_analysis['total_words'] < limits['thin_words']:
+        opportunities.append("📝 Create more comprehensive content")
+    if entity_analysis['statistics_count'] < limits['few_statistics']:
+        opportunities.append("📊 Add more data and statistics")
+    if headings_count < limits['few_headings']:
+        opportunities.append("📑 Improve content structure")
+    
+    return {'strengths': strengths, 'opportunities': opportunities}
+
+# Analyzer versions: bump one when its logic changes. Saved records keep, per analyzer,
+# the version and a fingerprint of its configuration so stale results can be found and recomputed.
+ANALYZER_VERSIONS = {
+    'funnel_analysis': 1,
+    'entity_analysis': 1,
+    'heading_analysis': 1,
+    'keyword_analysis': 1,
+    'competitive_insights': 1
+}
+# Analyzers whose output each record type stores
+RECORD_ANALYZERS = {
+    'analyses': ('funnel_analysis', 'entity_analysis', 'heading_analysis', 'keyword_analysis'),
+    'competitor_analyses': ('funnel_analysis', 'entity_analysis', 'heading_analysis', 'keyword_analysis',
+                            'competitive_insights'),
+    'persona_analyses': ('funnel_analysis', 'entity_analysis')
+}
+
+def analyzer_config(name):
+    """The rules and thresholds an analyzer's output depends on"""
+    if name == 'funnel_analysis':
+        model = funnel_classifier.active_model()
+        return {'keywords': {stage: config['keywords'] for stage, config in FUNNEL_STAGES.items()},
+                'model': model['meta']['trained_at'] if model is not None else None}
+    if name == 'entity_analysis':
+        return {'patterns': [p.pattern for p in (URL_PATTERN, EMAIL_PATTERN, STATISTIC_PATTERN, SENTENCE_SPLIT_PATTERN)]}
+    if name == 'heading_analysis':
+        return {'min_headings': MIN_HEADINGS, 'min_alignment': MIN_HEADING_ALIGNMENT}
+    if name == 'keyword_analysis':
+        return {'density_range': list(KEYWORD_DENSITY_RANGE)}
+    # Insights are computed from the entity analysis, so they go stale with it
+    return {'thresholds': COMPETITOR_THRESHOLDS, 'entity_analysis': analyzer_fingerprint('entity_analysis')}
+
+def analyzer_fingerprint(name):
+    """'<version>:<config hash>' of one analyzer"""
+    config = json.dumps(analyzer_config(name), sort_keys=True).encode('utf-8')
+    return f"{ANALYZER_VERSIONS[name]}:{hashlib.sha256(config).hexdigest()[:12]}"
+
+def analyzer_fingerprints(data_type):
+    """'<version>:<config hash>' of each analyzer a record type stores"""
+    return {name: analyzer_fingerprint(name) for name in RECORD_ANALYZERS[data_type]}
+
+def build_analysis_result(content, headings, source, target_keywords, funnel_analysis=None):
+    """Run all own-content analyses and assemble the saved analysis record"""
+    return {
+        'id': uuid.uuid4().hex,
+        'timestamp': datetime.now().isoformat(),
+        'source': source,
+        'content_preview': content[:500],
+        'content_hash': content_store.content_hash(content),
+        'funnel_analysis': funnel_analysis or analyze_funnel_stage(content),
+        'entity_analysis': extract_entities(content),
+        'heading_analysis': analyze_heading_alignment(content, headings),
+        'keyword_analysis': analyze_keyword_optimization(content, target_keywords),
+        'target_keywords': target_keywords,
+        'analyzers': analyzer_fingerprints('analyses')
+    }
+
+def build_competitor_analysis(content, headings, source, competitor_name, keywords, funnel_analysis=None):
+    """Run all competitor analyses and assemble the saved competitor record"""
+    entity_analysis = extract_entities(content)
+    return {
+        'id': uuid.uuid4().hex,
+        'timestamp': datetime.now().isoformat(),
+        'competitor_name': competitor_name,
+        'source': source,
+        'content_preview': content[:500],
+        'content_hash': content_store.content_hash(content),
+        'headings_count': len(headings),
+        'funnel_analysis': funnel_analysis or analyze_funnel_stage(content),
+        'entity_analysis': entity_analysis,
+        'heading_analysis': analyze_heading_alignment(content, headings),
+        'keyword_analysis': analyze_keyword_optimization(content, keywords),
+        'competitive_insights': assess_competitor(entity_analysis, len(headings)),
+        'analyzers': analyzer_fingerprints('competitor_analyses')
+    }
+
+@metrics.instrument('persona_scoring')
+def score_persona_relevance(content, persona):
+    """Find which of a persona's pain points and goals the content addresses"""
+    content_lower = content.lower()
+    
+    # Check for pain points
+    relevant_pain_points = [
+        pain_point for pain_point in persona['pain_points']
+        if any(word.lower() in content_lower for word in pain_point.split())
+    ]
+    
+    # Check for goals
+    relevant_goals = [
+        goal for goal in persona['goals']
+        if any(word.lower() in content_lower for word in goal.split())
+    ]
+    
+    return {
+        'persona_relevance_score': len(relevant_pain_points) + len(relevant_goals),
+        'relevant_pain_points': relevant_pain_points,
+        'relevant_goals': relevant_goals
+    }
+
+def build_persona_analysis(content, persona, asset_type, asset_url, funnel_analysis=None):
+    """Run the persona-fit analyses and assemble the saved persona analysis record"""
+    funnel_analysis = funnel_analysis or analyze_funnel_stage(content)
+    relevance = score_persona_relevance(content, persona)
+    
+    return {
+        'id': uuid.uuid4().hex,
+        'timestamp': datetime.now().isoformat(),
+        'persona': persona,
+        'asset_type': asset_type,
+        'asset_url': asset_url,
+        'content_preview': content[:500],
+        'content_hash': content_store.content_hash(content),
+        'funnel_stage': funnel_analysis['primary_stage'],
+        'persona_relevance_score': relevance['persona_relevance_score'],
+        'relevant_pain_points': relevance['relevant_pain_points'],
+        'relevant_goals': relevance['relevant_goals'],
+        'entity_analysis': extract_entities(content),
+        'analyzers': analyzer_fingerprints('persona_analyses')
+    }
+
+def call_ai_api(content, prompt, api_provider='openai', headings=None):
+    """Call AI API for advanced analysis of the whole document, section by section"""
+    api_key = st.session_state.api_keys.get(api_provider)
+    
+    if api_key:
+        result = llm_analysis.analyze_document(content, prompt, api_provider, api_key, headings=headings)
+        if result['success']:
+            return result['report']
+        return f"API Error: {result['error']}"
     
     # Fallback analysis if no API key
     return "Advanced AI analysis requires API key configuration. Basic analysis completed."
 
+AI_INSIGHTS_PROMPT = (
+    "Identify the funnel stage this content serves, how well it is optimized for its audience, "
+    "and the most valuable improvements to make."
+)
+
+def _current_user():
+    """Return the per-session id used for background job concurrency limits"""
+    if 'user_id' not in st.session_state:
+        st.session_state.user_id = uuid.uuid4().hex
+    return st.session_state.user_id
+
+def _extraction_job(job, extractor, payload, source=None):
+    """Background job: run an extractor, failing the job on extraction errors"""
+    job.report(0.1, "Extracting content...")
+    result = extractor(payload)
+    if not result['success']:
+        raise RuntimeError(result['error'])
+    if source:
+        result['source'] = source
+    return result
+
+def _analysis_job(job, builder, content, *args):
+    """Background job: run one of the build_* analysis pipelines and keep the full text for search"""
+    job.report(0.1, "Analyzing content...")
+    record = builder(content, *args)
+    content_store.put(content)
+    return record
+
+def _ai_insights_job(job, content, headings, provider, api_key, user):
+    """Background job: map-reduce LLM analysis of a whole document"""
+    job.report(0.0, "Splitting document into sections...")
+    result = llm_analysis.analyze_document(
+        content, AI_INSIGHTS_PROMPT, provider, api_key, headings=headings, user=user,
+        on_progress=lambda done, total: job.report(done / total, f"Analyzed {done}/{total} steps")
+    )
+    if not result['success']:
+        raise RuntimeError(result['error'])
+    return result
+
+def _render_ai_insights(state_key):
+    """Show the merged report of a finished AI insights job"""
+    result = _completed_result(state_key)
+    if result:
+        st.markdown("### 🤖 AI Insights")
+        st.caption(f"{result['provider']} · {result['model']} · {result['chunks']} section(s) covered, "
+                   f"{result['cached_calls']} of {result['calls']} calls answered from cache")
+        if result['failed_chunks']:
+            st.warning(f"⚠️ Not covered: {', '.join(result['failed_chunks'])}")
+        st.markdown(result['report'])
+
+def _analysis_builder(builder, profile_run):
+    """Wrap a build_* pipeline in the profiler when profiling was requested"""
+    if profile_run:
+        return functools.partial(profiling.run_profiled, builder)
+    return builder
+
+def _render_profile(record):
+    """Show the hottest functions of a profiled analysis"""
+    profile = record.get('profile')
+    if not profile:
+        return
+    with st.expander(f"🧪 Profile: {profile['total_ms']:.1f} ms total"):
+        st.caption(f"Raw profile saved to analyzer_data/{profile['path']} (open with `python -m pstats`)")
+        st.dataframe(pd.DataFrame(profile['top_functions']), use_container_width=True)
+
+def _store_record(data_type):
+    """Return an on_complete callback that appends a finished job's record to the store
+
+    The job keeps only the record's id; the UI shows the saved record from session state.
+    """
+    def store(record):
+        record_store.store_records(data_type, [record])
+        return {'record_id': record['id']}
+    return store
+
+def _submit_job(state_key, kind, fn, *args, description='', on_complete=None):
+    """Submit a background job and remember its id in session state"""
+    job_id = get_job_queue().submit(
+        _current_user(), kind, fn, *args, description=description, on_complete=on_complete
+    )
+    st.session_state[state_key] = job_id
+
+def _render_job_status(state_key):
+    """Show progress for the job tracked under state_key; return its snapshot once finished"""
+    job_id = st.session_state.get(state_key)
+    if not job_id:
+        return None
+    
+    job = get_job_queue().status(job_id)
+    if job is None:
+        del st.session_state[state_key]
+        return None
+    
+    if job['status'] in FINISHED_STATUSES:
+        if job['status'] == FAILED:
+            st.error(f"❌ Error: {job['error']}")
+        elif job['status'] == CANCELLED:
+            st.warning("⚠️ Job cancelled")
+        return job
+    
+    st.progress(job['progress'], text=f"⏳ {job['description']} ({job['message'] or job['status']})")
+    refresh_col, cancel_col = st.columns(2)
+    refresh_col.button("🔄 Refresh Status", key=f"{state_key}_refresh")
+    if cancel_col.button("✖️ Cancel", key=f"{state_key}_cancel"):
+        get_job_queue().cancel(job_id)
+        st.rerun()
+    return None
+
+def _completed_result(state_key):
+    """Return the result of the job tracked under state_key if it completed"""
+    job = _render_job_status(state_key)
+    if job and job['status'] == COMPLETED:
+        return job['result']
+    return None
+
+def _saved_record(state_key, session_key):
+    """The record a finished job under state_key saved, returned once: the job is then forgotten
+
+    Until the session has reloaded the record from the store, None is returned and the job is kept.
+    """
+    summary = _completed_result(state_key)
+    if not summary:
+        return None
+    record = next((r for r in reversed(st.session_state[session_key]) if r.get('id') == summary['record_id']), None)
+    if record is not None:
+        del st.session_state[state_key]
+    return record
+
+def _uploaded_batch(files):
+    """Read uploaded files into (filename, bytes) pairs that a background job can own"""
+    return [(f.name, f.getvalue()) for f in files]
+
+def _is_bulk_upload(files):
+    """True when the uploader holds several files or a zip archive"""
+    return len(files) > 1 or any(f.name.lower().endswith('.zip') for f in files)
+
+def _bulk_analysis_job(job, uploads, make_record):
+    """Background job: extract and analyze many uploaded files in parallel"""
+    job.report(0.0, "Extracting files...")
+    
+    def make_and_keep_content(content, headings, filename):
+        record = make_record(content, headings, filename)
+        content_store.put(content)
+        return record
+    
+    return analyze_uploads(
+        uploads, make_and_keep_content,
+        on_progress=lambda done, total: job.report(done / total, f"Processed {done}/{total} files")
+    )
+
+def _crawl_job(job, start, competitor_name, keywords, max_pages, max_depth):
+    """Background job: crawl a competitor site and analyze every page"""
+    job.report(0.0, "Reading robots.txt and sitemaps...")
+    return site_crawler.crawl_competitor_site(
+        start, competitor_name, keywords, max_pages=max_pages, max_depth=max_depth,
+        on_progress=lambda done, total: job.report(done / total, f"Crawled {done}/{total} pages")
+    )
+
+def _render_crawl_results(state_key):
+    """Show the per-page results table for a finished site crawl"""
+    result = _completed_result(state_key)
+    if result:
+        skipped = result['skipped']
+        st.success(f"✅ {result['saved']} pages analyzed and saved")
+        st.caption(f"Skipped {skipped['blocked']} blocked by robots.txt, {skipped['duplicate']} duplicate, "
+                   f"{skipped['offsite']} off-site and {skipped['filtered']} non-page links")
+        st.dataframe(pd.DataFrame(result['rows']), use_container_width=True)
+
+def _tracked_check_job(job, kind):
+    """Background job: re-fetch tracked URLs and re-analyze the ones that changed"""
+    job.report(0.0, "Checking tracked URLs...")
+    return tracked_urls.check_urls(
+        force=True, kind=kind,
+        on_progress=lambda done, total: job.report(done / total, f"Checked {done}/{total} URLs")
+    )
+
+def _render_track_button(record, kind):
+    """Offer to track the URL an analysis came from"""
+    if not record['source'].startswith(('http://', 'https://')):
+        return
+    # A callback, since the results (and this button) are only shown on the rerun the analysis finished
+    st.button("📡 Track this URL for changes", key=f"{kind}_track_{record['id']}", on_click=_track_record,
+              args=(record, kind))
+
+def _track_record(record, kind):
+    """Track the URL an analysis came from with the analysis' keywords"""
+    keywords = [row['keyword'] for row in record['keyword_analysis'].get('keyword_analysis', [])]
+    entry = tracked_urls.track_url(record['source'], kind, record.get('competitor_name', ''), keywords)
+    st.toast(f"✅ Tracking {entry['url']}; it is re-checked every {entry['interval_hours']:g} hours")
+
+def _render_tracked_urls(kind):
+    """List tracked URLs of one kind with their version history and a button to check them now"""
+    state_key = f"{kind}_tracked_job"
+    entries = [e for e in tracked_urls.load_registry() if e['kind'] == kind]
+    if not entries:
+        return
+    
+    st.markdown("---")
+    st.subheader("📡 Tracked URLs")
+    st.dataframe(pd.DataFrame([
+        {'url': e['url'], 'versions': e['versions'], 'last_status': e['last_status'],
+         'last_changed': (e['last_changed'] or '')[:16], 'next_check': e['next_check'][:16]}
+        for e in entries
+    ]), use_container_width=True)
+    if st.button("🔄 Check tracked URLs now", key=f"{state_key}_start"):
+        _submit_job(state_key, 'track', _tracked_check_job, kind, description=f"Checking {len(entries)} tracked URLs")
+    result = _completed_result(state_key)
+    if result:
+        counts = result['counts']
+        st.success(f"✅ {counts.get('changed', 0) + counts.get('new', 0)} changed and re-analyzed, "
+                   f"{counts.get('unchanged', 0) + counts.get('not_modified', 0)} unchanged, "
+                   f"{counts.get('failed', 0)} failed")
+    
+    url = st.selectbox("Version history:", [e['url'] for e in entries], key=f"{kind}_tracked_history")
+    entry = next(e for e in entries if e['url'] == url)
+    for version in reversed(tracked_urls.load_versions(entry['id'])):
+        changes = version['changes']
+        with st.expander(f"v{version['version']} · {version['fetched_at'][:16]} · {tracked_urls.describe_changes(changes)}"):
+            if not changes:
+                st.caption("First analyzed version")
+                continue
+            for section in changes['modified']:
+                st.markdown(f"**~ {section['title'] or '(intro)'}**")
+                if section['diff']:
+                    st.code('\n'.join(section['diff']), language='diff')
+            if changes['added']:
+                st.write(f"**Added:** {', '.join(t or '(intro)' for t in changes['added'])}")
+            if changes['removed']:
+                st.write(f"**Removed:** {', '.join(t or '(intro)' for t in changes['removed'])}")
+
+def _save_personas(personas):
+    """Write the persona list to the store"""
+    try:
+        with metrics.track('save') as save_stage:
+            save_stage.bytes = data_store.save_data('personas', personas)
+    except Exception as e:
+        st.error(f"Error saving data: {str(e)}")
+
+def _store_records(data_type):
+    """Return an on_complete callback that stores a finished bulk job's records
+
+    The job keeps the rest of its result (e.g. the per-file rows) and how many records were saved.
+    """
+    def store(result):
+        record_store.store_records(data_type, result['records'])
+        return {**{key: value for key, value in result.items() if key != 'records'}, 'saved': len(result['records'])}
+    return store
+
+def _render_bulk_results(state_key):
+    """Show the per-file results table for a finished bulk upload job"""
+    result = _completed_result(state_key)
+    if result:
+        rows = result['rows']
+        analyzed = sum(1 for r in rows if r['status'] == 'analyzed')
+        st.success(f"✅ {analyzed} of {len(rows)} files analyzed and saved")
+        st.dataframe(pd.DataFrame(rows), use_container_width=True)
+
+def _render_analysis_results(analysis_result):
+    """Display a completed own-content analysis"""
+    funnel_analysis = analysis_result['funnel_analysis']
+    entity_analysis = analysis_result['entity_analysis']
+    heading_analysis = analysis_result['heading_analysis']
+    keyword_analysis = analysis_result['keyword_analysis']
+    target_keywords = analysis_result['target_keywords']
+    
+    st.markdown("### 📊 Analysis Results")
+    
+    # Funnel Stage
+    stage = funnel_analysis['primary_stage']
+    stage_info = funnel_analysis['stage_info']
+    
+    st.markdown(f"""
+    <div class="funnel-{stage}">
+        <h3>{stage_info['emoji']} {stage_info['title']} Stage</h3>
+        <p><strong>Confidence:</strong> {funnel_analysis['confidence']:.1%}</p>
+        <p>{stage_info['description']}</p>
+        <p><strong>Typical Content Types:</strong> {', '.join(stage_info['content_types'])}</p>
+        <p><strong>Intent Signals:</strong> {', '.join(stage_info['intent_signals'])}</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Entity Analysis
+    st.markdown("### 📈 Content Metrics")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Total Words", f"{entity_analysis['total_words']:,}")
+    col2.metric("Sentences", entity_analysis['total_sentences'])
+    col3.metric("URLs Found", entity_analysis['urls_count'])
+    col4.metric("Statistics", entity_analysis['statistics_count'])
+    
+    # Heading Analysis
+    st.markdown("### 📑 Heading Structure Analysis")
+    if heading_analysis['aligned']:
+        st.markdown('<div class="strength-box">✅ Content structure is well-aligned with headings</div>', unsafe_allow_html=True)
+    else:
+        st.markdown('<div class="improvement-box">⚠️ Content structure needs improvement</div>', unsafe_allow_html=True)
+    
+    if heading_analysis.get('heading_analysis'):
+        with st.expander("View Heading Analysis"):
+            for h in heading_analysis['heading_analysis']:
+                st.write(f"**{h['level'].upper()}:** {h['heading']} (Alignment Score: {h['alignment_score']})")
+    
+    st.markdown("**Suggestions:**")
+    for suggestion in heading_analysis['suggestions']:
+        st.write(f"• {suggestion}")
+    
+    # Keyword Optimization
+    if target_keywords:
+        st.markdown("### 🎯 Keyword Optimization Analysis")
+        
+        if keyword_analysis['optimized']:
+            st.markdown('<div class="strength-box">✅ Keywords are well-optimized</div>', unsafe_allow_html=True)
+        else:
+            st.markdown('<div class="improvement-box">⚠️ Keyword optimization needs attention</div>', unsafe_allow_html=True)
+        
+        # Keyword table
+        kw_df = pd.DataFrame(keyword_analysis['keyword_analysis'])
+        st.dataframe(kw_df, use_container_width=True)
+        
+        st.markdown("**Optimization Suggestions:**")
+        for suggestion in keyword_analysis['suggestions']:
+            st.write(f"• {suggestion}")
+
+# Up to this many newly saved documents are counted for keyword discovery while the page renders
+INLINE_KEYWORD_SYNC_LIMIT = 500
+
+def _keyword_sync_job(job, counts):
+    """Background job: count phrases of analyses saved since the last keyword sync"""
+    def progress(done, total):
+        job.report(done / max(total, 1), f"Counted {done:,}/{total:,} documents")
+    sketch = keyword_discovery.sync_keywords(counts=counts, on_progress=progress)
+    return {'documents': sketch.own.documents + sketch.competitor.documents}
+
+def _discovered_keywords(kind):
+    """Keyword ideas from the library: phrases competitors use and we don't, or competitors' most common ones"""
+    # Only the counts are compared here; new records are streamed from the saved files
+    counts = {data_type: len(st.session_state[session_key]) for data_type, session_key, _ in SEARCH_SOURCES}
+    sketch = keyword_discovery.load_sketch()
+    pending = sketch.pending(counts)
+    if pending and pending <= INLINE_KEYWORD_SYNC_LIMIT:
+        sketch = keyword_discovery.sync_keywords(counts=counts)
+    elif pending:
+        state_key = f"{kind}_keyword_sync_job"
+        if st.button(f"🔤 Count {pending:,} new documents for keyword ideas", key=f"{kind}_keyword_sync"):
+            _submit_job(state_key, 'keywords', _keyword_sync_job, counts,
+                        description=f"Counting phrases in {pending:,} documents")
+        _completed_result(state_key)
+    
+    if kind == 'own':
+        return [row['keyword'] for row in sketch.gaps()]
+    return [term for term, _ in sketch.competitor.top(keyword_discovery.DEFAULT_GAP_LIMIT)]
+
 def render_own_content_tab():
     """Render the Own Content Analysis tab"""
     st.markdown('<h2 class="sub-header">🎯 Your Content Analysis</h2>', unsafe_allow_html=True)
@@ -320,51 +1077,48 @@ def render_own_content_tab():
         content = None
         headings = []
         source = ""
+        bulk_files = None
+        extract_key = f"own_extract_job_{input_method}"
         
         if input_method == "URL":
             url = st.text_input("Enter URL:", placeholder="https://example.com/article")
             if st.button("🔍 Extract Content from URL"):
-                with st.spinner("Extracting content..."):
-                    result = extract_content_from_url(url)
-                    if result['success']:
-                        content = result['content']
-                        headings = result['headings']
-                        source = result['url']
-                        st.success("✅ Content extracted successfully!")
-                    else:
-                        st.error(f"❌ Error: {result['error']}")
+                _submit_job(extract_key, 'extract', _extraction_job, extract_content_from_url, url,
+                            description=f"Extracting {url}")
         
         elif input_method == "PDF Upload":
-            pdf_file = st.file_uploader("Upload PDF file", type=['pdf'])
-            if pdf_file and st.button("📄 Extract Content from PDF"):
-                with st.spinner("Extracting content..."):
-                    result = extract_content_from_pdf(pdf_file)
-                    if result['success']:
-                        content = result['content']
-                        headings = result['headings']
-                        source = result['source']
-                        st.success("✅ Content extracted successfully!")
-                    else:
-                        st.error(f"❌ Error: {result['error']}")
+            pdf_files = st.file_uploader("Upload PDF files or a zip archive", type=['pdf', 'zip'],
+                                         accept_multiple_files=True)
+            if pdf_files and _is_bulk_upload(pdf_files):
+                if st.button(f"📦 Extract & Analyze {len(pdf_files)} Upload(s)"):
+                    bulk_files = pdf_files
+            elif pdf_files and st.button("📄 Extract Content from PDF"):
+                _submit_job(extract_key, 'extract', _extraction_job, extract_content_from_pdf,
+                            io.BytesIO(pdf_files[0].getvalue()), description=f"Extracting {pdf_files[0].name}")
         
         elif input_method == "Word Document Upload":
-            docx_file = st.file_uploader("Upload Word document", type=['docx'])
-            if docx_file and st.button("📝 Extract Content from Document"):
-                with st.spinner("Extracting content..."):
-                    result = extract_content_from_docx(docx_file)
-                    if result['success']:
-                        content = result['content']
-                        headings = result['headings']
-                        source = result['source']
-                        st.success("✅ Content extracted successfully!")
-                    else:
-                        st.error(f"❌ Error: {result['error']}")
+            docx_files = st.file_uploader("Upload Word documents or a zip archive", type=['docx', 'zip'],
+                                          accept_multiple_files=True)
+            if docx_files and _is_bulk_upload(docx_files):
+                if st.button(f"📦 Extract & Analyze {len(docx_files)} Upload(s)"):
+                    bulk_files = docx_files
+            elif docx_files and st.button("📝 Extract Content from Document"):
+                _submit_job(extract_key, 'extract', _extraction_job, extract_content_from_docx,
+                            io.BytesIO(docx_files[0].getvalue()), description=f"Extracting {docx_files[0].name}")
         
         else:  # Direct Text
             content = st.text_area("Paste your content here:", height=300)
             source = "Direct Text Input"
             if content:
                 st.info("✅ Content ready for analysis")
+        
+        if input_method != "Direct Text":
+            result = _completed_result(extract_key)
+            if result:
+                content = result['content']
+                headings = result['headings']
+                source = result.get('url', result.get('source', ''))
+                st.success("✅ Content extracted successfully!")
     
     with col2:
         st.subheader("🎯 Target Keywords")
@@ -375,100 +1129,62 @@ def render_own_content_tab():
         )
         target_keywords = [kw.strip() for kw in keywords_input.split('\n') if kw.strip()]
         
+        discovered = _discovered_keywords('own')
+        if discovered:
+            picked = st.multiselect("💡 Keywords competitors use and you don't:", discovered,
+                                    key="own_discovered_keywords")
+            target_keywords += [kw for kw in picked if kw not in target_keywords]
+        
         if target_keywords:
             st.info(f"📊 {len(target_keywords)} keywords added")
     
+    # Bulk uploads are analyzed with the keywords above once they are read
+    if bulk_files:
+        _submit_job('own_bulk_job', 'bulk_analyze', _bulk_analysis_job, _uploaded_batch(bulk_files),
+                    lambda text, heads, name: build_analysis_result(text, heads, name, target_keywords),
+                    description=f"Analyzing {len(bulk_files)} uploads", on_complete=_store_records('analyses'))
+    _render_bulk_results('own_bulk_job')
+    
     # Analysis section
     if content and len(content) > 100:
         st.markdown("---")
         st.subheader("🔬 Content Analysis")
         
+        profile_run = st.checkbox("🧪 Profile this analysis", key="own_profile",
+                                  help="Run under the profiler and save the hottest functions with the analysis")
         if st.button("🚀 Analyze Content", type="primary"):
-            with st.spinner("Analyzing content..."):
-                # Perform all analyses
-                funnel_analysis = analyze_funnel_stage(content)
-                entity_analysis = extract_entities(content)
-                heading_analysis = analyze_heading_alignment(content, headings)
-                keyword_analysis = analyze_keyword_optimization(content, target_keywords)
-                
-                # Store results
-                analysis_result = {
-                    'timestamp': datetime.now().isoformat(),
-                    'source': source,
-                    'content_preview': content[:500],
-                    'funnel_analysis': funnel_analysis,
-                    'entity_analysis': entity_analysis,
-                    'heading_analysis': heading_analysis,
-                    'keyword_analysis': keyword_analysis,
-                    'target_keywords': target_keywords
-                }
-                
-                # Display results
-                st.markdown("### 📊 Analysis Results")
-                
-                # Funnel Stage
-                stage = funnel_analysis['primary_stage']
-                stage_info = funnel_analysis['stage_info']
-                
-                st.markdown(f"""
-                <div class="funnel-{stage}">
-                    <h3>{stage_info['emoji']} {stage_info['title']} Stage</h3>
-                    <p><strong>Confidence:</strong> {funnel_analysis['confidence']:.1%}</p>
-                    <p>{stage_info['description']}</p>
-                    <p><strong>Typical Content Types:</strong> {', '.join(stage_info['content_types'])}</p>
-                    <p><strong>Intent Signals:</strong> {', '.join(stage_info['intent_signals'])}</p>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Entity Analysis
-                st.markdown("### 📈 Content Metrics")
-                col1, col2, col3, col4 = st.columns(4)
-                col1.metric("Total Words", f"{entity_analysis['total_words']:,}")
-                col2.metric("Sentences", entity_analysis['total_sentences'])
-                col3.metric("URLs Found", entity_analysis['urls_count'])
-                col4.metric("Statistics", entity_analysis['statistics_count'])
-                
-                # Heading Analysis
-                st.markdown("### 📑 Heading Structure Analysis")
-                if heading_analysis['aligned']:
-                    st.markdown('<div class="strength-box">✅ Content structure is well-aligned with headings</div>', unsafe_allow_html=True)
-                else:
-                    st.markdown('<div class="improvement-box">⚠️ Content structure needs improvement</div>', unsafe_allow_html=True)
-                
-                if headings:
-                    with st.expander("View Heading Analysis"):
-                        for h in heading_analysis['heading_analysis']:
-                            st.write(f"**{h['level'].upper()}:** {h['heading']} (Alignment Score: {h['alignment_score']})")
-                
-                st.markdown("**Suggestions:**")
-                for suggestion in heading_analysis['suggestions']:
-                    st.write(f"• {suggestion}")
-                
-                # Keyword Optimization
-                if target_keywords:
-                    st.markdown("### 🎯 Keyword Optimization Analysis")
-                    
-                    if keyword_analysis['optimized']:
-                        st.markdown('<div class="strength-box">✅ Keywords are well-optimized</div>', unsafe_allow_html=True)
-                    else:
-                        st.markdown('<div class="improvement-box">⚠️ Keyword optimization needs attention</div>', unsafe_allow_html=True)
-                    
-                    # Keyword table
-                    kw_df = pd.DataFrame(keyword_analysis['keyword_analysis'])
-                    st.dataframe(kw_df, use_container_width=True)
-                    
-                    st.markdown("**Optimization Suggestions:**")
-                    for suggestion in keyword_analysis['suggestions']:
-                        st.write(f"• {suggestion}")
-                
-                # Save analysis
-                col1, col2 = st.columns([3, 1])
-                with col2:
-                    if st.button("💾 Save Analysis"):
-                        st.session_state.saved_analyses.append(analysis_result)
-                        from content_analyzer import save_data
-                        if save_data('analyses', st.session_state.saved_analyses):
-                            st.success("✅ Analysis saved!")
+            _submit_job('own_analysis_job', 'analyze', _analysis_job, _analysis_builder(build_analysis_result, profile_run),
+                        content, headings, source, target_keywords,
+                        description=f"Analyzing {source}", on_complete=_store_record('analyses'))
+        
+        with st.expander("🤖 AI Insights (uses your API key)"):
+            providers = [p for p in llm_analysis.PROVIDERS if st.session_state.api_keys.get(p)]
+            if not providers:
+                st.info("Add an API key in the sidebar to enable AI insights")
+            else:
+                provider = st.selectbox("Provider:", providers, key="own_ai_provider")
+                plan = llm_analysis.plan_document(content, AI_INSIGHTS_PROMPT, provider, headings)
+                remaining = llm_budget.USER_LEDGER.remaining(_current_user())
+                st.caption(f"{plan['chunks']} section(s), {plan['calls']} call(s) to {plan['model']}: "
+                           f"up to {plan['total_tokens']:,} tokens, ~${plan['cost']:.2f}, ~{plan['seconds']:.0f}s. "
+                           f"{remaining:,} tokens left in your daily budget.")
+                over_budget = plan['total_tokens'] > remaining
+                if over_budget:
+                    st.warning("⚠️ This document exceeds your remaining AI token budget")
+                if st.button("🤖 Generate AI Insights", disabled=over_budget):
+                    _submit_job('own_ai_job', 'ai_insights', _ai_insights_job, content, headings, provider,
+                                st.session_state.api_keys[provider], _current_user(),
+                                description=f"AI insights for {source}")
+    
+    _render_ai_insights('own_ai_job')
+    
+    # Results land in the store when the background job finishes
+    analysis_result = _saved_record('own_analysis_job', 'saved_analyses')
+    if analysis_result:
+        _render_analysis_results(analysis_result)
+        _render_profile(analysis_result)
+        st.success("✅ Analysis saved!")
+        _render_track_button(analysis_result, 'own')
     
     # View saved analyses
     if st.session_state.saved_analyses:
@@ -481,6 +1197,95 @@ def render_own_content_tab():
                 st.write(f"**Date:** {analysis['timestamp']}")
                 st.write(f"**Funnel Stage:** {analysis['funnel_analysis']['stage_info']['emoji']} {analysis['funnel_analysis']['stage_info']['title']}")
                 st.write(f"**Content Preview:** {analysis['content_preview']}...")
+    
+    _render_tracked_urls('own')
+
+def _render_competitor_results(comp_analysis):
+    """Display a completed competitor analysis"""
+    competitor_name = comp_analysis['competitor_name']
+    funnel_analysis = comp_analysis['funnel_analysis']
+    entity_analysis = comp_analysis['entity_analysis']
+    headings_count = comp_analysis.get('headings_count', 0)
+    
+    st.markdown(f"### 📊 Analysis: {competitor_name}")
+    
+    # Funnel Stage
+    stage = funnel_analysis['primary_stage']
+    stage_info = funnel_analysis['stage_info']
+    
+    st.markdown(f"""
+    <div class="funnel-{stage}">
+        <h4>{stage_info['emoji']} {stage_info['title']} Stage Content</h4>
+        <p>{stage_info['description']}</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Comparative Insights
+    st.markdown("### 💡 Competitive Insights")
+    
+    insights_col1, insights_col2 = st.columns(2)
+    
+    # Records saved before insights were stored get them computed on display
+    insights = comp_analysis.get('competitive_insights') or assess_competitor(entity_analysis, headings_count)
+    
+    with insights_col1:
+        st.markdown("#### 💪 Competitor Strengths")
+        strengths = insights['strengths']
+        
+        if strengths:
+            for strength in strengths:
+                st.write(strength)
+        else:
+            st.write("Basic content structure")
+    
+    with insights_col2:
+        st.markdown("#### 🎯 Opportunities for You")
+        opportunities = insights['opportunities']
+        
+        if opportunities:
+            for opp in opportunities:
+                st.write(opp)
+        else:
+            st.write("Competitor has strong content - focus on differentiation")
+
+def _rollup_sync_job(job):
+    """Background job: add saved competitor analyses missing from the weekly rollups"""
+    job.report(0.0, "Reading saved competitor analyses...")
+    return {'added': competitor_rollups.sync_rollups()}
+
+def _render_competitor_trends():
+    """Weekly charts of competitor output from the precomputed rollups"""
+    rollup = competitor_rollups.load_rollups()
+    # Saving keeps the rollups current; analyses saved before they existed are added on request
+    missing = len(st.session_state.competitor_analyses) - competitor_rollups.counted_assets(rollup)
+    if rollup.empty and missing <= 0:
+        return
+    
+    st.markdown("---")
+    st.subheader("📈 Competitor Trends")
+    if missing > 0:
+        if st.button(f"📈 Add {missing:,} saved analyses to the trends", key="trend_sync"):
+            _submit_job('trend_sync_job', 'rollups', _rollup_sync_job,
+                        description="Adding saved analyses to the competitor trends")
+        _completed_result('trend_sync_job')
+    if rollup.empty:
+        return
+    stage_labels = {competitor_rollups.ALL_STAGES: "All stages",
+                    **{stage: f"{info['emoji']} {info['title']}" for stage, info in FUNNEL_STAGES.items()}}
+    col1, col2, col3 = st.columns(3)
+    competitors = col1.multiselect("Competitors:", sorted(rollup['competitor'].unique()), key="trend_competitors")
+    stage = col2.selectbox("Funnel stage:", list(stage_labels), format_func=stage_labels.get, key="trend_stage")
+    metric = col3.selectbox("Metric:", list(competitor_rollups.METRICS),
+                            format_func=competitor_rollups.METRICS.get, key="trend_metric")
+    
+    if competitors:
+        rollup = rollup[rollup['competitor'].isin(competitors)]
+    trend = competitor_rollups.weekly_trend(rollup, metric, stage)
+    if trend.empty:
+        st.info("No competitor content at this stage yet.")
+    else:
+        st.line_chart(trend)
+        st.caption(f"{competitor_rollups.METRICS[metric]} per week, {stage_labels[stage].lower()}")
 
 def render_competitor_tab():
     """Render the Competitor Analysis tab"""
@@ -499,7 +1304,7 @@ def render_competitor_tab():
         
         comp_input_method = st.radio(
             "Choose input method:",
-            ["URL", "PDF Upload", "Word Document Upload", "Direct Text"],
+            ["URL", "Site Crawl", "PDF Upload", "Word Document Upload", "Direct Text"],
             horizontal=True,
             key="comp_input"
         )
@@ -509,49 +1314,61 @@ def render_competitor_tab():
         content = None
         headings = []
         source = ""
+        bulk_files = None
+        crawl_start = None
+        extract_key = f"comp_extract_job_{comp_input_method}"
         
         if comp_input_method == "URL":
             url = st.text_input("Enter Competitor URL:", placeholder="https://competitor.com/article", key="comp_url")
             if st.button("🔍 Extract Competitor Content"):
-                with st.spinner("Extracting content..."):
-                    result = extract_content_from_url(url)
-                    if result['success']:
-                        content = result['content']
-                        headings = result['headings']
-                        source = result['url']
-                        st.success("✅ Content extracted successfully!")
-                    else:
-                        st.error(f"❌ Error: {result['error']}")
+                _submit_job(extract_key, 'extract', _extraction_job, extract_content_from_url, url,
+                            description=f"Extracting {url}")
+        
+        elif comp_input_method == "Site Crawl":
+            start = st.text_input("Site or sitemap to crawl:", key="comp_crawl_start",
+                                  placeholder="competitor.com or https://competitor.com/sitemap.xml")
+            pages_col, depth_col = st.columns(2)
+            max_pages = pages_col.number_input("Max pages:", min_value=1, max_value=5000,
+                                               value=site_crawler.DEFAULT_MAX_PAGES, key="comp_crawl_pages")
+            max_depth = depth_col.number_input("Max link depth:", min_value=0, max_value=10,
+                                               value=site_crawler.DEFAULT_MAX_DEPTH, key="comp_crawl_depth")
+            st.caption("Follows the site's sitemaps and links, honoring robots.txt and pausing between requests.")
+            if start and st.button("🕸️ Crawl & Analyze Site"):
+                crawl_start = start
         
         elif comp_input_method == "PDF Upload":
-            pdf_file = st.file_uploader("Upload Competitor PDF", type=['pdf'], key="comp_pdf")
-            if pdf_file and st.button("📄 Extract Competitor PDF Content"):
-                with st.spinner("Extracting content..."):
-                    result = extract_content_from_pdf(pdf_file)
-                    if result['success']:
-                        content = result['content']
-                        headings = result['headings']
-                        source = "Competitor PDF"
-                        st.success("✅ Content extracted successfully!")
-                    else:
-                        st.error(f"❌ Error: {result['error']}")
+            pdf_files = st.file_uploader("Upload Competitor PDFs or a zip archive", type=['pdf', 'zip'],
+                                         accept_multiple_files=True, key="comp_pdf")
+            if pdf_files and _is_bulk_upload(pdf_files):
+                if st.button(f"📦 Extract & Analyze {len(pdf_files)} Competitor Upload(s)"):
+                    bulk_files = pdf_files
+            elif pdf_files and st.button("📄 Extract Competitor PDF Content"):
+                _submit_job(extract_key, 'extract', _extraction_job, extract_content_from_pdf,
+                            io.BytesIO(pdf_files[0].getvalue()), "Competitor PDF",
+                            description=f"Extracting {pdf_files[0].name}")
         
         elif comp_input_method == "Word Document Upload":
-            docx_file = st.file_uploader("Upload Competitor Document", type=['docx'], key="comp_docx")
-            if docx_file and st.button("📝 Extract Competitor Document Content"):
-                with st.spinner("Extracting content..."):
-                    result = extract_content_from_docx(docx_file)
-                    if result['success']:
-                        content = result['content']
-                        headings = result['headings']
-                        source = "Competitor Document"
-                        st.success("✅ Content extracted successfully!")
-                    else:
-                        st.error(f"❌ Error: {result['error']}")
+            docx_files = st.file_uploader("Upload Competitor Documents or a zip archive", type=['docx', 'zip'],
+                                          accept_multiple_files=True, key="comp_docx")
+            if docx_files and _is_bulk_upload(docx_files):
+                if st.button(f"📦 Extract & Analyze {len(docx_files)} Competitor Upload(s)"):
+                    bulk_files = docx_files
+            elif docx_files and st.button("📝 Extract Competitor Document Content"):
+                _submit_job(extract_key, 'extract', _extraction_job, extract_content_from_docx,
+                            io.BytesIO(docx_files[0].getvalue()), "Competitor Document",
+                            description=f"Extracting {docx_files[0].name}")
         
         else:
             content = st.text_area("Paste competitor content:", height=300, key="comp_text")
             source = "Competitor Direct Input"
+        
+        if comp_input_method not in ("Direct Text", "Site Crawl"):
+            result = _completed_result(extract_key)
+            if result:
+                content = result['content']
+                headings = result['headings']
+                source = result.get('url', result.get('source', ''))
+                st.success("✅ Content extracted successfully!")
     
     with col2:
         st.subheader("🎯 Analysis Keywords")
@@ -562,87 +1379,56 @@ def render_competitor_tab():
             placeholder="keyword 1\nkeyword 2\nkeyword 3"
         )
         comp_keywords = [kw.strip() for kw in comp_keywords_input.split('\n') if kw.strip()]
+        
+        discovered = _discovered_keywords('competitor')
+        if discovered:
+            picked = st.multiselect("💡 Competitors' most common phrases:", discovered,
+                                    key="comp_discovered_keywords")
+            comp_keywords += [kw for kw in picked if kw not in comp_keywords]
+    
+    # Bulk uploads are analyzed with the keywords above once they are read
+    if bulk_files:
+        if not competitor_name:
+            st.warning("⚠️ Enter a competitor name before analyzing uploads")
+        else:
+            _submit_job('comp_bulk_job', 'bulk_analyze', _bulk_analysis_job, _uploaded_batch(bulk_files),
+                        lambda text, heads, name: build_competitor_analysis(text, heads, name, competitor_name, comp_keywords),
+                        description=f"Analyzing {len(bulk_files)} {competitor_name} uploads",
+                        on_complete=_store_records('competitor_analyses'))
+    _render_bulk_results('comp_bulk_job')
+    
+    # Crawled pages are analyzed with the same keywords as they arrive
+    if crawl_start:
+        if not competitor_name:
+            st.warning("⚠️ Enter a competitor name before crawling")
+        else:
+            _submit_job('comp_crawl_job', 'crawl', _crawl_job, crawl_start, competitor_name, comp_keywords,
+                        int(max_pages), int(max_depth), description=f"Crawling {crawl_start} for {competitor_name}",
+                        on_complete=_store_records('competitor_analyses'))
+    _render_crawl_results('comp_crawl_job')
     
     # Competitor Analysis
     if content and competitor_name and len(content) > 100:
         st.markdown("---")
         
+        profile_run = st.checkbox("🧪 Profile this analysis", key="comp_profile",
+                                  help="Run under the profiler and save the hottest functions with the analysis")
         if st.button("🚀 Analyze Competitor Content", type="primary", key="analyze_comp"):
-            with st.spinner("Analyzing competitor content..."):
-                funnel_analysis = analyze_funnel_stage(content)
-                entity_analysis = extract_entities(content)
-                heading_analysis = analyze_heading_alignment(content, headings)
-                keyword_analysis = analyze_keyword_optimization(content, comp_keywords)
-                
-                comp_analysis = {
-                    'timestamp': datetime.now().isoformat(),
-                    'competitor_name': competitor_name,
-                    'source': source,
-                    'content_preview': content[:500],
-                    'funnel_analysis': funnel_analysis,
-                    'entity_analysis': entity_analysis,
-                    'heading_analysis': heading_analysis,
-                    'keyword_analysis': keyword_analysis
-                }
-                
-                st.markdown(f"### 📊 Analysis: {competitor_name}")
-                
-                # Funnel Stage
-                stage = funnel_analysis['primary_stage']
-                stage_info = funnel_analysis['stage_info']
-                
-                st.markdown(f"""
-                <div class="funnel-{stage}">
-                    <h4>{stage_info['emoji']} {stage_info['title']} Stage Content</h4>
-                    <p>{stage_info['description']}</p>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Comparative Insights
-                st.markdown("### 💡 Competitive Insights")
-                
-                insights_col1, insights_col2 = st.columns(2)
-                
-                with insights_col1:
-                    st.markdown("#### 💪 Competitor Strengths")
-                    strengths = []
-                    
-                    if entity_analysis['total_words'] > 1500:
-                        strengths.append(f"✅ Comprehensive content ({entity_analysis['total_words']:,} words)")
-                    if entity_analysis['statistics_count'] > 5:
-                        strengths.append(f"✅ Data-driven ({entity_analysis['statistics_count']} statistics)")
-                    if len(headings) >= 5:
-                        strengths.append(f"✅ Well-structured ({len(headings)} headings)")
-                    
-                    if strengths:
-                        for strength in strengths:
-                            st.write(strength)
-                    else:
-                        st.write("Basic content structure")
-                
-                with insights_col2:
-                    st.markdown("#### 🎯 Opportunities for You")
-                    opportunities = []
-                    
-                    if entity_analysis['total_words'] < 1000:
-                        opportunities.append("📝 Create more comprehensive content")
-                    if entity_analysis['statistics_count'] < 3:
-                        opportunities.append("📊 Add more data and statistics")
-                    if len(headings) < 3:
-                        opportunities.append("📑 Improve content structure")
-                    
-                    if opportunities:
-                        for opp in opportunities:
-                            st.write(opp)
-                    else:
-                        st.write("Competitor has strong content - focus on differentiation")
-                
-                # Save analysis
-                if st.button("💾 Save Competitor Analysis"):
-                    st.session_state.competitor_analyses.append(comp_analysis)
-                    from content_analyzer import save_data
-                    if save_data('competitor_analyses', st.session_state.competitor_analyses):
-                        st.success("✅ Competitor analysis saved!")
+            _submit_job('comp_analysis_job', 'analyze', _analysis_job,
+                        _analysis_builder(build_competitor_analysis, profile_run),
+                        content, headings, source, competitor_name, comp_keywords,
+                        description=f"Analyzing {competitor_name}",
+                        on_complete=_store_record('competitor_analyses'))
+    
+    # Results land in the store when the background job finishes
+    comp_analysis = _saved_record('comp_analysis_job', 'competitor_analyses')
+    if comp_analysis:
+        _render_competitor_results(comp_analysis)
+        _render_profile(comp_analysis)
+        st.success("✅ Competitor analysis saved!")
+        _render_track_button(comp_analysis, 'competitor')
+    
+    _render_competitor_trends()
     
     # View saved competitor analyses
     if st.session_state.competitor_analyses:
@@ -654,6 +1440,119 @@ def render_competitor_tab():
                 st.write(f"**Competitor:** {analysis['competitor_name']}")
                 st.write(f"**Source:** {analysis['source']}")
                 st.write(f"**Funnel Stage:** {analysis['funnel_analysis']['stage_info']['title']}")
+    
+    _render_tracked_urls('competitor')
+
+def _render_persona_results(persona_analysis):
+    """Display a completed persona analysis"""
+    persona = persona_analysis['persona']
+    stage_info = FUNNEL_STAGES[persona_analysis['funnel_stage']]
+    relevant_pain_points = persona_analysis['relevant_pain_points']
+    relevant_goals = persona_analysis['relevant_goals']
+    
+    st.markdown("### 📊 Persona Analysis Results")
+    
+    # Relevance score
+    total_points = len(persona['pain_points']) + len(persona['goals'])
+    relevance_pct = (persona_analysis['persona_relevance_score'] / total_points) * 100 if total_points > 0 else 0
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Persona Relevance", f"{relevance_pct:.0f}%")
+    col2.metric("Funnel Stage", stage_info['emoji'] + " " + stage_info['title'])
+    col3.metric("Content Type", persona_analysis['asset_type'])
+    
+    # Relevant pain points and goals
+    st.markdown("#### ✅ Addressed in Content")
+    pcol1, pcol2 = st.columns(2)
+    
+    with pcol1:
+        st.write("**Pain Points:**")
+        if relevant_pain_points:
+            for pp in relevant_pain_points:
+                st.write(f"✅ {pp}")
+        else:
+            st.write("❌ None addressed")
+    
+    with pcol2:
+        st.write("**Goals:**")
+        if relevant_goals:
+            for goal in relevant_goals:
+                st.write(f"✅ {goal}")
+        else:
+            st.write("❌ None addressed")
+    
+    # Missing elements
+    st.markdown("#### ⚠️ Missing from Content")
+    missing_pain = [pp for pp in persona['pain_points'] if pp not in relevant_pain_points]
+    missing_goals = [g for g in persona['goals'] if g not in relevant_goals]
+    
+    if missing_pain:
+        st.write("**Pain Points to Address:**")
+        for pp in missing_pain:
+            st.write(f"• {pp}")
+    
+    if missing_goals:
+        st.write("**Goals to Highlight:**")
+        for goal in missing_goals:
+            st.write(f"• {goal}")
+
+# New analyses up to this many are folded into the topic clusters while the page renders
+INLINE_CLUSTER_UPDATE_LIMIT = 200
+
+def _library_records():
+    """(data type, record) pairs of every saved analysis in this session"""
+    return [(data_type, record) for data_type, session_key, _ in SEARCH_SOURCES
+            for record in st.session_state[session_key]]
+
+def _topic_cluster_job(job, records, rebuild, n_clusters):
+    """Background job: cluster the library from scratch or fold in analyses saved since"""
+    def progress(done, total):
+        job.report(done / max(total, 1), f"Processed {done:,}/{total:,} documents")
+    if rebuild:
+        model = topic_clusters.build_clusters(n_clusters, records=records, on_progress=progress)
+        return {'assigned': len(model.assignments), 'clusters': model.n_clusters}
+    return {'assigned': topic_clusters.update_clusters(records, on_progress=progress)}
+
+def _render_topic_clusters():
+    """Show topic clusters of the library with persona x funnel stage coverage for each"""
+    st.markdown("### 🗂️ Topic Coverage")
+    st.caption("Your library and competitors' content grouped by topic, to spot topics you over- or under-cover.")
+    
+    records = _library_records()
+    col1, col2 = st.columns([1, 2])
+    n_clusters = col1.number_input("Topics:", min_value=2, max_value=50,
+                                   value=topic_clusters.DEFAULT_CLUSTERS, key="topic_cluster_count")
+    if col2.button("🗂️ Cluster Library", key="topic_cluster_build", disabled=not records):
+        _submit_job('topic_cluster_job', 'topics', _topic_cluster_job, list(records), True, int(n_clusters),
+                    description=f"Clustering {len(records)} documents into {int(n_clusters)} topics")
+    _completed_result('topic_cluster_job')
+    
+    model = topic_clusters.load_clusters()
+    if model is None:
+        st.info("Cluster the library to see which topics it covers.")
+        return
+    
+    new_count = topic_clusters.unclustered_count(model, records)
+    if new_count and new_count <= INLINE_CLUSTER_UPDATE_LIMIT:
+        topic_clusters.update_clusters(records)
+        model = topic_clusters.load_clusters()
+    elif new_count:
+        st.caption(f"{new_count:,} analyses saved since the last clustering are not assigned yet.")
+        if st.button("➕ Assign New Analyses", key="topic_cluster_update"):
+            _submit_job('topic_cluster_job', 'topics', _topic_cluster_job, list(records), False, int(n_clusters),
+                        description=f"Assigning {new_count:,} new documents to topics")
+    
+    stages = list(FUNNEL_STAGES)
+    for cluster in topic_clusters.cluster_coverage(model, records):
+        own_count = cluster['size'] - cluster['competitor_assets']
+        with st.expander(f"🗂️ {cluster['label']} - {own_count} own, {cluster['competitor_assets']} competitor"):
+            if not own_count:
+                st.warning("⚠️ Competitors cover this topic and you have no content on it")
+            if cluster['coverage']:
+                coverage = pd.DataFrame.from_dict(cluster['coverage'], orient='index')
+                coverage = coverage.reindex(columns=stages, fill_value=0).fillna(0).astype(int)
+                coverage.columns = [FUNNEL_STAGES[s]['title'] for s in stages]
+                st.dataframe(coverage, use_container_width=True)
 
 def render_persona_tab():
     """Render the Persona-Based Analysis tab"""
@@ -693,7 +1592,7 @@ def render_persona_tab():
                 
                 if submitted and persona_name and role_title:
                     new_persona = {
-                        'id': len(st.session_state.personas) + 1,
+                        'id': uuid.uuid4().hex,
                         'name': persona_name,
                         'role': role_title,
                         'description': description,
@@ -703,8 +1602,7 @@ def render_persona_tab():
                     }
                     
                     st.session_state.personas.append(new_persona)
-                    from content_analyzer import save_data
-                    save_data('personas', st.session_state.personas)
+                    _save_personas(st.session_state.personas)
                     st.success(f"✅ Persona '{persona_name}' added successfully!")
                     st.rerun()
         
@@ -718,41 +1616,36 @@ def render_persona_tab():
             
             if uploaded_file:
                 try:
-                    if uploaded_file.name.endswith('.csv'):
-                        df = pd.read_csv(uploaded_file)
-                    else:
-                        df = pd.read_excel(uploaded_file)
+                    df = persona_import.read_persona_sheet(uploaded_file, uploaded_file.name)
                     
                     st.write("Preview:")
                     st.dataframe(df.head())
                     
                     if st.button("📥 Import Personas"):
-                        for _, row in df.iterrows():
-                            new_persona = {
-                                'id': len(st.session_state.personas) + 1,
-                                'name': row.get('Persona Name', ''),
-                                'role': row.get('Role/Title', ''),
-                                'description': row.get('Description', ''),
-                                'pain_points': str(row.get('Pain Points', '')).split(',') if pd.notna(row.get('Pain Points')) else [],
-                                'goals': str(row.get('Goals', '')).split(',') if pd.notna(row.get('Goals')) else [],
-                                'created_at': datetime.now().isoformat()
-                            }
-                            st.session_state.personas.append(new_persona)
-                        
-                        from content_analyzer import save_data
-                        save_data('personas', st.session_state.personas)
-                        st.success(f"✅ {len(df)} personas imported successfully!")
-                        st.rerun()
+                        result = persona_import.import_personas(df)
+                        if result['success']:
+                            st.session_state.personas = result['personas']
+                            st.session_state.persona_import_result = result
+                            st.rerun()
+                        else:
+                            st.error(f"❌ Error: {result['error']}")
                 
                 except Exception as e:
                     st.error(f"Error reading file: {str(e)}")
+            
+            result = st.session_state.pop('persona_import_result', None)
+            if result:
+                st.success(f"✅ {result['added']} personas added, {result['updated']} updated")
+                if result['rejected']:
+                    st.warning(f"⚠️ {len(result['rejected'])} rows skipped")
+                    st.dataframe(pd.DataFrame(result['rejected']), use_container_width=True)
         
         # Display existing personas
         if st.session_state.personas:
             st.markdown("---")
             st.subheader("📋 Your Personas")
             
-            for persona in st.session_state.personas:
+            for idx, persona in enumerate(st.session_state.personas):
                 with st.expander(f"👤 {persona['name']} - {persona['role']}"):
                     st.write(f"**Description:** {persona['description']}")
                     st.write(f"**Pain Points:**")
@@ -762,10 +1655,10 @@ def render_persona_tab():
                     for goal in persona['goals']:
                         st.write(f"  • {goal}")
                     
-                    if st.button(f"🗑️ Delete", key=f"del_{persona['id']}"):
-                        st.session_state.personas = [p for p in st.session_state.personas if p['id'] != persona['id']]
-                        from content_analyzer import save_data
-                        save_data('personas', st.session_state.personas)
+                    # Personas saved by older versions can share an id, so the position picks the one to delete
+                    if st.button(f"🗑️ Delete", key=f"del_{idx}_{persona['id']}"):
+                        st.session_state.personas = st.session_state.personas[:idx] + st.session_state.personas[idx + 1:]
+                        _save_personas(st.session_state.personas)
                         st.rerun()
     
     with persona_subtab2:
@@ -799,118 +1692,55 @@ def render_persona_tab():
             
             content = None
             asset_url = ""
+            extract_key = f"persona_extract_job_{asset_input}"
             
             if asset_input == "URL":
                 asset_url = st.text_input("Asset URL:", key="persona_url")
                 if st.button("Extract Content", key="persona_extract"):
-                    result = extract_content_from_url(asset_url)
-                    if result['success']:
-                        content = result['content']
-                        st.success("✅ Content extracted!")
+                    _submit_job(extract_key, 'extract', _extraction_job, extract_content_from_url, asset_url,
+                                description=f"Extracting {asset_url}")
             
             elif asset_input == "File Upload":
-                uploaded = st.file_uploader("Upload file", type=['pdf', 'docx'], key="persona_file")
-                if uploaded:
-                    if uploaded.name.endswith('.pdf'):
-                        result = extract_content_from_pdf(uploaded)
-                    else:
-                        result = extract_content_from_docx(uploaded)
-                    
-                    if result['success']:
-                        content = result['content']
-                        st.success("✅ Content extracted!")
+                uploaded_files = st.file_uploader("Upload files or a zip archive", type=['pdf', 'docx', 'zip'],
+                                                  accept_multiple_files=True, key="persona_file")
+                if uploaded_files and _is_bulk_upload(uploaded_files):
+                    if st.button(f"📦 Analyze {len(uploaded_files)} Upload(s) for Persona", key="persona_bulk"):
+                        _submit_job('persona_bulk_job', 'bulk_analyze', _bulk_analysis_job,
+                                    _uploaded_batch(uploaded_files),
+                                    lambda text, heads, name: build_persona_analysis(text, selected_persona, asset_type, name),
+                                    description=f"Analyzing {len(uploaded_files)} uploads for {selected_persona['name']}",
+                                    on_complete=_store_records('persona_analyses'))
+                elif uploaded_files and st.button("Extract Content", key="persona_file_extract"):
+                    uploaded = uploaded_files[0]
+                    extractor = extract_content_from_pdf if uploaded.name.endswith('.pdf') else extract_content_from_docx
+                    _submit_job(extract_key, 'extract', _extraction_job, extractor,
+                                io.BytesIO(uploaded.getvalue()), description=f"Extracting {uploaded.name}")
+                _render_bulk_results('persona_bulk_job')
             
             else:
                 content = st.text_area("Paste content:", height=200, key="persona_content")
             
+            if asset_input != "Direct Text":
+                result = _completed_result(extract_key)
+                if result:
+                    content = result['content']
+                    st.success("✅ Content extracted!")
+            
+            profile_run = st.checkbox("🧪 Profile this analysis", key="persona_profile",
+                                      help="Run under the profiler and save the hottest functions with the analysis")
             if content and st.button("🔬 Analyze for Persona", key="analyze_persona"):
-                with st.spinner("Analyzing content for persona fit..."):
-                    funnel_analysis = analyze_funnel_stage(content)
-                    entity_analysis = extract_entities(content)
-                    
-                    # Persona-specific analysis
-                    persona_relevance_score = 0
-                    relevant_pain_points = []
-                    relevant_goals = []
-                    
-                    content_lower = content.lower()
-                    
-                    # Check for pain points
-                    for pain_point in selected_persona['pain_points']:
-                        if any(word.lower() in content_lower for word in pain_point.split()):
-                            persona_relevance_score += 1
-                            relevant_pain_points.append(pain_point)
-                    
-                    # Check for goals
-                    for goal in selected_persona['goals']:
-                        if any(word.lower() in content_lower for word in goal.split()):
-                            persona_relevance_score += 1
-                            relevant_goals.append(goal)
-                    
-                    persona_analysis = {
-                        'timestamp': datetime.now().isoformat(),
-                        'persona': selected_persona,
-                        'asset_type': asset_type,
-                        'asset_url': asset_url,
-                        'content_preview': content[:500],
-                        'funnel_stage': funnel_analysis['primary_stage'],
-                        'persona_relevance_score': persona_relevance_score,
-                        'relevant_pain_points': relevant_pain_points,
-                        'relevant_goals': relevant_goals,
-                        'entity_analysis': entity_analysis
-                    }
-                    
-                    st.markdown("### 📊 Persona Analysis Results")
-                    
-                    # Relevance score
-                    relevance_pct = (persona_relevance_score / (len(selected_persona['pain_points']) + len(selected_persona['goals']))) * 100 if (len(selected_persona['pain_points']) + len(selected_persona['goals'])) > 0 else 0
-                    
-                    col1, col2, col3 = st.columns(3)
-                    col1.metric("Persona Relevance", f"{relevance_pct:.0f}%")
-                    col2.metric("Funnel Stage", funnel_analysis['stage_info']['emoji'] + " " + funnel_analysis['stage_info']['title'])
-                    col3.metric("Content Type", asset_type)
-                    
-                    # Relevant pain points and goals
-                    st.markdown("#### ✅ Addressed in Content")
-                    pcol1, pcol2 = st.columns(2)
-                    
-                    with pcol1:
-                        st.write("**Pain Points:**")
-                        if relevant_pain_points:
-                            for pp in relevant_pain_points:
-                                st.write(f"✅ {pp}")
-                        else:
-                            st.write("❌ None addressed")
-                    
-                    with pcol2:
-                        st.write("**Goals:**")
-                        if relevant_goals:
-                            for goal in relevant_goals:
-                                st.write(f"✅ {goal}")
-                        else:
-                            st.write("❌ None addressed")
-                    
-                    # Missing elements
-                    st.markdown("#### ⚠️ Missing from Content")
-                    missing_pain = [pp for pp in selected_persona['pain_points'] if pp not in relevant_pain_points]
-                    missing_goals = [g for g in selected_persona['goals'] if g not in relevant_goals]
-                    
-                    if missing_pain:
-                        st.write("**Pain Points to Address:**")
-                        for pp in missing_pain:
-                            st.write(f"• {pp}")
-                    
-                    if missing_goals:
-                        st.write("**Goals to Highlight:**")
-                        for goal in missing_goals:
-                            st.write(f"• {goal}")
-                    
-                    # Save analysis
-                    if st.button("💾 Save Persona Analysis"):
-                        st.session_state.persona_analyses.append(persona_analysis)
-                        from content_analyzer import save_data
-                        save_data('persona_analyses', st.session_state.persona_analyses)
-                        st.success("✅ Analysis saved!")
+                _submit_job('persona_analysis_job', 'analyze', _analysis_job,
+                            _analysis_builder(build_persona_analysis, profile_run),
+                            content, selected_persona, asset_type, asset_url,
+                            description=f"Analyzing for {selected_persona['name']}",
+                            on_complete=_store_record('persona_analyses'))
+            
+            # Results land in the store when the background job finishes
+            persona_analysis = _saved_record('persona_analysis_job', 'persona_analyses')
+            if persona_analysis:
+                _render_persona_results(persona_analysis)
+                _render_profile(persona_analysis)
+                st.success("✅ Analysis saved!")
     
     with persona_subtab3:
         st.subheader("🎯 Opportunities & Focus Areas")
@@ -1010,3 +1840,112 @@ def render_persona_tab():
                 st.dataframe(rec_df, use_container_width=True)
             else:
                 st.success("✅ Great job! You have content across all funnel stages for all personas.")
+        
+        _render_topic_clusters()
+
+# Searchable record lists: (data type, session state key, label)
+SEARCH_SOURCES = (
+    ('analyses', 'saved_analyses', 'Own content'),
+    ('competitor_analyses', 'competitor_analyses', 'Competitor'),
+    ('persona_analyses', 'persona_analyses', 'Persona')
+)
+
+# Larger exports would have to be held in server memory to download through the browser
+MAX_EXPORT_DOWNLOAD_BYTES = 200 * 10**6
+
+def _read_export(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _export_job(job, data_type, fmt, columns, filters, total):
+    """Background job: stream saved analyses of one type to an export file"""
+    job.report(0.0, "Exporting...")
+    result = exports.export_records(
+        data_type, exports.export_path(data_type, fmt), fmt, columns, filters,
+        on_progress=lambda rows: job.report(min(rows / max(total, 1), 1.0), f"Exported {rows:,} rows")
+    )
+    if not result['success']:
+        raise RuntimeError(result['error'])
+    return result
+
+def _render_export():
+    """Export saved analyses of one type to CSV, Parquet or Excel"""
+    st.markdown("---")
+    st.subheader("📤 Export")
+    
+    type_labels = {data_type: label for data_type, _, label in SEARCH_SOURCES}
+    session_keys = {data_type: session_key for data_type, session_key, _ in SEARCH_SOURCES}
+    col1, col2 = st.columns(2)
+    data_type = col1.selectbox("Analyses:", list(type_labels), format_func=type_labels.get, key="export_type")
+    fmt = col2.selectbox("Format:", list(exports.FORMATS), format_func=exports.FORMATS.get, key="export_format")
+    columns = st.multiselect("Columns:", exports.available_columns(data_type),
+                             default=exports.DEFAULT_COLUMNS[data_type], key=f"export_columns_{data_type}")
+    
+    records = st.session_state[session_keys[data_type]]
+    col1, col2, col3 = st.columns(3)
+    stages = col1.multiselect("Funnel stage:", list(FUNNEL_STAGES), key="export_stages",
+                              format_func=lambda s: f"{FUNNEL_STAGES[s]['emoji']} {FUNNEL_STAGES[s]['title']}")
+    names = []
+    if data_type != 'analyses':
+        label = "Competitors:" if data_type == 'competitor_analyses' else "Personas:"
+        names = col2.multiselect(label, sorted({exports.record_name(r) for r in records}), key=f"export_names_{data_type}")
+    date_range = col3.date_input("Saved between:", value=(), key="export_dates")
+    
+    filters = {'stages': stages, 'names': names}
+    if len(date_range) == 2:
+        filters['since'] = date_range[0].isoformat()
+        filters['until'] = (date_range[1] + timedelta(days=1)).isoformat()
+    
+    if st.button("📤 Export", disabled=not columns or not records, key="export_run"):
+        _submit_job('export_job', 'export', _export_job, data_type, fmt, columns, filters, len(records),
+                    description=f"Exporting {type_labels[data_type].lower()} analyses")
+    result = _completed_result('export_job')
+    if result and os.path.exists(result['path']):
+        path = result['path']
+        size = os.path.getsize(path)
+        st.success(f"✅ Exported {result['rows']:,} rows ({size / 1e6:.1f} MB) to {path}")
+        if size <= MAX_EXPORT_DOWNLOAD_BYTES:
+            # The file is only read when the button is clicked, not on every rerun
+            st.download_button("⬇️ Download export", functools.partial(_read_export, path),
+                               file_name=os.path.basename(path), key="export_download")
+        else:
+            st.info(f"Exports over {MAX_EXPORT_DOWNLOAD_BYTES // 10**6} MB are not offered for download "
+                    "through the browser; copy the file from the server instead.")
+
+def render_search_tab():
+    """Render the Search tab"""
+    st.markdown('<h2 class="sub-header">🔎 Search Saved Analyses</h2>', unsafe_allow_html=True)
+    
+    index = resources.search_index()
+    for data_type, session_key, _ in SEARCH_SOURCES:
+        index.sync(data_type, st.session_state[session_key])
+    
+    type_labels = {data_type: label for data_type, _, label in SEARCH_SOURCES}
+    col1, col2, col3 = st.columns([3, 2, 2])
+    with col1:
+        query = st.text_input("Search content, sources, names, headings and keywords:",
+                              placeholder="pricing demo, analyt*", key="search_query")
+    with col2:
+        stages = st.multiselect("Funnel stage:", list(FUNNEL_STAGES), key="search_stages",
+                                format_func=lambda s: f"{FUNNEL_STAGES[s]['emoji']} {FUNNEL_STAGES[s]['title']}")
+    with col3:
+        data_types = st.multiselect("Type:", list(type_labels), format_func=type_labels.get, key="search_types")
+    date_range = st.date_input("Saved between:", value=(), key="search_dates")
+    
+    since = until = None
+    if len(date_range) == 2:
+        since = date_range[0].isoformat()
+        until = (date_range[1] + timedelta(days=1)).isoformat()
+    
+    results = index.search(query, data_types, stages, since, until)
+    st.caption(f"{len(results)} result(s)" + (" ranked by relevance" if query.strip() else ", newest first"))
+    
+    for hit in results:
+        stage_info = FUNNEL_STAGES.get(hit['stage'], {})
+        title = hit['name'] or hit['source']
+        with st.expander(f"{stage_info.get('emoji', '📄')} {title} - {hit['timestamp'][:10]}"):
+            st.markdown(hit['snippet'])
+            st.caption(f"{type_labels.get(hit['data_type'], hit['data_type'])} · {hit['source']} · "
+                       f"{stage_info.get('title', 'Unknown')} stage")
+    
+    _render_export()
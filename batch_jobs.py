@@ -0,0 +1,295 @@
+"""
+Resumable, checkpointed batch jobs for library-wide analysis
+
+A job takes a manifest of sources (URLs or local PDF/DOCX/text files) and runs
+them through the same extractors and analyzers as the Streamlit app. Per-item
+state is kept in analyzer_data/jobs/<job_id>.json so a killed run can be
+resumed exactly where it stopped.
+
+Usage:
+    python batch_jobs.py run manifest.json --checkpoint-every 10
+    python batch_jobs.py run manifest.json --profile   # save a cProfile per item
+    python batch_jobs.py resume <job_id>
+    python batch_jobs.py status <job_id>
+"""
+
+import argparse
+import json
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import content_store
+import data_store
+import profiling
+import record_store
+
+# Item states
+PENDING = 'pending'
+FETCHED = 'fetched'
+ANALYZED = 'analyzed'
+FAILED = 'failed'
+
+DEFAULT_CHECKPOINT_EVERY = 10
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 300.0
+
+
+def _job_key(job_id):
+    return f"jobs/{job_id}"
+
+
+def _content_key(job_id, index):
+    return f"jobs/{job_id}/item_{index}"
+
+
+def _now():
+    return datetime.now().isoformat()
+
+
+def load_manifest(path):
+    """Read a manifest file: a JSON list of sources/items, or one source per line"""
+    path = Path(path)
+    text = path.read_text()
+    if path.suffix.lower() == '.json':
+        entries = json.loads(text)
+    else:
+        entries = [line.strip() for line in text.splitlines() if line.strip() and not line.startswith('#')]
+
+    items = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'source': entry}
+        items.append({
+            'source': entry['source'],
+            'kind': entry.get('kind', 'competitor' if entry.get('competitor_name') else 'own'),
+            'competitor_name': entry.get('competitor_name', ''),
+            'target_keywords': entry.get('target_keywords', [])
+        })
+    return items
+
+
+def create_job(items, checkpoint_every=DEFAULT_CHECKPOINT_EVERY, max_attempts=DEFAULT_MAX_ATTEMPTS,
+               job_id=None, data_dir=None, profile=False):
+    """Create and persist a new job from manifest items"""
+    job = {
+        'job_id': job_id or uuid.uuid4().hex[:12],
+        'created_at': _now(),
+        'updated_at': _now(),
+        'status': PENDING,
+        'checkpoint_every': max(1, int(checkpoint_every)),
+        'max_attempts': max(1, int(max_attempts)),
+        'profile': bool(profile),
+        'items': [
+            dict(item, index=i, state=PENDING, attempts=0, error=None, next_retry_at=0, result_id=None)
+            for i, item in enumerate(items)
+        ]
+    }
+    data_store.save_data(_job_key(job['job_id']), job, data_dir=data_dir)
+    return job
+
+
+def load_job(job_id, data_dir=None):
+    """Load a persisted job by id"""
+    job = data_store.load_data(_job_key(job_id), data_dir=data_dir)
+    if job is None:
+        raise KeyError(f"Unknown job: {job_id}")
+    return job
+
+
+def job_summary(job):
+    """Count items per state"""
+    summary = {PENDING: 0, FETCHED: 0, ANALYZED: 0, FAILED: 0}
+    for item in job['items']:
+        summary[item['state']] += 1
+    return summary
+
+
+def retry_delay(attempts):
+    """Exponential backoff delay in seconds after the given number of failed attempts"""
+    return min(RETRY_BASE_DELAY * (2 ** max(attempts - 1, 0)), RETRY_MAX_DELAY)
+
+
+def fetch_source(source):
+    """Extract content from a URL or a local file path"""
+    from analysis_modules import extract_content_from_url, extract_content_from_file
+
+    if source.startswith(('http://', 'https://')):
+        return extract_content_from_url(source)
+
+    path = Path(source)
+    if not path.exists():
+        return {'success': False, 'error': f"File not found: {source}"}
+    with open(path, 'rb') as f:
+        return extract_content_from_file(f, path.name)
+
+
+def analyze_item(item, content, headings):
+    """Run the analyzers for one manifest item and return the record to store"""
+    from analysis_modules import build_analysis_result, build_competitor_analysis
+
+    if item['kind'] == 'competitor':
+        record = build_competitor_analysis(
+            content, headings, item['source'], item['competitor_name'], item['target_keywords']
+        )
+    else:
+        record = build_analysis_result(content, headings, item['source'], item['target_keywords'])
+    return record
+
+
+class JobRunner:
+    """Drives a job through its items, checkpointing state every N items"""
+
+    def __init__(self, job, data_dir=None, fetch=fetch_source, analyze=analyze_item, sleep=time.sleep,
+                 log=print):
+        self.job = job
+        self.data_dir = data_dir
+        self.fetch = fetch
+        self.analyze = analyze
+        self.sleep = sleep
+        self.log = log
+        self._pending_results = {'analyses': [], 'competitor_analyses': []}
+        self._finished_content = []
+        self._since_checkpoint = 0
+
+    def checkpoint(self):
+        """Flush analyzed results to the store, then persist item state"""
+        for data_type, records in self._pending_results.items():
+            if records:
+                # Result ids are derived from job/item so a replay after a crash never duplicates
+                record_store.store_records(data_type, records, self.data_dir)
+                records.clear()
+        self.job['updated_at'] = _now()
+        data_store.save_data(_job_key(self.job['job_id']), self.job, data_dir=self.data_dir)
+
+        # Fetched content is only dropped once its 'analyzed' state is durable
+        for key in self._finished_content:
+            data_store.delete_data(key, data_dir=self.data_dir)
+        self._finished_content.clear()
+        self._since_checkpoint = 0
+
+    def _mark_progress(self):
+        self._since_checkpoint += 1
+        if self._since_checkpoint >= self.job['checkpoint_every']:
+            self.checkpoint()
+
+    def process_item(self, item):
+        """Advance one item as far as it can go; returns True if it reached 'analyzed'"""
+        job_id = self.job['job_id']
+        try:
+            # Content fetched before a crash or a failed analysis is reused, not re-downloaded
+            if not data_store.data_path(_content_key(job_id, item['index']), self.data_dir).exists():
+                result = self.fetch(item['source'])
+                if not result['success']:
+                    raise RuntimeError(result['error'])
+                data_store.save_data(_content_key(job_id, item['index']), {
+                    'content': result['content'],
+                    'headings': result['headings']
+                }, data_dir=self.data_dir)
+                item['state'] = FETCHED
+
+            fetched = data_store.load_data(_content_key(job_id, item['index']), data_dir=self.data_dir)
+            if self.job.get('profile'):
+                record, profiler = profiling.profile_call(self.analyze, item, fetched['content'], fetched['headings'])
+            else:
+                record, profiler = self.analyze(item, fetched['content'], fetched['headings']), None
+            content_store.put(fetched['content'], data_dir=self.data_dir)
+            record['id'] = f"{job_id}-{item['index']}"
+            record['job_id'] = job_id
+            if profiler is not None:
+                profiling.attach_profile(record, profiler, data_dir=self.data_dir)
+            data_type = 'competitor_analyses' if item['kind'] == 'competitor' else 'analyses'
+            self._pending_results[data_type].append(record)
+
+            item['state'] = ANALYZED
+            item['result_id'] = record['id']
+            item['error'] = None
+            self._finished_content.append(_content_key(job_id, item['index']))
+            return True
+        except Exception as e:
+            item['attempts'] += 1
+            item['state'] = FAILED
+            item['error'] = str(e)
+            item['next_retry_at'] = time.time() + retry_delay(item['attempts'])
+            self.log(f"  ❌ [{item['index']}] {item['source']}: {e}")
+            return False
+
+    def run(self):
+        """Process all outstanding items, retrying failures with backoff"""
+        job = self.job
+        job['status'] = 'running'
+        self.checkpoint()
+
+        # First pass: everything not yet analyzed, in manifest order
+        for item in job['items']:
+            if item['state'] in (PENDING, FETCHED):
+                if self.process_item(item):
+                    self.log(f"  ✅ [{item['index']}] {item['source']}")
+                self._mark_progress()
+
+        # Retry passes: failed items with attempts left, waiting out their backoff
+        while True:
+            retryable = [i for i in job['items'] if i['state'] == FAILED and i['attempts'] < job['max_attempts']]
+            if not retryable:
+                break
+            retryable.sort(key=lambda i: i['next_retry_at'])
+            item = retryable[0]
+            wait = item['next_retry_at'] - time.time()
+            if wait > 0:
+                self.checkpoint()
+                self.sleep(wait)
+            if self.process_item(item):
+                self.log(f"  ✅ [{item['index']}] {item['source']} (retry {item['attempts']})")
+            self._mark_progress()
+
+        summary = job_summary(job)
+        job['status'] = 'completed' if summary[FAILED] == 0 else 'completed_with_errors'
+        self.checkpoint()
+        return summary
+
+
+def run_job(job, data_dir=None, **kwargs):
+    """Run or resume a job to completion"""
+    return JobRunner(job, data_dir=data_dir, **kwargs).run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resumable batch analysis jobs")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="Start a new job from a manifest")
+    run_parser.add_argument('manifest')
+    run_parser.add_argument('--job-id')
+    run_parser.add_argument('--checkpoint-every', type=int, default=DEFAULT_CHECKPOINT_EVERY)
+    run_parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS)
+    run_parser.add_argument('--profile', action='store_true', help="Profile each item's analysis")
+
+    resume_parser = subparsers.add_parser('resume', help="Resume an interrupted job")
+    resume_parser.add_argument('job_id')
+
+    status_parser = subparsers.add_parser('status', help="Show item counts for a job")
+    status_parser.add_argument('job_id')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        job = create_job(load_manifest(args.manifest), args.checkpoint_every, args.max_attempts, args.job_id,
+                         profile=args.profile)
+        print(f"🚀 Started job {job['job_id']} ({len(job['items'])} items)")
+    else:
+        job = load_job(args.job_id)
+        if args.command == 'status':
+            print(f"Job {job['job_id']}: {job['status']} {job_summary(job)}")
+            return 0
+        print(f"🔁 Resuming job {job['job_id']} {job_summary(job)}")
+
+    summary = run_job(job)
+    print(f"📊 Job {job['job_id']} finished: {summary}")
+    return 0 if summary[FAILED] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,420 @@
+"""
+Benchmark suite for the Content Intelligence Analyzer
+
+Generates synthetic HTML, PDF, DOCX and plain-text corpora, times every
+analyzer and extractor, records throughput and peak memory, and compares
+the results against a stored baseline. Runs fully offline: the URL
+extractor is exercised against a local HTTP server.
+
+Usage:
+    python benchmark.py                              # quick run, print results
+    python benchmark.py --sizes 1KB,1MB,10MB --keywords 10,1000,100000
+    python benchmark.py --save-baseline              # record a new baseline
+    python benchmark.py --threshold 0.25             # fail on >25% slowdowns
+"""
+
+import argparse
+import io
+import json
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+DEFAULT_SIZES = '1KB,100KB,1MB'
+DEFAULT_KEYWORD_COUNTS = '10,1000,10000'
+DEFAULT_PERSONA_COUNTS = '10,1000'
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+DEFAULT_THRESHOLD = 0.25
+# Keyword and persona scaling runs use a fixed document size
+SCALING_DOCUMENT_SIZE = 10 * 1000
+
+VOCABULARY = (
+    "content marketing strategy audience pipeline revenue growth team platform data insight "
+    "customer journey brand campaign channel launch product feature workflow integration "
+    "analytics dashboard report metric conversion engagement retention onboarding budget"
+).split()
+FUNNEL_PHRASES = [
+    "what is", "how to", "guide", "beginner", "overview", "vs", "comparison", "best", "review",
+    "alternative", "solution", "pricing", "demo", "free trial", "case study", "roi", "results"
+]
+COMPANY_NAMES = ["Acme Corp", "Globex", "Initech", "Umbrella Group", "Stark Industries"]
+
+
+def parse_size(text):
+    """Parse sizes like '1KB', '10MB' or '512' into bytes"""
+    text = text.strip().upper()
+    for suffix, factor in (('KB', 1000), ('MB', 1000 * 1000), ('B', 1)):
+        if text.endswith(suffix):
+            return int(float(text[:-len(suffix)]) * factor)
+    return int(text)
+
+
+def format_size(size):
+    if size >= 1000 * 1000:
+        return f"{size / (1000 * 1000):g}MB"
+    if size >= 1000:
+        return f"{size / 1000:g}KB"
+    return f"{size}B"
+
+
+# Synthetic corpus generation
+
+def generate_sentence(rng):
+    """One sentence mixing vocabulary, funnel phrases, statistics, links and names"""
+    words = [rng.choice(VOCABULARY) for _ in range(rng.randint(8, 18))]
+    extras = [
+        rng.choice(FUNNEL_PHRASES),
+        rng.choice(COMPANY_NAMES),
+        f"{rng.randint(2, 95)}%",
+        f"${rng.randint(10, 5000)}",
+    ]
+    if rng.random() < 0.1:
+        extras.append(f"https://example.com/{rng.choice(VOCABULARY)}")
+    if rng.random() < 0.05:
+        extras.append(f"{rng.choice(VOCABULARY)}@example.com")
+    for extra in extras:
+        words.insert(rng.randint(0, len(words)), extra)
+    return ' '.join(words).capitalize() + '.'
+
+
+def generate_text(size, seed=0):
+    """Plain text of roughly size bytes, as a list of (heading, paragraph) sections"""
+    rng = random.Random(seed)
+    sections = []
+    total = 0
+    while total < size:
+        heading = f"{rng.choice(FUNNEL_PHRASES).title()} {rng.choice(VOCABULARY)} {rng.choice(VOCABULARY)}"
+        paragraph = ' '.join(generate_sentence(rng) for _ in range(rng.randint(3, 8)))
+        sections.append((heading, paragraph))
+        total += len(heading) + len(paragraph) + 2
+    return sections
+
+
+def sections_to_text(sections):
+    return '\n'.join(f"{heading}\n{paragraph}" for heading, paragraph in sections)
+
+
+def generate_html(sections):
+    """HTML page with navigation chrome, headings and paragraphs"""
+    body = ''.join(f"<h2>{escape(h)}</h2><p>{escape(p)}</p>" for h, p in sections)
+    return (
+        "<html><head><title>Benchmark</title><style>p {margin: 0}</style></head><body>"
+        "<nav><a href='/'>Home</a></nav><h1>Synthetic Article</h1>"
+        f"{body}<footer>Footer</footer></body></html>"
+    ).encode('utf-8')
+
+
+def _pdf_escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def generate_pdf(sections, line_width=90, lines_per_page=60):
+    """Minimal multi-page PDF with Helvetica text, written without external tools"""
+    lines = []
+    for heading, paragraph in sections:
+        lines.append(heading)
+        words = paragraph.split()
+        line = ''
+        for word in words:
+            if len(line) + len(word) + 1 > line_width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        if line:
+            lines.append(line)
+
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once page ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for page_lines in pages:
+        stream = "BT /F1 10 Tf 12 TL 40 800 Td " + ' '.join(f"({_pdf_escape(l)}) '" for l in page_lines) + " ET"
+        stream = stream.encode('latin-1', errors='replace')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = ' '.join(f"{pid} 0 R" for pid in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref_offset = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset))
+    return out.getvalue()
+
+
+def generate_docx(sections):
+    """Minimal DOCX package with Heading 2 styled headings and body paragraphs"""
+    w = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+    paragraphs = []
+    for heading, paragraph in sections:
+        paragraphs.append(f'<w:p><w:pPr><w:pStyle w:val="Heading2"/></w:pPr><w:r><w:t>{escape(heading)}</w:t></w:r></w:p>')
+        paragraphs.append(f'<w:p><w:r><w:t xml:space="preserve">{escape(paragraph)}</w:t></w:r></w:p>')
+    document = f'<?xml version="1.0" encoding="UTF-8"?><w:document xmlns:w="{w}"><w:body>{"".join(paragraphs)}</w:body></w:document>'
+    styles = (
+        f'<?xml version="1.0" encoding="UTF-8"?><w:styles xmlns:w="{w}">'
+        '<w:style w:type="paragraph" w:styleId="Heading2"><w:name w:val="heading 2"/></w:style></w:styles>'
+    )
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        '<Override PartName="/word/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+        '</Types>'
+    )
+    rels = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="word/document.xml"/></Relationships>'
+    )
+    document_rels = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/></Relationships>'
+    )
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', content_types)
+        archive.writestr('_rels/.rels', rels)
+        archive.writestr('word/_rels/document.xml.rels', document_rels)
+        archive.writestr('word/document.xml', document)
+        archive.writestr('word/styles.xml', styles)
+    return out.getvalue()
+
+
+def generate_keywords(count, seed=0):
+    """Synthetic target keywords (single words and two-word phrases)"""
+    rng = random.Random(seed)
+    pool = VOCABULARY + FUNNEL_PHRASES
+    return [
+        rng.choice(pool) if i % 3 == 0 else f"{rng.choice(pool)} {rng.choice(pool)}"
+        for i in range(count)
+    ]
+
+
+def generate_personas(count, seed=0):
+    """Synthetic personas with pain points and goals"""
+    rng = random.Random(seed)
+    return [{
+        'id': i + 1,
+        'name': f"Persona {i + 1}",
+        'role': rng.choice(["Marketing Manager", "CMO", "Content Lead", "Demand Gen Manager"]),
+        'description': '',
+        'pain_points': [' '.join(rng.sample(VOCABULARY, 3)) for _ in range(rng.randint(2, 5))],
+        'goals': [' '.join(rng.sample(VOCABULARY, 3)) for _ in range(rng.randint(2, 5))],
+        'created_at': ''
+    } for i in range(count)]
+
+
+# Local HTTP server for the URL extractor
+
+class _CorpusHandler(BaseHTTPRequestHandler):
+    pages = {}
+
+    def do_GET(self):
+        body = self.pages.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_corpus_server(pages):
+    """Serve {path: bytes} pages on a local port; returns (server, base_url)"""
+    handler = type('CorpusHandler', (_CorpusHandler,), {'pages': pages})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+# Measurement
+
+def measure(fn, repeat=3, measure_memory=True):
+    """Best-of-N wall time and (separately measured) peak traced allocation"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    peak = None
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return min(timings), peak
+
+
+def build_cases(sizes, keyword_counts, persona_counts, base_url=None, pages=None):
+    """Yield (name, callable, bytes_processed, items_processed) benchmark cases"""
+    import analysis_modules as am
+
+    for size in sizes:
+        label = format_size(size)
+        sections = generate_text(size, seed=size)
+        text = sections_to_text(sections)
+        headings = [{'level': 'h2', 'text': h} for h, _ in sections]
+        keywords = generate_keywords(10)
+        nbytes = len(text.encode('utf-8'))
+
+        yield f"analyze_funnel_stage[{label}]", lambda t=text: am.analyze_funnel_stage(t), nbytes, 1
+        yield f"extract_entities[{label}]", lambda t=text: am.extract_entities(t), nbytes, 1
+        yield (f"analyze_heading_alignment[{label}]",
+               lambda t=text, h=headings: am.analyze_heading_alignment(t, h), nbytes, len(headings))
+        yield (f"analyze_keyword_optimization[{label}]",
+               lambda t=text, k=keywords: am.analyze_keyword_optimization(t, k), nbytes, len(keywords))
+
+        pdf_bytes = generate_pdf(sections)
+        yield (f"extract_content_from_pdf[{label}]",
+               lambda b=pdf_bytes: am.extract_content_from_pdf(io.BytesIO(b)), len(pdf_bytes), 1)
+        docx_bytes = generate_docx(sections)
+        yield (f"extract_content_from_docx[{label}]",
+               lambda b=docx_bytes: am.extract_content_from_docx(io.BytesIO(b)), len(docx_bytes), 1)
+
+        if base_url is not None:
+            html = generate_html(sections)
+            path = f"/article-{label}.html"
+            pages[path] = html
+            limit = max(am.MAX_DOWNLOAD_BYTES, len(html) * 2)
+            yield (f"extract_content_from_url[{label}]",
+                   lambda u=base_url + path, m=limit: am.extract_content_from_url(u, max_bytes=m), len(html), 1)
+
+    scaling_text = sections_to_text(generate_text(SCALING_DOCUMENT_SIZE, seed=1))
+    scaling_bytes = len(scaling_text.encode('utf-8'))
+    for count in keyword_counts:
+        keywords = generate_keywords(count, seed=count)
+        yield (f"analyze_keyword_optimization[keywords={count}]",
+               lambda k=keywords: am.analyze_keyword_optimization(scaling_text, k), scaling_bytes, count)
+    for count in persona_counts:
+        personas = generate_personas(count, seed=count)
+        yield (f"score_persona_relevance[personas={count}]",
+               lambda ps=personas: [am.score_persona_relevance(scaling_text, p) for p in ps], scaling_bytes, count)
+
+
+def run_benchmarks(sizes, keyword_counts, persona_counts, repeat=3, measure_memory=True, log=print):
+    """Run every benchmark case and return a list of result dicts"""
+    pages = {}
+    server, base_url = start_corpus_server(pages)
+    results = []
+    try:
+        for name, fn, nbytes, items in build_cases(sizes, keyword_counts, persona_counts, base_url, pages):
+            seconds, peak = measure(fn, repeat=repeat, measure_memory=measure_memory)
+            result = {
+                'name': name,
+                'seconds': seconds,
+                'mb_per_sec': (nbytes / 1e6) / seconds if seconds > 0 else None,
+                'items_per_sec': items / seconds if seconds > 0 else None,
+                'peak_mb': peak / 1e6 if peak is not None else None
+            }
+            results.append(result)
+            log(format_result(result))
+    finally:
+        server.shutdown()
+    return results
+
+
+def format_result(result):
+    peak = f"{result['peak_mb']:9.2f} MB" if result['peak_mb'] is not None else "        n/a"
+    return (f"  {result['name']:<52} {result['seconds'] * 1000:10.2f} ms "
+            f"{result['mb_per_sec'] or 0:9.2f} MB/s {peak}")
+
+
+def compare_to_baseline(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return results that are slower than the baseline by more than threshold"""
+    baseline_times = {r['name']: r['seconds'] for r in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        previous = baseline_times.get(result['name'])
+        if previous and result['seconds'] > previous * (1 + threshold):
+            regressions.append(dict(result, baseline_seconds=previous,
+                                    slowdown=result['seconds'] / previous - 1))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark analyzers and extractors")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Document sizes, e.g. 1KB,100KB,1MB,10MB")
+    parser.add_argument('--keywords', default=DEFAULT_KEYWORD_COUNTS, help="Keyword counts, e.g. 10,1000,100000")
+    parser.add_argument('--personas', default=DEFAULT_PERSONA_COUNTS, help="Persona counts, e.g. 10,1000,100000")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc peak-memory pass")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--output', help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(s) for s in args.sizes.split(',') if s.strip()]
+    keyword_counts = [int(n) for n in args.keywords.split(',') if n.strip()]
+    persona_counts = [int(n) for n in args.personas.split(',') if n.strip()]
+
+    print("🚀 Running benchmarks...")
+    results = run_benchmarks(sizes, keyword_counts, persona_counts, args.repeat, not args.no_memory)
+    report = {'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': sys.version.split()[0], 'results': results}
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(report, indent=2))
+        print(f"\n💾 Baseline saved to {baseline_path}")
+        return 0
+
+    if not baseline_path.exists():
+        print(f"\nℹ️  No baseline at {baseline_path}; run with --save-baseline to create one")
+        return 0
+
+    regressions = compare_to_baseline(results, json.loads(baseline_path.read_text()), args.threshold)
+    if regressions:
+        print(f"\n⚠️  {len(regressions)} regression(s) over {args.threshold:.0%}:")
+        for r in regressions:
+            print(f"  {r['name']}: {r['baseline_seconds'] * 1000:.2f} ms -> {r['seconds'] * 1000:.2f} ms "
+                  f"(+{r['slowdown']:.0%})")
+        return 1
+
+    print(f"\n✅ No regressions over {args.threshold:.0%} against {baseline_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Multi-file and zip archive bulk upload with parallel extraction
+
+Uploads arrive as (filename, bytes) pairs so they can be handed to a
+background job; zip archives are expanded into their supported members.
+"""
+
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import resources
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.txt', '.md')
+MAX_ARCHIVE_MEMBERS = 1000
+MAX_ARCHIVE_BYTES = 500 * 1024 * 1024
+
+
+def expand_uploads(uploads, allowed_extensions=SUPPORTED_EXTENSIONS):
+    """Flatten uploaded files and zip archives into (filename, bytes) pairs
+
+    Returns (files, rejected) where rejected is a list of status rows for
+    archives or members that could not be used.
+    """
+    files = []
+    rejected = []
+
+    for name, data in uploads:
+        if name.lower().endswith('.zip'):
+            try:
+                with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                    members = [
+                        m for m in archive.infolist()
+                        if not m.is_dir() and '__MACOSX' not in m.filename
+                        and not os.path.basename(m.filename).startswith('.')
+                    ]
+                    if len(members) > MAX_ARCHIVE_MEMBERS:
+                        raise ValueError(f"Archive has more than {MAX_ARCHIVE_MEMBERS} files")
+                    # Check declared sizes before inflating anything
+                    if sum(m.file_size for m in members) > MAX_ARCHIVE_BYTES:
+                        raise ValueError(f"Archive expands to more than {MAX_ARCHIVE_BYTES // (1024 * 1024)}MB")
+
+                    for member in members:
+                        member_name = f"{name}/{member.filename}"
+                        if member.filename.lower().endswith(allowed_extensions):
+                            files.append((member_name, archive.read(member)))
+                        else:
+                            rejected.append(_status_row(member_name, 'skipped', error="Unsupported file type"))
+            except (zipfile.BadZipFile, ValueError) as e:
+                rejected.append(_status_row(name, 'failed', error=str(e)))
+        elif name.lower().endswith(allowed_extensions):
+            files.append((name, data))
+        else:
+            rejected.append(_status_row(name, 'skipped', error="Unsupported file type"))
+
+    return files, rejected
+
+
+def _status_row(filename, status, record=None, error=''):
+    """Build one row of the per-file results table"""
+    row = {
+        'file': filename,
+        'status': status,
+        'words': None,
+        'funnel_stage': None,
+        'error': error
+    }
+    if record:
+        row['words'] = record.get('entity_analysis', {}).get('total_words')
+        row['funnel_stage'] = record.get('funnel_analysis', {}).get('primary_stage', record.get('funnel_stage'))
+    return row
+
+
+def _process_file(filename, data, make_record):
+    """Extract and analyze a single file; runs on a pool worker"""
+    from analysis_modules import extract_content_from_file
+
+    result = extract_content_from_file(io.BytesIO(data), os.path.basename(filename))
+    if not result['success']:
+        return None, _status_row(filename, 'failed', error=result['error'])
+    if not result['content'].strip():
+        return None, _status_row(filename, 'failed', error="No text could be extracted")
+
+    record = make_record(result['content'], result['headings'], filename)
+    return record, _status_row(filename, 'analyzed', record)
+
+
+def analyze_uploads(uploads, make_record, max_workers=None, on_progress=None):
+    """Expand, extract and analyze a batch of uploads in parallel
+
+    make_record(content, headings, filename) builds the saved record for one
+    file. Returns {'records': [...], 'rows': [...]} with rows in upload order.
+    on_progress(done, total) is called from the calling thread as files finish.
+    Files run on the process-wide worker pool unless max_workers asks for a
+    dedicated one.
+    """
+    files, rejected = expand_uploads(uploads)
+    records = [None] * len(files)
+    rows = [None] * len(files)
+
+    if max_workers:
+        pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bulk-extract')
+    else:
+        pool = resources.worker_pool()
+    futures = {}
+    try:
+        futures = {
+            pool.submit(_process_file, filename, data, make_record): i
+            for i, (filename, data) in enumerate(files)
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            try:
+                records[i], rows[i] = future.result()
+            except Exception as e:
+                rows[i] = _status_row(files[i][0], 'failed', error=str(e))
+            if on_progress:
+                on_progress(done, len(files))
+    finally:
+        # Drop queued files promptly if the caller bailed out (e.g. job cancelled)
+        for future in futures:
+            future.cancel()
+        if max_workers:
+            pool.shutdown(wait=True)
+
+    return {
+        'records': [r for r in records if r is not None],
+        'rows': rows + rejected
+    }
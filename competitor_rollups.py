@@ -0,0 +1,260 @@
+"""
+Weekly competitor rollups in a columnar store
+
+Saved competitor analyses are summarized by competitor x week x funnel stage
+(asset count, median words, statistics per 1,000 words, average headings)
+in analyzer_data/rollups/competitor_weekly.parquet, plus one 'all' stage row
+per competitor and week. Dashboards read only that small table.
+
+The per-asset measures behind it are kept in one Parquet file per week
+(analyzer_data/rollups/competitor_facts/week=YYYY-MM-DD.parquet). When
+analyses are saved, only the weeks they fall in are re-read and their rollup
+rows replaced, so medians stay exact without rescanning history.
+
+    python competitor_rollups.py sync
+    python competitor_rollups.py rebuild
+    python competitor_rollups.py show --competitor Acme
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import threading
+from pathlib import Path
+
+import data_store
+from lazy_imports import lazy_module
+from search_index import record_key
+
+pd = lazy_module('pandas')
+
+ROLLUP_DIR_NAME = 'rollups'
+FACTS_DIR_NAME = 'competitor_facts'
+ROLLUP_FILE_NAME = 'competitor_weekly.parquet'
+DATA_TYPE = 'competitor_analyses'
+ALL_STAGES = 'all'
+# Missing analyses are folded in this many at a time when syncing
+SYNC_BATCH_SIZE = 5000
+GROUP_COLUMNS = ['competitor', 'week', 'stage']
+# Rollup measures shown on dashboards
+METRICS = {
+    'assets': 'Assets published',
+    'median_words': 'Median words',
+    'statistics_per_1k_words': 'Statistics per 1,000 words',
+    'avg_headings': 'Average headings'
+}
+
+_rollup_lock = threading.RLock()
+
+
+def rollup_dir(data_dir=None):
+    return Path(data_dir or data_store.DATA_DIR) / ROLLUP_DIR_NAME
+
+
+def rollup_path(data_dir=None):
+    return rollup_dir(data_dir) / ROLLUP_FILE_NAME
+
+
+def _week_path(week, data_dir=None):
+    return rollup_dir(data_dir) / FACTS_DIR_NAME / f"week={week:%Y-%m-%d}.parquet"
+
+
+def _write_parquet(frame, path):
+    """Atomically replace a Parquet file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    frame.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def facts_frame(records):
+    """One row per competitor analysis with the measures the rollups aggregate"""
+    entities = [r.get('entity_analysis') or {} for r in records]
+    facts = pd.DataFrame({
+        'id': [record_key(r) for r in records],
+        'competitor': [r.get('competitor_name', '') for r in records],
+        'timestamp': pd.to_datetime([r.get('timestamp') for r in records], errors='coerce', format='ISO8601'),
+        'stage': [(r.get('funnel_analysis') or {}).get('primary_stage', '') for r in records],
+        'words': [e.get('total_words', 0) for e in entities],
+        'statistics': [e.get('statistics_count', 0) for e in entities],
+        'headings': [r.get('headings_count', 0) for r in records]
+    })
+    facts = facts.dropna(subset=['timestamp'])
+    # Weeks start on Monday
+    facts['week'] = facts['timestamp'].dt.to_period('W-SUN').dt.start_time
+    return facts
+
+
+def summarize(facts):
+    """Rollup rows for a set of facts: per competitor, week and stage, plus an 'all' stage row"""
+    grouped = pd.concat([facts, facts.assign(stage=ALL_STAGES)]).groupby(GROUP_COLUMNS, sort=False)
+    rollup = grouped.agg(
+        assets=('id', 'size'),
+        median_words=('words', 'median'),
+        total_words=('words', 'sum'),
+        statistics=('statistics', 'sum'),
+        headings=('headings', 'sum')
+    ).reset_index()
+    rollup['statistics_per_1k_words'] = (
+        rollup['statistics'] * 1000 / rollup['total_words'].where(rollup['total_words'] > 0)
+    ).fillna(0.0).round(2)
+    rollup['avg_headings'] = (rollup['headings'] / rollup['assets']).round(2)
+    return rollup
+
+
+def _read_rollups(data_dir=None):
+    path = rollup_path(data_dir)
+    return pd.read_parquet(path) if path.exists() else None
+
+
+def _write_rollups(rollup, data_dir=None):
+    _write_parquet(rollup.sort_values(GROUP_COLUMNS, ignore_index=True), rollup_path(data_dir))
+
+
+def update_rollups(records, data_dir=None):
+    """Fold newly saved competitor analyses into the rollups; returns how many were new
+
+    Analyses already counted (by id) are ignored, so re-saving is harmless.
+    """
+    new_facts = facts_frame(records)
+    if new_facts.empty:
+        return 0
+    with _rollup_lock:
+        added = 0
+        changed_weeks = []
+        for week, week_new in new_facts.groupby('week'):
+            path = _week_path(week, data_dir)
+            if path.exists():
+                existing = pd.read_parquet(path)
+                week_new = week_new[~week_new['id'].isin(existing['id'])]
+                if week_new.empty:
+                    continue
+                week_facts = pd.concat([existing, week_new], ignore_index=True)
+            else:
+                week_facts = week_new.reset_index(drop=True)
+            _write_parquet(week_facts, path)
+            changed_weeks.append(week_facts)
+            added += len(week_new)
+
+        if changed_weeks:
+            # The changed weeks' rows are recomputed from all their facts and replace the old ones
+            changed = summarize(pd.concat(changed_weeks, ignore_index=True))
+            rollup = _read_rollups(data_dir)
+            if rollup is not None:
+                rollup = pd.concat([rollup[~rollup['week'].isin(changed['week'].unique())], changed], ignore_index=True)
+            _write_rollups(rollup if rollup is not None else changed, data_dir)
+        return added
+
+
+def on_saved(data_type, records, data_dir=None):
+    """Save hook: keep the rollups current when competitor analyses are stored"""
+    if data_type == DATA_TYPE and records:
+        update_rollups(records, data_dir)
+
+
+def rebuild(records=None, data_dir=None):
+    """Rebuild facts and rollups from every stored competitor analysis; returns the asset count"""
+    if records is None:
+        import record_schema
+        records = record_schema.expand_records(data_store.load_data(DATA_TYPE, default=[], data_dir=data_dir))
+    facts = facts_frame(records).drop_duplicates('id', keep='last')
+    with _rollup_lock:
+        shutil.rmtree(rollup_dir(data_dir) / FACTS_DIR_NAME, ignore_errors=True)
+        for week, week_facts in facts.groupby('week'):
+            _write_parquet(week_facts, _week_path(week, data_dir))
+        _write_rollups(summarize(facts), data_dir)
+    return len(facts)
+
+
+def counted_assets(rollup):
+    """How many analyses a rollup frame accounts for"""
+    if rollup is None or rollup.empty:
+        return 0
+    return int(rollup.loc[rollup['stage'] == ALL_STAGES, 'assets'].sum())
+
+
+def _fact_ids(data_dir=None):
+    """Ids of every analysis already in the weekly facts"""
+    ids = set()
+    for path in (rollup_dir(data_dir) / FACTS_DIR_NAME).glob('week=*.parquet'):
+        ids.update(pd.read_parquet(path, columns=['id'])['id'])
+    return ids
+
+
+def sync_rollups(data_dir=None, batch_size=SYNC_BATCH_SIZE):
+    """Fold stored competitor analyses missing from the rollups into them; returns how many were added
+
+    The stored file is streamed and only analyses whose id is not in the
+    facts yet go through update_rollups, so facts added meanwhile are kept.
+    """
+    import record_schema
+
+    known = _fact_ids(data_dir)
+    added = 0
+    missing = []
+    for record in data_store.iter_records(DATA_TYPE, data_dir):
+        if record_key(record) in known:
+            continue
+        missing.append(record_schema.expand_record(record))
+        if len(missing) == batch_size:
+            added += update_rollups(missing, data_dir)
+            missing = []
+    if missing:
+        added += update_rollups(missing, data_dir)
+    return added
+
+
+def load_rollups(competitors=None, stages=None, since=None, data_dir=None):
+    """Rollup rows, filtered while reading; an empty frame if nothing is rolled up yet"""
+    path = rollup_path(data_dir)
+    if not path.exists():
+        return pd.DataFrame(columns=GROUP_COLUMNS + list(METRICS))
+    filters = []
+    if competitors:
+        filters.append(('competitor', 'in', list(competitors)))
+    if stages:
+        filters.append(('stage', 'in', list(stages)))
+    if since is not None:
+        filters.append(('week', '>=', pd.Timestamp(since)))
+    return pd.read_parquet(path, filters=filters or None)
+
+
+def weekly_trend(rollup, metric, stage=ALL_STAGES):
+    """A week x competitor table of one metric for one stage (or all stages), ready to chart"""
+    rows = rollup[rollup['stage'] == stage]
+    return rows.pivot_table(index='week', columns='competitor', values=metric, aggfunc='first').sort_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Weekly competitor rollups")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('sync', help="Add stored competitor analyses missing from the rollups")
+    subparsers.add_parser('rebuild', help="Rebuild rollups from the stored competitor analyses")
+    show_parser = subparsers.add_parser('show', help="Print weekly rollups")
+    show_parser.add_argument('--competitor', action='append')
+    show_parser.add_argument('--stage', default=ALL_STAGES)
+    show_parser.add_argument('--since')
+    for sub in subparsers.choices.values():
+        sub.add_argument('--data-dir')
+    args = parser.parse_args(argv)
+
+    if args.command == 'sync':
+        print(f"📈 Added {sync_rollups(args.data_dir):,} competitor analyses to the rollups")
+        return 0
+    if args.command == 'rebuild':
+        print(f"📈 Rolled up {rebuild(data_dir=args.data_dir):,} competitor analyses")
+        return 0
+
+    rollup = load_rollups(args.competitor, [args.stage], args.since, args.data_dir)
+    if rollup.empty:
+        print("No rollups yet; run 'python competitor_rollups.py rebuild'")
+        return 1
+    columns = ['week', 'competitor'] + list(METRICS)
+    print(rollup.sort_values(['week', 'competitor'])[columns].to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
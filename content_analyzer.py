@@ -3,7 +3,11 @@ import json
 import os
 from datetime import datetime
 import pandas as pd
-from pathlib import Path
+
+import data_store
+import metrics
+import record_schema
+import resources
 
 # Page configuration
 st.set_page_config(
@@ -95,41 +99,43 @@ if 'api_keys' not in st.session_state:
     }
 
 # Directory setup for saving data
-DATA_DIR = Path("analyzer_data")
+DATA_DIR = data_store.DATA_DIR
 DATA_DIR.mkdir(exist_ok=True)
 
 # Helper functions
 def load_saved_data():
-    """Load previously saved data from disk"""
+    """Load saved data from disk, skipping files unchanged since this session last read them"""
+    signatures = st.session_state.setdefault('data_signatures', {})
     try:
-        if (DATA_DIR / "analyses.json").exists():
-            with open(DATA_DIR / "analyses.json", 'r') as f:
-                st.session_state.saved_analyses = json.load(f)
-        
-        if (DATA_DIR / "competitor_analyses.json").exists():
-            with open(DATA_DIR / "competitor_analyses.json", 'r') as f:
-                st.session_state.competitor_analyses = json.load(f)
-        
-        if (DATA_DIR / "personas.json").exists():
-            with open(DATA_DIR / "personas.json", 'r') as f:
-                st.session_state.personas = json.load(f)
-        
-        if (DATA_DIR / "persona_analyses.json").exists():
-            with open(DATA_DIR / "persona_analyses.json", 'r') as f:
-                st.session_state.persona_analyses = json.load(f)
-        
-        if (DATA_DIR / "api_keys.json").exists():
-            with open(DATA_DIR / "api_keys.json", 'r') as f:
-                st.session_state.api_keys = json.load(f)
+        with metrics.track('load') as load_stage:
+            for session_key, data_type in (
+                ('saved_analyses', 'analyses'),
+                ('competitor_analyses', 'competitor_analyses'),
+                ('personas', 'personas'),
+                ('persona_analyses', 'persona_analyses'),
+                ('api_keys', 'api_keys')
+            ):
+                signature = data_store.file_signature(data_type)
+                if data_type in signatures and signatures[data_type] == signature:
+                    continue
+                data = data_store.load_data(data_type, st.session_state[session_key])
+                if data_type in record_schema.RECORD_TYPES:
+                    data = record_schema.expand_records(data, st.session_state.personas)
+                st.session_state[session_key] = data
+                signatures[data_type] = signature
+                if data_type == 'personas':
+                    # Persona analyses reference personas by id, so rebuild them too
+                    signatures.pop('persona_analyses', None)
+                if signature:
+                    load_stage.bytes += signature[1]
     except Exception as e:
         st.error(f"Error loading saved data: {str(e)}")
 
 def save_data(data_type, data):
     """Save data to disk"""
     try:
-        filename = f"{data_type}.json"
-        with open(DATA_DIR / filename, 'w') as f:
-            json.dump(data, f, indent=2)
+        with metrics.track('save') as save_stage:
+            save_stage.bytes = data_store.save_data(data_type, data)
         return True
     except Exception as e:
         st.error(f"Error saving data: {str(e)}")
@@ -174,6 +180,8 @@ with st.sidebar:
                 'claude': claude_key
             }
             if save_data('api_keys', st.session_state.api_keys):
+                # Clients built with the old keys must not be reused
+                resources.clear_resources('llm_client')
                 st.success("✅ API keys saved successfully!")
     
     st.header("📋 Quick Stats")
@@ -181,19 +189,44 @@ with st.sidebar:
     st.metric("Competitor Analyses", len(st.session_state.competitor_analyses))
     st.metric("Personas Created", len(st.session_state.personas))
     st.metric("Persona Analyses", len(st.session_state.persona_analyses))
+    
+    if st.checkbox("🩺 Show diagnostics", help="Per-stage timing and memory for this server process"):
+        track_memory = st.checkbox(
+            "Track peak memory",
+            value=metrics.memory_tracking_enabled(),
+            help="Uses tracemalloc, which slows analysis down"
+        )
+        metrics.enable_memory_tracking(track_memory)
+        
+        stage_rows = metrics.summary_rows()
+        if stage_rows:
+            st.dataframe(pd.DataFrame(stage_rows).set_index('stage'), use_container_width=True)
+        else:
+            st.caption("No stages recorded yet")
+        
+        cache_stats = resources.response_cache().stats()
+        st.caption(f"LLM response cache: {cache_stats['entries']} responses ({cache_stats['bytes'] / 1e6:.1f} MB), "
+                   f"{cache_stats['hits']} hits / {cache_stats['misses']} misses this process")
+        
+        st.download_button("⬇️ Prometheus metrics", metrics.export_prometheus(),
+                           file_name="analyzer_metrics.prom", mime="text/plain")
+        st.download_button("⬇️ JSON metrics", metrics.export_json(),
+                           file_name="analyzer_metrics.json", mime="application/json")
 
 # Main tabs
-tab1, tab2, tab3 = st.tabs([
+tab1, tab2, tab3, tab4 = st.tabs([
     "🎯 Own Content Analysis",
     "🔍 Competitor Analysis",
-    "👥 Persona-Based Analysis"
+    "👥 Persona-Based Analysis",
+    "🔎 Search"
 ])
 
 # Import analysis modules
 from analysis_modules import (
     render_own_content_tab,
     render_competitor_tab,
-    render_persona_tab
+    render_persona_tab,
+    render_search_tab
 )
 
 with tab1:
@@ -205,6 +238,9 @@ with tab2:
 with tab3:
     render_persona_tab()
 
+with tab4:
+    render_search_tab()
+
 # Footer
 st.markdown("---")
 st.markdown(
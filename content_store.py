@@ -0,0 +1,52 @@
+"""
+Content-addressed store for the full text of analyzed documents
+
+Records only keep a 500 character preview; the full text is stored once per
+distinct document under analyzer_data/content/<hash prefix>/<sha256>.txt.gz
+and referenced from records by 'content_hash'.
+"""
+
+import gzip
+import hashlib
+import os
+import tempfile
+
+import data_store
+
+CONTENT_DIR_NAME = 'content'
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def content_path(digest, data_dir=None):
+    return data_store.data_path(f"{CONTENT_DIR_NAME}/{digest[:2]}/{digest}", data_dir).with_suffix('.txt.gz')
+
+
+def put(text, data_dir=None):
+    """Store text if it is not already stored and return its hash"""
+    digest = content_hash(text)
+    path = content_path(digest, data_dir)
+    if path.exists():
+        return digest
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{digest[:8]}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(gzip.compress(text.encode('utf-8')))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return digest
+
+
+def get(digest, data_dir=None):
+    """Return stored text for a hash, or None if it is not stored"""
+    path = content_path(digest, data_dir)
+    if not path.exists():
+        return None
+    return gzip.decompress(path.read_bytes()).decode('utf-8')
@@ -0,0 +1,121 @@
+"""
+Persistent JSON storage for the Content Intelligence Analyzer
+Shared by the Streamlit app and the headless batch tools
+"""
+
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import metrics
+
+# Directory setup for saving data
+DATA_DIR = Path("analyzer_data")
+
+# Block size for streaming reads of large data files
+READ_SIZE = 1 << 16
+
+# Serializes read-modify-write cycles across threads of one process
+_store_lock = threading.RLock()
+
+
+def data_path(data_type, data_dir=None):
+    """Return the JSON file path for a data type (e.g. 'analyses' or 'jobs/abc123')"""
+    return Path(data_dir or DATA_DIR) / f"{data_type}.json"
+
+
+def file_signature(data_type, data_dir=None):
+    """(mtime, size) of a data file, or None if it does not exist; changes whenever the file is rewritten"""
+    try:
+        stat = data_path(data_type, data_dir).stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def load_data(data_type, default=None, data_dir=None):
+    """Load a JSON data file, returning default if it is missing or empty"""
+    path = data_path(data_type, data_dir)
+    if not path.exists() or path.stat().st_size == 0:
+        return default
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def iter_records(data_type, data_dir=None, read_size=READ_SIZE):
+    """Yield the records of a list data file one at a time, reading it in blocks instead of all at once"""
+    path = data_path(data_type, data_dir)
+    if not path.exists() or path.stat().st_size == 0:
+        return
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as f:
+        buffer = f.read(read_size).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError(f"{path} does not hold a list")
+        pos = 1
+        while True:
+            # Skip whitespace and commas between records, reading on as needed
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos == len(buffer):
+                buffer, pos = f.read(read_size), 0
+                if not buffer:
+                    return
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # The record continues past the buffer
+                more = f.read(read_size)
+                if not more:
+                    raise
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            yield record
+            pos = end
+            if pos >= read_size:
+                buffer, pos = buffer[pos:], 0
+
+
+def save_data(data_type, data, data_dir=None):
+    """Atomically write a JSON data file so a crash never leaves it half-written; returns bytes written"""
+    path = data_path(data_type, data_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.stem}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+            nbytes = f.tell()
+        os.replace(tmp_path, path)
+        return nbytes
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def append_records(data_type, records, data_dir=None):
+    """Append records to a list data file, skipping any whose 'id' is already stored"""
+    with _store_lock:
+        data = load_data(data_type, default=[], data_dir=data_dir)
+        existing_ids = {r.get('id') for r in data if r.get('id')}
+        new_records = [r for r in records if not r.get('id') or r['id'] not in existing_ids]
+        if new_records:
+            data.extend(new_records)
+            with metrics.track('save') as save_stage:
+                save_stage.bytes = save_data(data_type, data, data_dir=data_dir)
+        return len(new_records)
+
+
+def delete_data(data_type, data_dir=None):
+    """Remove a JSON data file if it exists"""
+    path = data_path(data_type, data_dir)
+    if path.exists():
+        path.unlink()
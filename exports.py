@@ -0,0 +1,355 @@
+"""
+Streaming export of saved analyses to CSV, Parquet and Excel
+
+Own, competitor and persona analyses are read from their data files one
+record at a time (data_store.iter_records), filtered, flattened into one
+row per analysis and written out in chunks of CHUNK_SIZE rows. Memory use
+depends on the chunk size, not on how many analyses are stored.
+
+Nested fields become dotted columns (funnel_analysis.primary_stage,
+entity_analysis.total_words, ...). Lists are joined with LIST_SEPARATOR, and
+heading and keyword rows are written as short text such as
+"pricing (4, 1.2%, good)".
+
+    python exports.py columns competitor_analyses
+    python exports.py export analyses q3.parquet --since 2026-07-01 --until 2026-10-01
+    python exports.py export competitor_analyses acme.xlsx --name Acme --column id --column source
+"""
+
+import argparse
+import csv
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import data_store
+import record_schema
+from lazy_imports import lazy_module
+
+pa = lazy_module('pyarrow')
+pq = lazy_module('pyarrow.parquet')
+
+EXPORTS_DIR_NAME = 'exports'
+FORMATS = {'csv': 'CSV', 'parquet': 'Parquet', 'xlsx': 'Excel'}
+CHUNK_SIZE = 2000
+# Records flattened to discover the columns of a data file
+COLUMN_SAMPLE_SIZE = 200
+LIST_SEPARATOR = '; '
+# Excel limits: rows per sheet (one is the header) and characters per cell
+XLSX_MAX_ROWS = 1048576
+XLSX_MAX_CELL = 32767
+
+# Fields left out of exports: stage_info repeats FUNNEL_STAGES, profile is a debugging aid
+SKIPPED_FIELDS = {'stage_info', 'profile', 'analyzers'}
+# Only these persona fields are exported with persona analyses
+PERSONA_FIELDS = ('name', 'role')
+# Lists of rows written as one short text each
+ROW_FORMATS = {
+    'heading_analysis.heading_analysis': "{level} {heading} ({alignment_score})",
+    'keyword_analysis.keyword_analysis': "{keyword} ({count}, {density}%, {status})"
+}
+# Column types by the last part of the column name; everything else is text
+NUMBER_FIELDS = {
+    'confidence', 'total_words', 'total_sentences', 'urls_count', 'emails_count', 'statistics_count',
+    'avg_words_per_sentence', 'headings_count', 'persona_relevance_score'
+}
+BOOLEAN_FIELDS = {'aligned', 'optimized'}
+
+# Columns exported when none are selected
+DEFAULT_COLUMNS = {
+    'analyses': [
+        'id', 'timestamp', 'source', 'funnel_analysis.primary_stage', 'funnel_analysis.confidence',
+        'entity_analysis.total_words', 'entity_analysis.total_sentences', 'entity_analysis.statistics_count',
+        'entity_analysis.urls_count', 'entity_analysis.avg_words_per_sentence', 'heading_analysis.aligned',
+        'heading_analysis.heading_analysis', 'keyword_analysis.optimized', 'keyword_analysis.keyword_analysis',
+        'target_keywords'
+    ],
+    'competitor_analyses': [
+        'id', 'timestamp', 'competitor_name', 'source', 'funnel_analysis.primary_stage',
+        'funnel_analysis.confidence', 'entity_analysis.total_words', 'entity_analysis.statistics_count',
+        'entity_analysis.urls_count', 'headings_count', 'heading_analysis.aligned',
+        'keyword_analysis.keyword_analysis', 'competitive_insights.strengths',
+        'competitive_insights.opportunities'
+    ],
+    'persona_analyses': [
+        'id', 'timestamp', 'persona.name', 'asset_type', 'asset_url', 'funnel_stage',
+        'persona_relevance_score', 'relevant_pain_points', 'relevant_goals', 'entity_analysis.total_words',
+        'entity_analysis.statistics_count'
+    ]
+}
+DATA_TYPES = tuple(DEFAULT_COLUMNS)
+
+
+def exports_dir(data_dir=None):
+    return Path(data_dir or data_store.DATA_DIR) / EXPORTS_DIR_NAME
+
+
+def export_path(data_type, fmt, data_dir=None):
+    """A new timestamped file under analyzer_data/exports/"""
+    return exports_dir(data_dir) / f"{data_type}-{datetime.now():%Y%m%d-%H%M%S}.{fmt}"
+
+
+def _text(value):
+    if isinstance(value, dict):
+        return ', '.join(f"{k}: {v}" for k, v in value.items())
+    return str(value)
+
+
+def _row_text(template, row):
+    try:
+        return template.format_map(row)
+    except (KeyError, AttributeError):
+        return _text(row)
+
+
+def _flatten(value, prefix, row):
+    for key, item in value.items():
+        if key in SKIPPED_FIELDS:
+            continue
+        name = f"{prefix}{key}"
+        if name == 'persona' and isinstance(item, dict):
+            item = {field: item.get(field, '') for field in PERSONA_FIELDS}
+        if isinstance(item, dict):
+            _flatten(item, f"{name}.", row)
+        elif isinstance(item, list):
+            template = ROW_FORMATS.get(name)
+            if template:
+                row[name] = LIST_SEPARATOR.join(_row_text(template, r) for r in item)
+            else:
+                row[name] = LIST_SEPARATOR.join(_text(i) for i in item)
+        else:
+            row[name] = item
+
+
+def flatten(record):
+    """One flat row per analysis with dotted names for nested fields"""
+    row = {}
+    _flatten(record, '', row)
+    return row
+
+
+def column_kind(column):
+    """'number', 'boolean' or 'text'"""
+    field = column.rsplit('.', 1)[-1]
+    if field in NUMBER_FIELDS or column.startswith('funnel_analysis.scores.'):
+        return 'number'
+    if field in BOOLEAN_FIELDS:
+        return 'boolean'
+    return 'text'
+
+
+def record_stage(record):
+    return (record.get('funnel_analysis') or {}).get('primary_stage') or record.get('funnel_stage', '')
+
+
+def record_name(record):
+    """The competitor or persona an analysis belongs to, if any"""
+    if 'competitor_name' in record:
+        return record['competitor_name']
+    persona = record.get('persona')
+    return persona.get('name', '') if isinstance(persona, dict) else record.get('persona_name', '')
+
+
+def matches(record, since=None, until=None, stages=None, names=None):
+    """Whether a stored record passes the filters; since is inclusive and until exclusive (ISO dates)"""
+    timestamp = record.get('timestamp', '')
+    if since and timestamp < since:
+        return False
+    if until and timestamp >= until:
+        return False
+    if stages and record_stage(record) not in stages:
+        return False
+    if names and record_name(record) not in names:
+        return False
+    return True
+
+
+def available_columns(data_type, data_dir=None, sample_size=COLUMN_SAMPLE_SIZE):
+    """Default columns first, then any others found in the first stored records"""
+    columns = list(DEFAULT_COLUMNS[data_type])
+    seen = set(columns)
+    for count, record in enumerate(data_store.iter_records(data_type, data_dir)):
+        if count >= sample_size:
+            break
+        # Persona references expand to the same columns without looking personas up
+        for column in flatten(record_schema.expand_record(record)):
+            if column not in seen:
+                seen.add(column)
+                columns.append(column)
+    return columns
+
+
+def iter_rows(data_type, columns, filters=None, data_dir=None, chunk_size=CHUNK_SIZE):
+    """Yield lists of up to chunk_size rows, each row a list of values in column order"""
+    personas = data_store.load_data('personas', default=[], data_dir=data_dir)
+    filters = filters or {}
+    chunk = []
+    for record in data_store.iter_records(data_type, data_dir):
+        if not matches(record, **filters):
+            continue
+        row = flatten(record_schema.expand_record(record, personas))
+        chunk.append([row.get(column) for column in columns])
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class CsvWriter:
+    def __init__(self, path, columns, title=None):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+def _coerce(value, kind):
+    if value is None or value == '':
+        return None
+    if kind == 'number':
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    if kind == 'boolean':
+        return bool(value)
+    return str(value)
+
+
+class ParquetWriter:
+    """Writes each chunk as a row group under a fixed schema"""
+
+    ARROW_TYPES = {'number': 'float64', 'boolean': 'bool_', 'text': 'string'}
+
+    def __init__(self, path, columns, title=None):
+        self.kinds = [column_kind(column) for column in columns]
+        self.schema = pa.schema([(column, getattr(pa, self.ARROW_TYPES[kind])())
+                                 for column, kind in zip(columns, self.kinds)])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        arrays = [pa.array([_coerce(row[i], kind) for row in rows], type=field.type)
+                  for i, (kind, field) in enumerate(zip(self.kinds, self.schema))]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class XlsxWriter:
+    """Write-only workbook, which streams rows to disk; continues on a new sheet when one is full"""
+
+    def __init__(self, path, columns, title=None):
+        from openpyxl import Workbook
+        from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+        self.illegal_characters = ILLEGAL_CHARACTERS_RE
+        self.workbook = Workbook(write_only=True)
+        self.path = path
+        self.columns = columns
+        self.title = (title or 'export')[:28]
+        self.sheets = 0
+        self._add_sheet()
+
+    def _add_sheet(self):
+        self.sheets += 1
+        title = self.title if self.sheets == 1 else f"{self.title} {self.sheets}"
+        self.sheet = self.workbook.create_sheet(title)
+        self.sheet.append(self.columns)
+        self.sheet_rows = 1
+
+    def _value(self, value):
+        if isinstance(value, str):
+            return self.illegal_characters.sub('', value)[:XLSX_MAX_CELL]
+        return value
+
+    def write(self, rows):
+        for row in rows:
+            if self.sheet_rows >= XLSX_MAX_ROWS:
+                self._add_sheet()
+            self.sheet.append([self._value(value) for value in row])
+            self.sheet_rows += 1
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+WRITERS = {'csv': CsvWriter, 'parquet': ParquetWriter, 'xlsx': XlsxWriter}
+
+
+def export_records(data_type, path, fmt='csv', columns=None, filters=None, data_dir=None,
+                   chunk_size=CHUNK_SIZE, on_progress=None):
+    """Stream stored analyses of one type to a CSV, Parquet or Excel file
+
+    filters takes since, until, stages and names (competitor or persona names).
+    The file is written under a temporary name and only replaces path when complete.
+    Returns {'success': True, 'path', 'rows', 'columns'} or an error dict.
+    """
+    if data_type not in DEFAULT_COLUMNS:
+        return {'success': False, 'error': f"Unknown data type: {data_type}"}
+    if fmt not in WRITERS:
+        return {'success': False, 'error': f"Unsupported export format: {fmt}"}
+    columns = list(columns or DEFAULT_COLUMNS[data_type])
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    rows = 0
+    try:
+        writer = WRITERS[fmt](tmp_path, columns, title=data_type)
+        try:
+            for chunk in iter_rows(data_type, columns, filters, data_dir, chunk_size):
+                writer.write(chunk)
+                rows += len(chunk)
+                if on_progress:
+                    on_progress(rows)
+        finally:
+            writer.close()
+        os.replace(tmp_path, path)
+    except Exception as e:
+        tmp_path.unlink(missing_ok=True)
+        return {'success': False, 'error': str(e)}
+    return {'success': True, 'path': str(path), 'rows': rows, 'columns': columns}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export saved analyses to CSV, Parquet or Excel")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    columns_parser = subparsers.add_parser('columns', help="List the columns available for a data type")
+    columns_parser.add_argument('data_type', choices=DATA_TYPES)
+    export_parser = subparsers.add_parser('export', help="Write an export file")
+    export_parser.add_argument('data_type', choices=DATA_TYPES)
+    export_parser.add_argument('output', help="Output file; the format follows its extension")
+    export_parser.add_argument('--column', action='append', help="Columns to export (repeatable)")
+    export_parser.add_argument('--since', help="Saved on or after this date (YYYY-MM-DD)")
+    export_parser.add_argument('--until', help="Saved before this date (YYYY-MM-DD)")
+    export_parser.add_argument('--stage', action='append', help="Funnel stages (repeatable)")
+    export_parser.add_argument('--name', action='append', help="Competitor or persona names (repeatable)")
+    export_parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    for sub in subparsers.choices.values():
+        sub.add_argument('--data-dir')
+    args = parser.parse_args(argv)
+
+    if args.command == 'columns':
+        print('\n'.join(available_columns(args.data_type, args.data_dir)))
+        return 0
+
+    fmt = Path(args.output).suffix.lstrip('.').lower()
+    filters = {'since': args.since, 'until': args.until, 'stages': args.stage, 'names': args.name}
+    result = export_records(args.data_type, args.output, fmt, args.column, filters, args.data_dir, args.chunk_size)
+    if not result['success']:
+        print(f"❌ {result['error']}")
+        return 1
+    print(f"📤 Exported {result['rows']:,} rows x {len(result['columns'])} columns to {result['path']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+"""
+Trained funnel-stage classifier over hashed n-gram features
+
+A multinomial naive Bayes model is trained offline on labeled analyses and
+stored as a compact NumPy artifact (analyzer_data/funnel_model.npz). Word
+unigrams and bigrams are hashed into a fixed number of buckets, so the model
+needs no vocabulary and scores a batch of documents with a few array
+operations. analyze_funnel_stage uses it when ANALYZER_FUNNEL_MODE=model and a
+model has been trained, and falls back to the keyword heuristic otherwise.
+
+Label saved analyses, then train:
+    python funnel_classifier.py label <record_id> consideration
+    python funnel_classifier.py train --labels labels.csv --holdout 0.2
+    python funnel_classifier.py evaluate --labels more_labels.csv
+
+A labels file is a CSV or JSON list with a 'stage' and either the document
+'text' or its 'source' (URL or file path).
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import zlib
+from datetime import datetime
+from itertools import chain
+from pathlib import Path
+
+import content_store
+import data_store
+import resources
+from lazy_imports import lazy_module
+
+np = lazy_module('numpy')
+
+MODEL_FILE_NAME = 'funnel_model.npz'
+MODEL_VERSION = 1
+# Hash buckets for unigram and bigram features; a power of two so bucketing is a mask
+N_FEATURES = 2 ** 18
+DEFAULT_ALPHA = 0.1
+DEFAULT_HOLDOUT = 0.2
+MIN_EXAMPLES_PER_STAGE = 5
+# 'model' switches analyze_funnel_stage to the trained classifier
+MODE_ENV = 'ANALYZER_FUNNEL_MODE'
+LABEL_FIELD = 'funnel_label'
+# Record files whose records carry a funnel analysis of their whole content
+LABELED_RECORD_TYPES = ('analyses', 'competitor_analyses')
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+def _stages():
+    from analysis_modules import FUNNEL_STAGES
+    return list(FUNNEL_STAGES)
+
+
+def model_path(data_dir=None):
+    return Path(data_dir or data_store.DATA_DIR) / MODEL_FILE_NAME
+
+
+def terms(text):
+    """Lowercased word unigrams and bigrams of a document"""
+    tokens = _TOKEN_PATTERN.findall(text.lower())
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def featurize(texts, n_features=N_FEATURES, analyzer=terms, bucket_terms=None):
+    """Hash documents into sparse counts: (doc index, bucket, count) arrays, one entry per distinct bucket per doc
+
+    analyzer splits a document into terms. If bucket_terms is a dict it is
+    filled with a term for each bucket seen, so features can be named later.
+    """
+    doc_terms = [analyzer(text) for text in texts]
+    # Each distinct term is hashed once per batch
+    codes = {}
+    occurrences = np.fromiter(
+        (codes.setdefault(term, len(codes)) for term in chain.from_iterable(doc_terms)), dtype=np.int64
+    )
+    term_buckets = np.fromiter((zlib.crc32(term.encode('utf-8')) for term in codes), dtype=np.int64,
+                               count=len(codes)) & (n_features - 1)
+    if bucket_terms is not None:
+        for term, bucket in zip(codes, term_buckets.tolist()):
+            bucket_terms.setdefault(bucket, term)
+    doc_ids = np.repeat(np.arange(len(texts), dtype=np.int64), [len(t) for t in doc_terms])
+
+    keys, counts = np.unique(doc_ids * n_features + term_buckets[occurrences], return_counts=True)
+    return keys // n_features, keys % n_features, counts.astype(np.float64)
+
+
+def train(texts, labels, alpha=DEFAULT_ALPHA, n_features=N_FEATURES):
+    """Fit a multinomial naive Bayes model; every funnel stage needs MIN_EXAMPLES_PER_STAGE examples"""
+    stages = _stages()
+    counts = {stage: labels.count(stage) for stage in stages}
+    too_few = [f"{stage} ({count})" for stage, count in counts.items() if count < MIN_EXAMPLES_PER_STAGE]
+    if too_few:
+        raise ValueError(f"Need at least {MIN_EXAMPLES_PER_STAGE} labeled documents per stage; have {', '.join(too_few)}")
+    unknown = set(labels) - set(stages)
+    if unknown:
+        raise ValueError(f"Unknown stage label(s): {', '.join(sorted(unknown))}")
+
+    y = np.array([stages.index(label) for label in labels])
+    doc_ids, buckets, term_counts = featurize(texts, n_features)
+    feature_counts = np.zeros((len(stages), n_features))
+    np.add.at(feature_counts, (y[doc_ids], buckets), term_counts)
+    smoothed = feature_counts + alpha
+    return {
+        'classes': np.array(stages),
+        'feature_log_prob': (np.log(smoothed) - np.log(smoothed.sum(axis=1, keepdims=True))).astype(np.float32),
+        'class_log_prior': np.log(np.bincount(y, minlength=len(stages)) / len(y)),
+        'meta': {
+            'version': MODEL_VERSION,
+            'trained_at': datetime.now().isoformat(),
+            'examples': counts,
+            'alpha': alpha,
+            'n_features': n_features
+        }
+    }
+
+
+def save_model(model, data_dir=None, path=None):
+    """Write the model as a compressed .npz artifact; returns its path"""
+    path = Path(path) if path else model_path(data_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, classes=model['classes'], feature_log_prob=model['feature_log_prob'],
+                            class_log_prior=model['class_log_prior'], meta=np.array(json.dumps(model['meta'])))
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_model(data_dir=None, path=None):
+    """Load a saved model, or None if none has been trained"""
+    path = Path(path) if path else model_path(data_dir)
+    if not path.exists():
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        return {
+            'classes': data['classes'],
+            'feature_log_prob': data['feature_log_prob'],
+            'class_log_prior': data['class_log_prior'],
+            'meta': json.loads(str(data['meta']))
+        }
+
+
+def predict_proba(model, texts):
+    """Stage probabilities for a batch of documents, shape (documents, stages)"""
+    feature_log_prob = model['feature_log_prob']
+    doc_ids, buckets, term_counts = featurize(texts, feature_log_prob.shape[1])
+    joint = np.tile(model['class_log_prior'], (len(texts), 1))
+    np.add.at(joint, doc_ids, feature_log_prob[:, buckets].T * term_counts[:, None])
+    joint -= joint.max(axis=1, keepdims=True)
+    probabilities = np.exp(joint)
+    return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+
+def classify(model, texts):
+    """Funnel analyses for a batch of documents, shaped like analyze_funnel_stage's without stage_info"""
+    classes = [str(c) for c in model['classes']]
+    results = []
+    for row in predict_proba(model, texts):
+        best = int(row.argmax())
+        results.append({
+            'primary_stage': classes[best],
+            'confidence': float(row[best]),
+            'scores': {stage: round(float(p), 4) for stage, p in zip(classes, row)},
+            'method': 'model'
+        })
+    return results
+
+
+def active_model(data_dir=None):
+    """The trained model if classifier mode is enabled and a model exists, else None"""
+    if os.environ.get(MODE_ENV, '').lower() != 'model':
+        return None
+    path = model_path(data_dir)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    # Keyed by modification time so a retrained model is picked up without a restart
+    return resources.funnel_model(str(path), stat.st_mtime_ns)
+
+
+def evaluate(model, texts, labels):
+    """Accuracy and per-stage precision/recall of the model, next to the keyword heuristic's accuracy"""
+    from analysis_modules import analyze_funnel_stage_keywords
+
+    predicted = [r['primary_stage'] for r in classify(model, texts)]
+    heuristic = [analyze_funnel_stage_keywords(text)['primary_stage'] for text in texts]
+    per_stage = {}
+    for stage in (str(c) for c in model['classes']):
+        true_positive = sum(1 for p, l in zip(predicted, labels) if p == stage and l == stage)
+        predicted_count = predicted.count(stage)
+        actual_count = labels.count(stage)
+        per_stage[stage] = {
+            'precision': round(true_positive / predicted_count, 3) if predicted_count else 0.0,
+            'recall': round(true_positive / actual_count, 3) if actual_count else 0.0,
+            'support': actual_count
+        }
+    return {
+        'documents': len(labels),
+        'accuracy': round(sum(p == l for p, l in zip(predicted, labels)) / len(labels), 3),
+        'heuristic_accuracy': round(sum(h == l for h, l in zip(heuristic, labels)) / len(labels), 3),
+        'per_stage': per_stage
+    }
+
+
+def labeled_records(data_dir=None):
+    """(text, stage) pairs from saved analyses that carry a funnel_label"""
+    examples = []
+    for data_type in LABELED_RECORD_TYPES:
+        for record in data_store.load_data(data_type, default=[], data_dir=data_dir):
+            if record.get(LABEL_FIELD):
+                text = content_store.get(record['content_hash'], data_dir) if record.get('content_hash') else None
+                examples.append((text if text is not None else record.get('content_preview', ''), record[LABEL_FIELD]))
+    return examples
+
+
+def load_labels_file(path):
+    """(text, stage) pairs from a CSV or JSON labels file; rows with a 'source' are fetched"""
+    import batch_jobs
+
+    path = Path(path)
+    if path.suffix.lower() == '.json':
+        rows = json.loads(path.read_text())
+    else:
+        import csv
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+
+    examples = []
+    for row in rows:
+        text = row.get('text')
+        if not text and row.get('source'):
+            result = batch_jobs.fetch_source(row['source'])
+            if not result['success']:
+                print(f"  ⚠️ Skipping {row['source']}: {result['error']}")
+                continue
+            text = result['content']
+        if text:
+            examples.append((text, row['stage'].strip().lower()))
+    return examples
+
+
+def label_record(record_id, stage, data_dir=None):
+    """Set the funnel_label of a saved analysis; returns True if the record was found"""
+    if stage not in _stages():
+        raise ValueError(f"Unknown stage: {stage}")
+    with data_store._store_lock:
+        for data_type in LABELED_RECORD_TYPES:
+            records = data_store.load_data(data_type, default=[], data_dir=data_dir)
+            for record in records:
+                if record.get('id') == record_id:
+                    record[LABEL_FIELD] = stage
+                    data_store.save_data(data_type, records, data_dir=data_dir)
+                    return True
+    return False
+
+
+def split_holdout(examples, holdout, seed=0):
+    """Shuffle examples and split off a holdout share for evaluation"""
+    examples = list(examples)
+    random.Random(seed).shuffle(examples)
+    cut = int(len(examples) * (1 - holdout))
+    return examples[:cut], examples[cut:]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Trained funnel-stage classifier")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    label_parser = subparsers.add_parser('label', help="Label a saved analysis with its true funnel stage")
+    label_parser.add_argument('record_id')
+    label_parser.add_argument('stage')
+
+    train_parser = subparsers.add_parser('train', help="Train on labeled analyses and labels files")
+    train_parser.add_argument('--labels', action='append', default=[], help="CSV/JSON labels file (repeatable)")
+    train_parser.add_argument('--holdout', type=float, default=DEFAULT_HOLDOUT,
+                              help="Share of examples kept back to evaluate the model")
+    train_parser.add_argument('--alpha', type=float, default=DEFAULT_ALPHA, help="Additive smoothing")
+
+    evaluate_parser = subparsers.add_parser('evaluate', help="Score the saved model on labeled examples")
+    evaluate_parser.add_argument('--labels', action='append', default=[])
+
+    for sub in (label_parser, train_parser, evaluate_parser):
+        sub.add_argument('--data-dir')
+    args = parser.parse_args(argv)
+
+    if args.command == 'label':
+        found = label_record(args.record_id, args.stage, args.data_dir)
+        print(f"🏷️ Labeled {args.record_id} as {args.stage}" if found else f"No saved analysis {args.record_id}")
+        return 0 if found else 1
+
+    examples = labeled_records(args.data_dir)
+    for labels_path in args.labels:
+        examples += load_labels_file(labels_path)
+    if not examples:
+        print("No labeled examples found")
+        return 1
+
+    if args.command == 'train':
+        training, holdout = split_holdout(examples, args.holdout) if args.holdout > 0 else (examples, [])
+        model = train([t for t, _ in training], [s for _, s in training], alpha=args.alpha)
+        if holdout:
+            model['meta']['evaluation'] = evaluate(model, [t for t, _ in holdout], [s for _, s in holdout])
+        path = save_model(model, args.data_dir)
+        print(f"🧠 Trained on {len(training)} documents, saved {path} ({path.stat().st_size:,} bytes)")
+        evaluation = model['meta'].get('evaluation')
+    else:
+        model = load_model(args.data_dir)
+        if model is None:
+            print("No trained model; run 'python funnel_classifier.py train' first")
+            return 1
+        evaluation = evaluate(model, [t for t, _ in examples], [s for _, s in examples])
+
+    if evaluation:
+        print(f"📊 Accuracy {evaluation['accuracy']:.1%} on {evaluation['documents']} documents "
+              f"(keyword heuristic: {evaluation['heuristic_accuracy']:.1%})")
+        for stage, stats in evaluation['per_stage'].items():
+            print(f"   {stage:<14} precision {stats['precision']:.1%}  recall {stats['recall']:.1%}  n={stats['support']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
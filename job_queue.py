@@ -0,0 +1,202 @@
+"""
+Background job queue shared by every Streamlit session in the process
+
+The UI submits work (extraction, analysis) and gets a job id back, then polls
+for status and progress on later reruns instead of blocking the script thread.
+"""
+
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_PER_USER_LIMIT = 2
+# Finished jobs kept in memory for polling before the oldest are dropped
+MAX_FINISHED_JOBS = 500
+
+# Job statuses
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function when its job has been cancelled"""
+
+
+class JobContext:
+    """Handle passed to job functions for progress reporting and cancellation checks"""
+
+    def __init__(self, queue, job_id):
+        self._queue = queue
+        self.job_id = job_id
+        self._cancel_event = threading.Event()
+
+    def report(self, progress, message=''):
+        """Record progress (0.0-1.0) and a status message"""
+        self.check_cancelled()
+        self._queue._update(self.job_id, progress=max(0.0, min(float(progress), 1.0)), message=message)
+
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+
+class JobQueue:
+    """Thread pool with per-user concurrency limits and pollable job status"""
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, per_user_limit=DEFAULT_PER_USER_LIMIT):
+        self.per_user_limit = per_user_limit
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analyzer-job')
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._contexts = {}
+        self._waiting = {}
+        self._running = {}
+        self._finished = deque()
+
+    def submit(self, user_id, kind, fn, *args, description='', on_complete=None, **kwargs):
+        """Queue fn(job_context, *args, **kwargs) and return its job id
+
+        Jobs beyond the user's concurrency limit wait in that user's queue.
+        on_complete(result) runs in the worker thread after a successful run,
+        e.g. to persist the result to the data store; the finished job then
+        keeps what on_complete returns (e.g. a saved record's id) in place of
+        the result, so stored payloads are not also held in memory.
+        """
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'user_id': user_id,
+                'kind': kind,
+                'description': description,
+                'status': QUEUED,
+                'progress': 0.0,
+                'message': '',
+                'result': None,
+                'error': None,
+                'submitted_at': datetime.now().isoformat(),
+                'started_at': None,
+                'finished_at': None
+            }
+            self._contexts[job_id] = JobContext(self, job_id)
+            task = (job_id, fn, args, kwargs, on_complete)
+            if self._running.get(user_id, 0) < self.per_user_limit:
+                self._dispatch(user_id, task)
+            else:
+                self._waiting.setdefault(user_id, deque()).append(task)
+        return job_id
+
+    def status(self, job_id):
+        """Return a snapshot of a job's state, or None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def user_jobs(self, user_id):
+        """Return snapshots of all known jobs for a user, newest first"""
+        with self._lock:
+            jobs = [dict(j) for j in self._jobs.values() if j['user_id'] == user_id]
+        return sorted(jobs, key=lambda j: j['submitted_at'], reverse=True)
+
+    def cancel(self, job_id):
+        """Cancel a job; queued jobs never start, running jobs stop at their next checkpoint"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job['status'] in FINISHED_STATUSES:
+                return False
+            self._contexts[job_id]._cancel_event.set()
+            if job['status'] == QUEUED:
+                waiting = self._waiting.get(job['user_id'], ())
+                for task in list(waiting):
+                    if task[0] == job_id:
+                        waiting.remove(task)
+                        self._finish(job, CANCELLED)
+                        break
+            return True
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    # Internal helpers -- callers hold self._lock unless noted
+
+    def _dispatch(self, user_id, task):
+        self._running[user_id] = self._running.get(user_id, 0) + 1
+        self._executor.submit(self._run, user_id, task)
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _finish(self, job, status, result=None, error=None):
+        job.update(status=status, result=result, error=error, finished_at=datetime.now().isoformat())
+        if status == COMPLETED:
+            job['progress'] = 1.0
+        self._contexts.pop(job['job_id'], None)
+        self._finished.append(job['job_id'])
+        while len(self._finished) > MAX_FINISHED_JOBS:
+            self._jobs.pop(self._finished.popleft(), None)
+
+    def _run(self, user_id, task):
+        # Runs in a worker thread without the lock held
+        job_id, fn, args, kwargs, on_complete = task
+        context = self._contexts.get(job_id)
+        try:
+            if context is None or context.cancelled():
+                raise JobCancelled()
+            self._update(job_id, status=RUNNING, started_at=datetime.now().isoformat())
+            result = fn(context, *args, **kwargs)
+            context.check_cancelled()
+            if on_complete is not None:
+                result = on_complete(result)
+            outcome = (COMPLETED, result, None)
+        except JobCancelled:
+            outcome = (CANCELLED, None, None)
+        except Exception as e:
+            outcome = (FAILED, None, str(e))
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job and job['status'] not in FINISHED_STATUSES:
+                self._finish(job, *outcome)
+            self._running[user_id] -= 1
+            waiting = self._waiting.get(user_id)
+            if waiting:
+                self._dispatch(user_id, waiting.popleft())
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Return the process-wide job queue, creating it on first use"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
+
+
+def wait_for(job_id, timeout=None, poll_interval=0.05, queue=None):
+    """Block until a job finishes (for headless callers and tests) and return its snapshot"""
+    queue = queue or get_job_queue()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        job = queue.status(job_id)
+        if job is None or job['status'] in FINISHED_STATUSES:
+            return job
+        if deadline is not None and time.monotonic() >= deadline:
+            return job
+        time.sleep(poll_interval)
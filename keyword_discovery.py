@@ -0,0 +1,298 @@
+"""
+Streaming keyword and n-gram discovery across the content library
+
+Every saved analysis is read once and its distinct 1-3 word phrases are
+counted in a count-min sketch, one for our own content (own and persona
+analyses) and one for competitors. Next to each sketch a bounded list of
+heavy hitters keeps the most frequent phrases, so memory is fixed however
+many documents stream through. Counts are document frequencies: a phrase
+repeated within one page counts once.
+
+The sketches are saved to analyzer_data/keyword_sketch.npz and only records
+appended since the last pass are read. Gap terms, phrases competitors use
+on many pages that we rarely use, are offered as target keywords.
+
+    python keyword_discovery.py sync
+    python keyword_discovery.py gaps --limit 30
+    python keyword_discovery.py top competitor
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import zlib
+from collections import Counter
+from pathlib import Path
+
+import data_store
+import resources
+from lazy_imports import lazy_module
+from topic_clusters import STOP_WORDS, record_text
+
+np = lazy_module('numpy')
+
+SKETCH_FILE_NAME = 'keyword_sketch.npz'
+# Count-min sketch size: estimates overcount by at most e/SKETCH_WIDTH of all counts with probability 1 - e^-depth
+SKETCH_WIDTH = 2 ** 19
+SKETCH_DEPTH = 4
+# Phrases kept as heavy hitter candidates per corpus
+CANDIDATE_CAPACITY = 2000
+BATCH_SIZE = 500
+DEFAULT_GAP_LIMIT = 25
+# A gap term appears on at least this share of competitor pages...
+MIN_COMPETITOR_SHARE = 0.05
+MIN_COMPETITOR_DOCUMENTS = 2
+# ...and on less than this fraction of that share of our pages
+MAX_OWN_RATIO = 0.5
+
+# Record files counted as our content and as competitors' content
+OWN_TYPES = ('analyses', 'persona_analyses')
+COMPETITOR_TYPES = ('competitor_analyses',)
+
+_WORD_PATTERN = re.compile(r"[a-z][a-z0-9']*")
+_sketch_lock = threading.RLock()
+
+
+def sketch_path(data_dir=None):
+    return Path(data_dir or data_store.DATA_DIR) / SKETCH_FILE_NAME
+
+
+def phrases(text):
+    """Distinct 1-3 word phrases of a document that neither start nor end with a stop word"""
+    tokens = _WORD_PATTERN.findall(text.lower())
+    keep = [len(t) > 2 and t not in STOP_WORDS for t in tokens]
+    found = {t for t, k in zip(tokens, keep) if k}
+    found.update(f"{a} {b}" for a, b, ka, kb in zip(tokens, tokens[1:], keep, keep[1:]) if ka and kb)
+    found.update(f"{a} {b} {c}" for a, b, c, ka, kc in zip(tokens, tokens[1:], tokens[2:], keep, keep[2:])
+                 if ka and kc)
+    return found
+
+
+class CountMinSketch:
+    """Fixed-size frequency table that never undercounts"""
+
+    def __init__(self, width=SKETCH_WIDTH, depth=SKETCH_DEPTH, table=None):
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else np.zeros((depth, width), dtype=np.uint32)
+
+    def indexes(self, terms):
+        """Column of each term in every row, shape (depth, terms)"""
+        first = np.fromiter((zlib.crc32(term.encode('utf-8')) for term in terms), dtype=np.int64, count=len(terms))
+        # Double hashing: an odd second hash derived from the first gives each row its own column
+        second = ((first * 0x9E3779B1) >> 15) & 0xFFFFFFFF | 1
+        return (first + np.arange(self.depth, dtype=np.int64)[:, None] * second) % self.width
+
+    def add(self, indexes, counts):
+        counts = np.asarray(counts, dtype=np.uint32)
+        for row in range(self.depth):
+            np.add.at(self.table[row], indexes[row], counts)
+
+    def query(self, indexes):
+        return self.table[np.arange(self.depth)[:, None], indexes].min(axis=0).astype(np.int64)
+
+
+class TermCounter:
+    """Document frequencies of phrases in one corpus: a count-min sketch plus its heaviest hitters"""
+
+    def __init__(self, sketch=None, candidates=None, documents=0, capacity=CANDIDATE_CAPACITY):
+        self.sketch = sketch or CountMinSketch()
+        self.candidates = candidates or {}
+        self.documents = documents
+        self.capacity = capacity
+
+    def add_documents(self, texts):
+        frequencies = Counter()
+        for text in texts:
+            frequencies.update(phrases(text))
+        self.documents += len(texts)
+        if not frequencies:
+            return
+        terms = list(frequencies)
+        indexes = self.sketch.indexes(terms)
+        self.sketch.add(indexes, list(frequencies.values()))
+
+        # Any phrase whose estimate now beats the weakest kept candidate joins the candidates
+        estimates = self.sketch.query(indexes)
+        floor = min(self.candidates.values()) if len(self.candidates) >= self.capacity else 0
+        for term, estimate in zip(terms, estimates.tolist()):
+            if estimate > floor or term in self.candidates:
+                self.candidates[term] = estimate
+        if len(self.candidates) > 2 * self.capacity:
+            self._prune()
+
+    def _prune(self):
+        kept = sorted(self.candidates.items(), key=lambda item: -item[1])[:self.capacity]
+        self.candidates = dict(kept)
+
+    def estimates(self, terms):
+        terms = list(terms)
+        if not terms:
+            return {}
+        return dict(zip(terms, self.sketch.query(self.sketch.indexes(terms)).tolist()))
+
+    def top(self, limit):
+        """The phrases on most documents as (phrase, documents) pairs"""
+        return sorted(self.candidates.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+class KeywordSketch:
+    """Own and competitor term counters plus how far into each record file they have read"""
+
+    def __init__(self, own=None, competitor=None, offsets=None):
+        self.own = own or TermCounter()
+        self.competitor = competitor or TermCounter()
+        self.offsets = offsets or {}
+
+    def counter(self, data_type):
+        return self.competitor if data_type in COMPETITOR_TYPES else self.own
+
+    def pending(self, counts):
+        """How many records have not been counted yet, given the number of records per type"""
+        return sum(max(count - self.offsets.get(data_type, 0), 0) for data_type, count in counts.items())
+
+    def sync(self, data_dir=None, counts=None, batch_size=BATCH_SIZE, on_progress=None):
+        """Count records appended since the last sync; returns how many were counted
+
+        Record files are append-only, so a stored offset per file marks what
+        has been read and the files are streamed past it without being loaded
+        whole. counts, the expected records per type, only sizes the progress
+        total. If a file shrank, everything is counted again.
+        """
+        total = self.pending(counts) if counts else 0
+        done = 0
+        for data_type in OWN_TYPES + COMPETITOR_TYPES:
+            start = self.offsets.get(data_type, 0)
+            seen = 0
+            batch = []
+            for seen, record in enumerate(data_store.iter_records(data_type, data_dir), 1):
+                if seen <= start:
+                    continue
+                batch.append(record_text(record, data_dir))
+                if len(batch) == batch_size:
+                    done += self._count_batch(data_type, batch, seen)
+                    batch = []
+                    if on_progress:
+                        on_progress(done, max(total, done))
+            if seen < start:
+                self.own, self.competitor, self.offsets = TermCounter(), TermCounter(), {}
+                return self.sync(data_dir, counts, batch_size, on_progress)
+            if batch:
+                done += self._count_batch(data_type, batch, seen)
+                if on_progress:
+                    on_progress(done, max(total, done))
+        return done
+
+    def _count_batch(self, data_type, texts, offset):
+        self.counter(data_type).add_documents(texts)
+        self.offsets[data_type] = offset
+        return len(texts)
+
+    def gaps(self, limit=DEFAULT_GAP_LIMIT, min_share=MIN_COMPETITOR_SHARE):
+        """Phrases on many competitor pages and few of ours, biggest gap first"""
+        if not self.competitor.documents:
+            return []
+        terms = [term for term, count in self.competitor.candidates.items() if count >= MIN_COMPETITOR_DOCUMENTS]
+        own_counts = self.own.estimates(terms) if self.own.documents else {}
+        rows = []
+        for term in terms:
+            competitor_share = self.competitor.candidates[term] / self.competitor.documents
+            own_share = own_counts.get(term, 0) / self.own.documents if self.own.documents else 0.0
+            if competitor_share >= min_share and own_share < competitor_share * MAX_OWN_RATIO:
+                rows.append({
+                    'keyword': term,
+                    'competitor_documents': self.competitor.candidates[term],
+                    'competitor_share': round(competitor_share, 3),
+                    'own_documents': own_counts.get(term, 0),
+                    'own_share': round(own_share, 3),
+                    'gap': round(competitor_share - own_share, 3)
+                })
+        rows.sort(key=lambda row: (-row['gap'], -len(row['keyword'].split()), row['keyword']))
+        return rows[:limit]
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {'offsets': self.offsets, 'width': self.own.sketch.width, 'depth': self.own.sketch.depth,
+                'documents': {'own': self.own.documents, 'competitor': self.competitor.documents}}
+        arrays = {'meta': np.array(json.dumps(meta))}
+        for side, counter in (('own', self.own), ('competitor', self.competitor)):
+            arrays[f"{side}_table"] = counter.sketch.table
+            arrays[f"{side}_terms"] = np.array(list(counter.candidates), dtype=str)
+            arrays[f"{side}_counts"] = np.array(list(counter.candidates.values()), dtype=np.int64)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Load saved sketches, or None if nothing has been counted yet"""
+        path = Path(path)
+        if not path.exists():
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            counters = {
+                side: TermCounter(
+                    CountMinSketch(meta['width'], meta['depth'], data[f"{side}_table"]),
+                    dict(zip(data[f"{side}_terms"].tolist(), data[f"{side}_counts"].tolist())),
+                    meta['documents'][side]
+                )
+                for side in ('own', 'competitor')
+            }
+        return cls(counters['own'], counters['competitor'], meta['offsets'])
+
+
+def load_sketch(data_dir=None):
+    """The saved sketches, cached until they change; a fresh empty one if none are saved"""
+    path = sketch_path(data_dir)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return KeywordSketch()
+    return resources.keyword_sketch(str(path), stat.st_mtime_ns)
+
+
+def sync_keywords(data_dir=None, counts=None, on_progress=None):
+    """Count records saved since the last sync and save the sketches; returns the sketch"""
+    with _sketch_lock:
+        sketch = KeywordSketch.load(sketch_path(data_dir)) or KeywordSketch()
+        if sketch.sync(data_dir, counts, on_progress=on_progress):
+            sketch.save(sketch_path(data_dir))
+    return sketch
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keyword discovery across own and competitor content")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('sync', help="Count analyses saved since the last sync")
+    gaps_parser = subparsers.add_parser('gaps', help="Phrases competitors use that we don't")
+    gaps_parser.add_argument('--limit', type=int, default=DEFAULT_GAP_LIMIT)
+    gaps_parser.add_argument('--min-share', type=float, default=MIN_COMPETITOR_SHARE)
+    top_parser = subparsers.add_parser('top', help="Most common phrases of one corpus")
+    top_parser.add_argument('side', choices=['own', 'competitor'])
+    top_parser.add_argument('--limit', type=int, default=DEFAULT_GAP_LIMIT)
+    for sub in subparsers.choices.values():
+        sub.add_argument('--data-dir')
+    args = parser.parse_args(argv)
+
+    sketch = sync_keywords(data_dir=args.data_dir)
+    print(f"🔤 Counted {sketch.own.documents:,} own and {sketch.competitor.documents:,} competitor documents")
+    if args.command == 'gaps':
+        for row in sketch.gaps(args.limit, args.min_share):
+            print(f"{row['keyword']:<32} competitor {row['competitor_share']:>6.1%}  own {row['own_share']:>6.1%}")
+    elif args.command == 'top':
+        counter = getattr(sketch, args.side)
+        for term, count in counter.top(args.limit):
+            print(f"{term:<32} {count:>8,} documents")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""
+Deferred imports for heavy optional dependencies
+
+lazy_module('pandas') returns a stand-in that imports pandas the first time
+one of its attributes is used, so CLI tools and workers that only analyze
+pasted text never pay for Streamlit, pandas, requests, BeautifulSoup or PyPDF2.
+"""
+
+import importlib
+import threading
+
+_import_lock = threading.Lock()
+
+
+class LazyModule:
+    """Proxy that imports the named module on first attribute access"""
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            with _import_lock:
+                module = self.__dict__['_module']
+                if module is None:
+                    module = importlib.import_module(self.__dict__['_name'])
+                    self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy_module(name):
+    """Return a lazily imported module"""
+    return LazyModule(name)
@@ -0,0 +1,385 @@
+"""
+Map-reduce LLM analysis of long documents
+
+Instead of sending only the first few thousand characters, a document is
+split on its heading boundaries into chunks that fit the token budget. Each
+chunk is analyzed concurrently (map) and the partial analyses are merged
+into one report (reduce). Completions are cached by a hash of everything
+sent (see llm_cache), so after editing one section only that chunk and the
+merge re-run.
+"""
+
+import re
+from concurrent.futures import as_completed
+
+import llm_budget
+import llm_cache
+import metrics
+import resources
+
+SYSTEM_PROMPT = "You are a content marketing expert analyzing content for funnel stages, optimization, and improvements."
+DEFAULT_CHUNK_TOKENS = 3000
+# Answer size requested per call; clamped to what fits each model's window
+DEFAULT_MAX_OUTPUT_TOKENS = 1000
+# Upper bound on prompt plus answer tokens spent on one document (the per-job budget)
+DEFAULT_TOKEN_BUDGET = 200000
+# Allowance for the section title added to each chunk's instructions
+SECTION_LABEL_TOKENS = 50
+
+# Deliberately free of part numbers, so a chunk's cache key depends only on its own section
+MAP_INSTRUCTIONS = (
+    "This is one part of a longer document{section}. "
+    "Analyze only this part; the analyses of all parts will be merged afterwards."
+)
+REDUCE_INSTRUCTIONS = (
+    "Below are analyses of consecutive parts of one document. Merge them into a single report "
+    "for the whole document: combine duplicate points, resolve contradictions and keep "
+    "part-specific findings where they matter."
+)
+
+# Sentence ends and blank lines, the preferred places to cut an oversized section
+_BREAK_PATTERN = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+
+
+# Provider registry: name -> {'complete': fn(api_key, model, system, prompt, max_tokens), 'model': default}
+PROVIDERS = {}
+
+
+def register_provider(name, complete, default_model):
+    """Register a completion function under a provider name"""
+    PROVIDERS[name] = {'complete': complete, 'model': default_model}
+
+
+def _openai_complete(api_key, model, system, prompt, max_tokens):
+    response = resources.llm_client('openai', api_key).chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=max_tokens
+    )
+    return response.choices[0].message.content
+
+
+def _claude_complete(api_key, model, system, prompt, max_tokens):
+    response = resources.llm_client('claude', api_key).messages.create(
+        model=model,
+        system=system,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=max_tokens
+    )
+    return ''.join(block.text for block in response.content if block.type == 'text')
+
+
+def _gemini_complete(api_key, model, system, prompt, max_tokens):
+    genai = resources.llm_client('gemini', api_key)
+    response = genai.GenerativeModel(model, system_instruction=system).generate_content(
+        prompt, generation_config={'max_output_tokens': max_tokens}
+    )
+    return response.text
+
+
+register_provider('openai', _openai_complete, 'gpt-4')
+register_provider('claude', _claude_complete, 'claude-3-5-sonnet-latest')
+register_provider('gemini', _gemini_complete, 'gemini-1.5-flash')
+
+
+def _split_text(text, max_chars, max_tokens, provider):
+    """Cut an oversized section at sentence or paragraph breaks, falling back to word boundaries"""
+    pieces = []
+    current = ''
+    for part in _BREAK_PATTERN.split(text):
+        while len(part) > max_chars:
+            head = llm_budget.truncate_to_tokens(part[:max_chars], max_tokens, provider).rstrip()
+            head = head or part[:max_chars]
+            pieces.append(head)
+            part = part[len(head):].lstrip()
+        if current and len(current) + len(part) + 1 > max_chars:
+            pieces.append(current)
+            current = part
+        else:
+            current = f"{current} {part}" if current else part
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def heading_sections(content, headings=None):
+    """Cut content at its headings into [(title, start, end), ...] spans covering the whole text
+
+    headings are the extractor's [{'level', 'text'}, ...] in document order;
+    each is located in the text after the previous one.
+    """
+    boundaries = [(0, '')]
+    offset = 0
+    for heading in headings or []:
+        title = heading.get('text', '').strip()
+        position = content.find(title, offset) if title else -1
+        if position == 0:
+            boundaries[0] = (0, title)
+        elif position > 0:
+            boundaries.append((position, title))
+        if position >= 0:
+            offset = position + len(title)
+    return [(title, start, end) for (start, title), (end, _) in zip(boundaries, boundaries[1:] + [(len(content), '')])]
+
+
+def split_sections(content, headings=None, chunk_tokens=DEFAULT_CHUNK_TOKENS, provider=None):
+    """Split content into chunks of at most chunk_tokens, one or more per heading section
+
+    Sections are never packed together, so editing, adding or removing one
+    section leaves every other chunk, and its cached analysis, unchanged.
+    Returns [{'index', 'title', 'text'}, ...].
+    """
+    max_chars = int(chunk_tokens * llm_budget.chars_per_token(provider))
+    chunks = []
+    for title, start, end in heading_sections(content, headings):
+        text = content[start:end].strip()
+        for piece in _split_text(text, max_chars, chunk_tokens, provider) if text else []:
+            chunks.append({'index': len(chunks), 'title': title, 'text': piece})
+    return chunks
+
+
+def complete(provider, api_key, prompt, content='', model=None, system=SYSTEM_PROMPT,
+             max_tokens=DEFAULT_MAX_OUTPUT_TOKENS, cache=None):
+    """Run one completion through the response cache, returning (text, cache_hit)"""
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {provider}")
+    model = model or PROVIDERS[provider]['model']
+    cache = cache or resources.response_cache()
+
+    key = llm_cache.cache_key(provider, model, system, prompt, content)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached, True
+
+    full_prompt = f"{prompt}\n\nContent:\n{content}" if content else prompt
+    # Size the answer to the model's window and refuse prompts that cannot fit before sending
+    prompt_tokens = llm_budget.estimate_tokens(system, provider) + llm_budget.estimate_tokens(full_prompt, provider)
+    max_tokens = llm_budget.output_token_limit(prompt_tokens, model, max_tokens)
+    with metrics.track('llm', len(full_prompt)):
+        text = PROVIDERS[provider]['complete'](api_key, model, system, full_prompt, max_tokens)
+    cache.put(key, text, provider, model)
+    return text, False
+
+
+def _map_prompt(prompt, chunk, total):
+    """Instructions for one chunk, built from its own title only; a single-chunk document is sent as a whole"""
+    if total == 1:
+        return prompt
+    section = f" (section: {chunk['title']})" if chunk['title'] else ''
+    return f"{prompt}\n\n{MAP_INSTRUCTIONS.format(section=section)}"
+
+
+def _reduce_prompt(prompt, partials):
+    parts = '\n\n'.join(f"### Part {i}\n{text}" for i, text in enumerate(partials, 1))
+    return f"{prompt}\n\n{REDUCE_INSTRUCTIONS}\n\n{parts}"
+
+
+def _group_partials(partials, max_chars):
+    """Pack partial analyses into merge groups of at least two that fit max_chars where possible"""
+    groups = [[]]
+    size = 0
+    for text in partials:
+        if len(groups[-1]) >= 2 and size + len(text) > max_chars:
+            groups.append([])
+            size = 0
+        groups[-1].append(text)
+        size += len(text)
+    # A trailing single analysis is folded into the previous group
+    if len(groups) > 1 and len(groups[-1]) == 1:
+        groups[-2].extend(groups.pop())
+    return groups
+
+
+def _run_concurrently(calls, on_done=None):
+    """Run zero-argument calls on the shared LLM pool, returning (results, errors) in call order"""
+    pool = resources.llm_pool()
+    futures = {pool.submit(call): i for i, call in enumerate(calls)}
+    results = [None] * len(calls)
+    errors = [None] * len(calls)
+    try:
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                errors[i] = str(e)
+            if on_done:
+                on_done()
+    finally:
+        # Stop queued requests if the caller bailed out (e.g. job cancelled)
+        for future in futures:
+            future.cancel()
+    return results, errors
+
+
+def _resolve_model(provider, model):
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {provider}")
+    return model or PROVIDERS[provider]['model']
+
+
+def _chunk_budget(prompt, provider, model, chunk_tokens, max_tokens):
+    """Largest chunk that fits the model's window next to the instructions and the answer"""
+    overhead = (llm_budget.estimate_tokens(SYSTEM_PROMPT, provider) + llm_budget.estimate_tokens(prompt, provider)
+                + llm_budget.estimate_tokens(MAP_INSTRUCTIONS, provider) + SECTION_LABEL_TOKENS)
+    capacity = llm_budget.prompt_capacity(model, overhead, min(max_tokens, llm_budget.model_limits(model)['max_output']))
+    if capacity < llm_budget.MIN_OUTPUT_TOKENS:
+        raise llm_budget.PromptTooLarge(f"The prompt leaves no room for document content in {model}'s window")
+    return min(chunk_tokens, capacity)
+
+
+def _plan_calls(chunks, prompt, provider, model, max_tokens, max_chars):
+    """Worst-case estimates for each stage of calls: the chunk analyses, then each merge level"""
+    system_tokens = llm_budget.estimate_tokens(SYSTEM_PROMPT, provider)
+    output_tokens = min(max_tokens, llm_budget.model_limits(model)['max_output'])
+    stages = [[
+        llm_budget.estimate_call(
+            system_tokens + llm_budget.estimate_tokens(_map_prompt(prompt, c, len(chunks)), provider)
+            + llm_budget.estimate_tokens(c['text'], provider),
+            output_tokens, model
+        )
+        for c in chunks
+    ]]
+
+    # Assume every partial analysis uses its full answer allowance
+    partial = 'x' * int(output_tokens * llm_budget.chars_per_token(provider))
+    reduce_overhead = system_tokens + llm_budget.estimate_tokens(_reduce_prompt(prompt, []), provider)
+    partials = [partial] * len(chunks)
+    while len(partials) > 1:
+        groups = _group_partials(partials, max_chars)
+        stages.append([
+            llm_budget.estimate_call(reduce_overhead + len(group) * output_tokens, output_tokens, model)
+            for group in groups
+        ])
+        partials = [partial] * len(groups)
+    return stages
+
+
+def plan_document(content, prompt, provider, headings=None, model=None,
+                  chunk_tokens=DEFAULT_CHUNK_TOKENS, max_tokens=DEFAULT_MAX_OUTPUT_TOKENS):
+    """Estimate calls, tokens, cost (USD) and wall-clock time for analyzing a document, without sending anything"""
+    model = _resolve_model(provider, model)
+    chunk_tokens = _chunk_budget(prompt, provider, model, chunk_tokens, max_tokens)
+    chunks = split_sections(content, headings, chunk_tokens, provider)
+    max_chars = int(chunk_tokens * llm_budget.chars_per_token(provider))
+    stages = _plan_calls(chunks, prompt, provider, model, max_tokens, max_chars)
+    plan = llm_budget.summarize_calls(stages, resources.LLM_POOL_SIZE)
+    plan.update({'provider': provider, 'model': model, 'chunks': len(chunks)})
+    return plan
+
+
+def plan_batch(documents, prompt, provider, model=None,
+               chunk_tokens=DEFAULT_CHUNK_TOKENS, max_tokens=DEFAULT_MAX_OUTPUT_TOKENS):
+    """Estimate a bulk run over (content, headings) pairs sharing the LLM pool"""
+    model = _resolve_model(provider, model)
+    chunk_tokens = _chunk_budget(prompt, provider, model, chunk_tokens, max_tokens)
+    max_chars = int(chunk_tokens * llm_budget.chars_per_token(provider))
+    stages = []
+    chunk_count = 0
+    for content, headings in documents:
+        chunks = split_sections(content, headings, chunk_tokens, provider)
+        chunk_count += len(chunks)
+        for level, stage in enumerate(_plan_calls(chunks, prompt, provider, model, max_tokens, max_chars)):
+            if level == len(stages):
+                stages.append([])
+            stages[level].extend(stage)
+    plan = llm_budget.summarize_calls(stages, resources.LLM_POOL_SIZE)
+    plan.update({'provider': provider, 'model': model, 'documents': len(documents), 'chunks': chunk_count})
+    return plan
+
+
+def analyze_document(content, prompt, provider, api_key, headings=None, model=None,
+                     chunk_tokens=DEFAULT_CHUNK_TOKENS, token_budget=DEFAULT_TOKEN_BUDGET,
+                     max_tokens=DEFAULT_MAX_OUTPUT_TOKENS, on_progress=None, cache=None,
+                     user=None, ledger=llm_budget.USER_LEDGER):
+    """Analyze a whole document chunk by chunk and merge the results into one report
+
+    The worst-case token cost is checked against token_budget (the per-job
+    budget) and, when a user is given, reserved from their budget in ledger
+    before any call is sent; tokens not spent are refunded afterwards.
+    on_progress(done, total) is called from the calling thread as chunks finish.
+    """
+    try:
+        model = _resolve_model(provider, model)
+        chunk_tokens = _chunk_budget(prompt, provider, model, chunk_tokens, max_tokens)
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}
+    max_chars = int(chunk_tokens * llm_budget.chars_per_token(provider))
+    chunks = split_sections(content, headings, chunk_tokens, provider)
+    if not chunks:
+        return {'success': False, 'error': "No content to analyze"}
+
+    plan = llm_budget.summarize_calls(_plan_calls(chunks, prompt, provider, model, max_tokens, max_chars))
+    estimated_tokens = plan['total_tokens']
+    if estimated_tokens > token_budget:
+        return {
+            'success': False,
+            'error': f"Document needs up to {estimated_tokens:,} tokens, over the job budget of {token_budget:,}"
+        }
+    if user:
+        try:
+            ledger.reserve(user, estimated_tokens)
+        except llm_budget.BudgetExceeded as e:
+            return {'success': False, 'error': str(e)}
+
+    progress = {'done': 0}
+    # Estimated tokens of calls actually sent (cache hits cost nothing); appended from pool threads
+    spent_calls = []
+    total_steps = len(chunks) + (1 if len(chunks) > 1 else 0)
+
+    def step_done():
+        progress['done'] += 1
+        if on_progress:
+            on_progress(progress['done'], total_steps)
+
+    def run(call_prompt, call_content=''):
+        def call():
+            text, hit = complete(provider, api_key, call_prompt, call_content, model, max_tokens=max_tokens, cache=cache)
+            if not hit:
+                spent_calls.append(llm_budget.estimate_tokens(f"{SYSTEM_PROMPT}{call_prompt}{call_content}{text}", provider))
+            return text, hit
+        return call
+
+    try:
+        mapped, errors = _run_concurrently(
+            [run(_map_prompt(prompt, c, len(chunks)), c['text']) for c in chunks], step_done
+        )
+        failed = [chunks[i]['title'] or f"Part {i + 1}" for i, error in enumerate(errors) if error]
+        partials = [result[0] for result in mapped if result]
+        if not partials:
+            return {'success': False, 'error': next(e for e in errors if e)}
+
+        cached_calls = sum(1 for result in mapped if result and result[1])
+        calls = len(partials)
+        # Merge level by level until a single report remains
+        while len(partials) > 1:
+            groups = _group_partials(partials, max_chars)
+            merged, merge_errors = _run_concurrently([run(_reduce_prompt(prompt, group)) for group in groups])
+            if any(merge_errors):
+                return {'success': False, 'error': next(e for e in merge_errors if e)}
+            partials = [text for text, _ in merged]
+            cached_calls += sum(1 for _, hit in merged if hit)
+            calls += len(merged)
+        if total_steps > len(chunks):
+            step_done()
+    finally:
+        if user:
+            ledger.refund(user, estimated_tokens - sum(spent_calls))
+
+    return {
+        'success': True,
+        'report': partials[0],
+        'provider': provider,
+        'model': model,
+        'chunks': len(chunks),
+        'failed_chunks': failed,
+        'calls': calls,
+        'cached_calls': cached_calls,
+        'cache_hit': cached_calls == calls,
+        'estimated_tokens': estimated_tokens,
+        'estimated_cost': plan['cost'],
+        'spent_tokens': sum(spent_calls)
+    }
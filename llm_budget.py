@@ -0,0 +1,188 @@
+"""
+Token estimates, model limits, cost/latency planning and token budgets for LLM calls
+
+Everything here runs offline so requests can be sized, priced and checked
+against budgets before anything is sent to a provider.
+"""
+
+import math
+import re
+import threading
+import time
+from collections import defaultdict, deque
+
+# Context window, output cap, USD price per million tokens and rough generation speed per model
+MODELS = {
+    'gpt-4': {'provider': 'openai', 'context_window': 8192, 'max_output': 4096,
+              'input_per_million': 30.0, 'output_per_million': 60.0, 'tokens_per_second': 25},
+    'gpt-4o': {'provider': 'openai', 'context_window': 128000, 'max_output': 16384,
+               'input_per_million': 2.5, 'output_per_million': 10.0, 'tokens_per_second': 80},
+    'gpt-4o-mini': {'provider': 'openai', 'context_window': 128000, 'max_output': 16384,
+                    'input_per_million': 0.15, 'output_per_million': 0.6, 'tokens_per_second': 100},
+    'claude-3-5-sonnet-latest': {'provider': 'claude', 'context_window': 200000, 'max_output': 8192,
+                                 'input_per_million': 3.0, 'output_per_million': 15.0, 'tokens_per_second': 60},
+    'claude-3-5-haiku-latest': {'provider': 'claude', 'context_window': 200000, 'max_output': 8192,
+                                'input_per_million': 0.8, 'output_per_million': 4.0, 'tokens_per_second': 100},
+    'gemini-1.5-flash': {'provider': 'gemini', 'context_window': 1000000, 'max_output': 8192,
+                         'input_per_million': 0.075, 'output_per_million': 0.3, 'tokens_per_second': 150},
+    'gemini-1.5-pro': {'provider': 'gemini', 'context_window': 2000000, 'max_output': 8192,
+                       'input_per_million': 1.25, 'output_per_million': 5.0, 'tokens_per_second': 60}
+}
+# Assumed for models not listed above (e.g. local fakes): conservative window, no price
+DEFAULT_MODEL_LIMITS = {'provider': None, 'context_window': 8192, 'max_output': 4096,
+                        'input_per_million': 0.0, 'output_per_million': 0.0, 'tokens_per_second': 50}
+# Time to first token, added to every call's latency estimate
+REQUEST_OVERHEAD_SECONDS = 1.0
+
+# Average characters per sub-word token for each provider's tokenizer on English prose
+CHARS_PER_TOKEN = {'openai': 4.0, 'claude': 3.5, 'gemini': 4.0}
+DEFAULT_CHARS_PER_TOKEN = 4.0
+# Words up to this length are usually a single token; longer ones are split
+SINGLE_TOKEN_WORD_CHARS = 10
+# Estimates are padded by this factor when checking that a request fits a window
+SAFETY_MARGIN = 1.1
+# Requests that leave less room than this for the answer are rejected
+MIN_OUTPUT_TOKENS = 256
+
+DEFAULT_USER_TOKEN_BUDGET = 500000
+USER_BUDGET_WINDOW_SECONDS = 24 * 3600
+
+# Words and individual punctuation marks, the units a BPE tokenizer starts from
+_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+class PromptTooLarge(ValueError):
+    """Raised when a prompt does not leave room for an answer in the model's context window"""
+
+
+class BudgetExceeded(Exception):
+    """Raised when a request would exceed a user's or job's token budget"""
+
+
+def chars_per_token(provider=None):
+    return CHARS_PER_TOKEN.get(provider, DEFAULT_CHARS_PER_TOKEN)
+
+
+def _piece_tokens(piece, ratio):
+    if len(piece) <= SINGLE_TOKEN_WORD_CHARS:
+        return 1
+    return math.ceil(len(piece) / ratio)
+
+
+def estimate_tokens(text, provider=None):
+    """Estimate how many tokens the provider's tokenizer produces for text"""
+    ratio = chars_per_token(provider)
+    return sum(_piece_tokens(piece, ratio) for piece in _PIECE_PATTERN.findall(text))
+
+
+def truncate_to_tokens(text, max_tokens, provider=None):
+    """Cut text to at most max_tokens (estimated), ending on a word or punctuation boundary"""
+    ratio = chars_per_token(provider)
+    tokens = 0
+    end = 0
+    for match in _PIECE_PATTERN.finditer(text):
+        tokens += _piece_tokens(match.group(), ratio)
+        if tokens > max_tokens:
+            return text[:end]
+        end = match.end()
+    return text
+
+
+def model_limits(model):
+    return MODELS.get(model, DEFAULT_MODEL_LIMITS)
+
+
+def output_token_limit(prompt_tokens, model, requested):
+    """Largest answer that fits the model's window after the prompt, capped at requested"""
+    limits = model_limits(model)
+    room = limits['context_window'] - math.ceil(prompt_tokens * SAFETY_MARGIN)
+    allowed = min(requested, limits['max_output'], room)
+    if allowed < MIN_OUTPUT_TOKENS:
+        raise PromptTooLarge(
+            f"Prompt of about {prompt_tokens:,} tokens leaves no room for an answer "
+            f"in {model}'s {limits['context_window']:,} token window"
+        )
+    return allowed
+
+
+def prompt_capacity(model, overhead_tokens, output_tokens):
+    """How many content tokens one call can carry next to its instructions and answer"""
+    limits = model_limits(model)
+    return int((limits['context_window'] - output_tokens) / SAFETY_MARGIN) - overhead_tokens
+
+
+def estimate_call(prompt_tokens, output_tokens, model):
+    """Worst-case cost (USD) and latency (seconds) of one call"""
+    limits = model_limits(model)
+    return {
+        'prompt_tokens': prompt_tokens,
+        'output_tokens': output_tokens,
+        'cost': (prompt_tokens * limits['input_per_million'] + output_tokens * limits['output_per_million']) / 1e6,
+        'seconds': REQUEST_OVERHEAD_SECONDS + output_tokens / limits['tokens_per_second']
+    }
+
+
+def summarize_calls(stages, concurrency=1):
+    """Total tokens, cost and wall-clock estimate for stages of calls that run one stage after another
+
+    Calls within a stage run concurrently, up to concurrency at a time.
+    """
+    calls = [call for stage in stages for call in stage]
+    seconds = 0.0
+    for stage in stages:
+        if stage:
+            seconds += max(max(c['seconds'] for c in stage), sum(c['seconds'] for c in stage) / concurrency)
+    prompt_tokens = sum(c['prompt_tokens'] for c in calls)
+    output_tokens = sum(c['output_tokens'] for c in calls)
+    return {
+        'calls': len(calls),
+        'prompt_tokens': prompt_tokens,
+        'output_tokens': output_tokens,
+        'total_tokens': prompt_tokens + output_tokens,
+        'cost': round(sum(c['cost'] for c in calls), 4),
+        'seconds': round(seconds, 1)
+    }
+
+
+class TokenLedger:
+    """Thread-safe per-user token spend over a rolling window"""
+
+    def __init__(self, limit=DEFAULT_USER_TOKEN_BUDGET, window_seconds=USER_BUDGET_WINDOW_SECONDS):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._entries = defaultdict(deque)
+
+    def _spent(self, user, now):
+        entries = self._entries[user]
+        while entries and now - entries[0][0] > self.window_seconds:
+            entries.popleft()
+        return sum(tokens for _, tokens in entries)
+
+    def spent(self, user):
+        with self._lock:
+            return self._spent(user, time.time())
+
+    def remaining(self, user):
+        return max(self.limit - self.spent(user), 0)
+
+    def reserve(self, user, tokens):
+        """Reserve tokens for a request, raising BudgetExceeded if the user's budget cannot cover it"""
+        now = time.time()
+        with self._lock:
+            spent = self._spent(user, now)
+            if spent + tokens > self.limit:
+                raise BudgetExceeded(
+                    f"Request needs about {tokens:,} tokens but only {max(self.limit - spent, 0):,} "
+                    f"of the {self.limit:,} token budget remain"
+                )
+            self._entries[user].append((now, tokens))
+
+    def refund(self, user, tokens):
+        """Return reserved tokens that were not spent (e.g. answered from cache)"""
+        if tokens > 0:
+            with self._lock:
+                self._entries[user].append((time.time(), -tokens))
+
+
+USER_LEDGER = TokenLedger()
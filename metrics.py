@@ -0,0 +1,243 @@
+"""
+Per-stage timing and memory instrumentation with Prometheus/JSON export
+
+Extractors, analyzers and storage calls are wrapped with instrument() or
+track() and report latency, bytes processed and (optionally) peak traced
+allocation per stage: fetch, parse, funnel, entities, headings, keywords,
+persona scoring, save and load.
+
+tracemalloc keeps one process-wide peak. A stage only resets it when no
+other thread is inside a tracked stage, so concurrent stages (e.g. JobQueue
+workers) never wipe each other's peaks; their figures then also count the
+other threads' allocations and are upper bounds rather than exact.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Set ANALYZER_TRACK_MEMORY=1 to record peak allocation per stage (tracemalloc has overhead)
+TRACK_MEMORY_ENV = 'ANALYZER_TRACK_MEMORY'
+
+
+class StageHandle:
+    """Yielded by track() so the caller can report how many bytes the stage processed"""
+
+    def __init__(self):
+        self.bytes = 0
+
+
+class MetricsRegistry:
+    """Thread-safe accumulator of per-stage latency histograms, byte counts and peaks"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._local = threading.local()
+        # Threads inside a tracked stage while tracemalloc runs
+        self._tracing_threads = set()
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+
+    def _stage(self, name):
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = {
+                'count': 0,
+                'errors': 0,
+                'sum_seconds': 0.0,
+                'max_seconds': 0.0,
+                'buckets': [0] * len(LATENCY_BUCKETS),
+                'bytes_total': 0,
+                'peak_alloc_bytes': 0
+            }
+        return stage
+
+    def observe(self, name, seconds, nbytes=0, peak_alloc=None, error=False):
+        """Record one completed stage run"""
+        with self._lock:
+            stage = self._stage(name)
+            stage['count'] += 1
+            stage['errors'] += 1 if error else 0
+            stage['sum_seconds'] += seconds
+            stage['max_seconds'] = max(stage['max_seconds'], seconds)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    stage['buckets'][i] += 1
+            stage['bytes_total'] += nbytes or 0
+            if peak_alloc is not None:
+                stage['peak_alloc_bytes'] = max(stage['peak_alloc_bytes'], peak_alloc)
+
+    @contextmanager
+    def track(self, name, nbytes=0):
+        """Time a block as one run of the named stage"""
+        handle = StageHandle()
+        handle.bytes = nbytes
+        frames = getattr(self._local, 'frames', None)
+        if frames is None:
+            frames = self._local.frames = []
+
+        # Nested stages each reset the tracemalloc peak, so parents fold in their children's peaks
+        tracing = tracemalloc.is_tracing()
+        frame = {'start_current': 0, 'child_peak': 0}
+        if tracing:
+            frame['start_current'] = tracemalloc.get_traced_memory()[0]
+            if frames:
+                frames[-1]['child_peak'] = max(frames[-1]['child_peak'], tracemalloc.get_traced_memory()[1])
+            with self._lock:
+                # The peak is process-wide; resetting it under another thread's stage would lose that stage's peak
+                if not self._tracing_threads - {threading.get_ident()}:
+                    tracemalloc.reset_peak()
+                self._tracing_threads.add(threading.get_ident())
+        frames.append(frame)
+
+        error = False
+        start = time.perf_counter()
+        try:
+            yield handle
+        except BaseException:
+            error = True
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            frames.pop()
+            if not frames:
+                with self._lock:
+                    self._tracing_threads.discard(threading.get_ident())
+            peak_alloc = None
+            if tracing and tracemalloc.is_tracing():
+                peak = max(tracemalloc.get_traced_memory()[1], frame['child_peak'])
+                peak_alloc = max(peak - frame['start_current'], 0)
+                if frames:
+                    frames[-1]['child_peak'] = max(frames[-1]['child_peak'], peak)
+            self.observe(name, seconds, handle.bytes, peak_alloc, error)
+
+    def snapshot(self):
+        """Return a deep copy of the per-stage metrics"""
+        with self._lock:
+            return {name: dict(stage, buckets=list(stage['buckets'])) for name, stage in self._stages.items()}
+
+    def summary_rows(self):
+        """One row per stage for display in a table"""
+        rows = []
+        for name, stage in sorted(self.snapshot().items()):
+            rows.append({
+                'stage': name,
+                'calls': stage['count'],
+                'errors': stage['errors'],
+                'avg_ms': round(stage['sum_seconds'] / stage['count'] * 1000, 2) if stage['count'] else 0,
+                'p95_ms': _bucket_quantile(stage, 0.95),
+                'max_ms': round(stage['max_seconds'] * 1000, 2),
+                'mb_processed': round(stage['bytes_total'] / 1e6, 3),
+                'peak_alloc_mb': round(stage['peak_alloc_bytes'] / 1e6, 3)
+            })
+        return rows
+
+    def export_json(self):
+        """Export all metrics as a JSON string"""
+        return json.dumps({
+            'generated_at': time.time(),
+            'latency_buckets': list(LATENCY_BUCKETS),
+            'stages': self.snapshot()
+        }, indent=2)
+
+    def export_prometheus(self):
+        """Export all metrics in the Prometheus text exposition format"""
+        stages = self.snapshot()
+        lines = [
+            "# HELP analyzer_stage_duration_seconds Time spent in each analysis stage",
+            "# TYPE analyzer_stage_duration_seconds histogram"
+        ]
+        for name, stage in sorted(stages.items()):
+            for bound, count in zip(LATENCY_BUCKETS, stage['buckets']):
+                lines.append(f'analyzer_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+            lines.append(f'analyzer_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {stage["count"]}')
+            lines.append(f'analyzer_stage_duration_seconds_sum{{stage="{name}"}} {stage["sum_seconds"]}')
+            lines.append(f'analyzer_stage_duration_seconds_count{{stage="{name}"}} {stage["count"]}')
+
+        for metric, key, metric_type, help_text in (
+            ('analyzer_stage_bytes_total', 'bytes_total', 'counter', "Bytes processed by each stage"),
+            ('analyzer_stage_errors_total', 'errors', 'counter', "Stage runs that raised an exception"),
+            ('analyzer_stage_peak_alloc_bytes', 'peak_alloc_bytes', 'gauge', "Largest traced allocation peak per stage"),
+        ):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {metric_type}")
+            for name, stage in sorted(stages.items()):
+                lines.append(f'{metric}{{stage="{name}"}} {stage[key]}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path, fmt='prometheus'):
+        """Atomically write metrics to a file (e.g. for the node_exporter textfile collector)"""
+        text = self.export_prometheus() if fmt == 'prometheus' else self.export_json()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+def _bucket_quantile(stage, quantile):
+    """Approximate a latency quantile (ms) as the upper bound of the bucket that contains it"""
+    if not stage['count']:
+        return 0
+    target = stage['count'] * quantile
+    for bound, count in zip(LATENCY_BUCKETS, stage['buckets']):
+        if count >= target:
+            return round(bound * 1000, 2)
+    return round(stage['max_seconds'] * 1000, 2)
+
+
+def _default_size(args, result):
+    """Bytes processed: the text argument for analyzers, the extracted text for extractors"""
+    if args and isinstance(args[0], (str, bytes)):
+        return len(args[0])
+    if isinstance(result, dict) and isinstance(result.get('content'), str):
+        return len(result['content'])
+    return 0
+
+
+REGISTRY = MetricsRegistry()
+
+track = REGISTRY.track
+snapshot = REGISTRY.snapshot
+summary_rows = REGISTRY.summary_rows
+export_json = REGISTRY.export_json
+export_prometheus = REGISTRY.export_prometheus
+write_metrics = REGISTRY.write
+reset = REGISTRY.reset
+
+
+def instrument(stage_name, size=_default_size):
+    """Decorator recording each call of the function as a run of stage_name"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with REGISTRY.track(stage_name) as handle:
+                result = fn(*args, **kwargs)
+                handle.bytes = size(args, result)
+                return result
+        return wrapper
+    return decorator
+
+
+def memory_tracking_enabled():
+    return tracemalloc.is_tracing()
+
+
+def enable_memory_tracking(enabled=True):
+    """Start or stop tracemalloc so stages record their peak allocation"""
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not enabled and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+if os.environ.get(TRACK_MEMORY_ENV) == '1':
+    enable_memory_tracking()
@@ -0,0 +1,132 @@
+"""
+Bulk persona import from Excel/CSV sheets
+
+Sheets are validated and transformed column-wise with pandas, then merged
+into the stored personas by name: a row whose persona already exists updates
+it in place and keeps its id, any other row becomes a new persona with a
+random unique id. The merged list is written back in one atomic save.
+"""
+
+import uuid
+from datetime import datetime
+
+import data_store
+from lazy_imports import lazy_module
+
+pd = lazy_module('pandas')
+
+# Sheet column -> persona field
+PERSONA_COLUMNS = {
+    'Persona Name': 'name',
+    'Role/Title': 'role',
+    'Description': 'description',
+    'Pain Points': 'pain_points',
+    'Goals': 'goals'
+}
+REQUIRED_COLUMNS = ('Persona Name', 'Role/Title')
+LIST_FIELDS = ('pain_points', 'goals')
+# Pain points and goals are listed in one cell, separated by commas or line breaks
+LIST_SEPARATOR = r'\s*[,\n]\s*'
+
+
+def read_persona_sheet(file_obj, filename):
+    """Read an uploaded CSV or Excel sheet with every cell as text"""
+    if filename.lower().endswith('.csv'):
+        return pd.read_csv(file_obj, dtype=str, keep_default_na=False)
+    return pd.read_excel(file_obj, dtype=str, keep_default_na=False)
+
+
+def prepare_personas(df):
+    """Validate and normalize a persona sheet
+
+    Column headers are matched case-insensitively. Returns (frame, rejected)
+    where frame has one row per persona name (the last row wins) and rejected
+    lists {'row', 'error'} for rows that cannot be imported. Raises
+    ValueError if a required column is missing.
+    """
+    headers = {str(column).strip().casefold(): column for column in df.columns}
+    missing = [column for column in REQUIRED_COLUMNS if column.casefold() not in headers]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+
+    # Optional columns the sheet leaves out are left untouched on existing personas
+    frame = pd.DataFrame(index=df.index)
+    for column, field in PERSONA_COLUMNS.items():
+        source = headers.get(column.casefold())
+        if source is not None:
+            frame[field] = df[source].fillna('').astype(str).str.strip()
+    # Spreadsheet row numbers: the header is row 1
+    frame['row'] = df.index + 2
+
+    incomplete = (frame['name'] == '') | (frame['role'] == '')
+    rejected = [{'row': int(row), 'error': "Persona Name and Role/Title are required"}
+                for row in frame.loc[incomplete, 'row']]
+    frame = frame[~incomplete]
+
+    name_keys = frame['name'].str.casefold()
+    repeated = name_keys.duplicated(keep='last')
+    rejected += [{'row': int(row), 'error': "Same persona name appears again further down"}
+                 for row in frame.loc[repeated, 'row']]
+    frame = frame[~repeated]
+
+    for field in LIST_FIELDS:
+        if field in frame:
+            frame[field] = [[item for item in items if item]
+                            for items in frame[field].str.split(LIST_SEPARATOR, regex=True)]
+    return frame, sorted(rejected, key=lambda r: r['row'])
+
+
+def unique_ids(personas):
+    """Give personas that share an id (from the old length-based ids) a new one; returns how many changed"""
+    seen = set()
+    changed = 0
+    for persona in personas:
+        if persona.get('id') in seen or persona.get('id') is None:
+            persona['id'] = uuid.uuid4().hex
+            changed += 1
+        seen.add(persona['id'])
+    return changed
+
+
+def upsert_personas(existing, frame, now=None):
+    """Merge prepared rows into existing personas by name; returns (personas, added, updated)"""
+    now = (now or datetime.now()).isoformat()
+    personas = [dict(p) for p in existing]
+    by_name = {p['name'].strip().casefold(): p for p in personas}
+    added = updated = 0
+    for row in frame.drop(columns='row').to_dict('records'):
+        persona = by_name.get(row['name'].casefold())
+        if persona is None:
+            persona = {'description': '', 'pain_points': [], 'goals': [], **row,
+                       'id': uuid.uuid4().hex, 'created_at': now}
+            personas.append(persona)
+            by_name[row['name'].casefold()] = persona
+            added += 1
+        else:
+            persona.update(row, updated_at=now)
+            updated += 1
+    return personas, added, updated
+
+
+def import_personas(df, data_dir=None):
+    """Validate a persona sheet and upsert it into the stored personas in one atomic write"""
+    try:
+        frame, rejected = prepare_personas(df)
+        with data_store._store_lock:
+            existing = data_store.load_data('personas', default=[], data_dir=data_dir)
+            personas, added, updated = upsert_personas(existing, frame)
+            repaired = unique_ids(personas)
+            data_store.save_data('personas', personas, data_dir=data_dir)
+        return {
+            'success': True,
+            'personas': personas,
+            'added': added,
+            'updated': updated,
+            'repaired_ids': repaired,
+            'rejected': rejected
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e)
+        }
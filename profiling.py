@@ -0,0 +1,75 @@
+"""
+On-demand profiling of individual analyses
+
+An opted-in analysis runs under cProfile; the raw profile is saved to
+analyzer_data/profiles/<record id>.prof next to the saved record, and the
+record carries a summary of the hottest functions.
+
+Inspect a saved profile with:
+    python -m pstats analyzer_data/profiles/<record id>.prof
+"""
+
+import cProfile
+import os
+import pstats
+
+import data_store
+
+PROFILE_DIR_NAME = 'profiles'
+TOP_FUNCTIONS = 15
+
+
+def profile_path(record_id, data_dir=None):
+    """Where the raw profile for a record is stored"""
+    return data_store.data_path(f"{PROFILE_DIR_NAME}/{record_id}", data_dir).with_suffix('.prof')
+
+
+def profile_call(fn, *args, **kwargs):
+    """Run fn under the deterministic profiler, returning (result, profiler)"""
+    profiler = cProfile.Profile()
+    result = profiler.runcall(fn, *args, **kwargs)
+    return result, profiler
+
+
+def _short_location(filename, line):
+    """Trim a profiled file path to 'package/module.py:line' for display"""
+    if filename == '~':
+        return 'built-in'
+    parent, name = os.path.split(filename)
+    return f"{os.path.join(os.path.basename(parent), name)}:{line}"
+
+
+def top_functions(profiler, limit=TOP_FUNCTIONS):
+    """Summarize the functions with the most self time"""
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, name), (_, calls, self_time, cumulative, _) in stats.stats.items():
+        rows.append({
+            'function': name,
+            'location': _short_location(filename, line),
+            'calls': calls,
+            'self_ms': round(self_time * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3)
+        })
+    rows.sort(key=lambda r: r['self_ms'], reverse=True)
+    return rows[:limit]
+
+
+def attach_profile(record, profiler, data_dir=None, limit=TOP_FUNCTIONS):
+    """Save the raw profile next to the record and attach its hot-function summary"""
+    path = profile_path(record['id'], data_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(str(path))
+    stats = pstats.Stats(profiler)
+    record['profile'] = {
+        'path': f"{PROFILE_DIR_NAME}/{path.name}",
+        'total_ms': round(stats.total_tt * 1000, 3),
+        'top_functions': top_functions(profiler, limit)
+    }
+    return record
+
+
+def run_profiled(builder, *args, data_dir=None):
+    """Run one of the build_* analysis pipelines under the profiler and attach the profile"""
+    record, profiler = profile_call(builder, *args)
+    return attach_profile(record, profiler, data_dir)
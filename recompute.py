@@ -0,0 +1,198 @@
+"""
+Selective recomputation of stored analyses when analyzer rules change
+
+Each saved record keeps, per analyzer, the version and configuration
+fingerprint that produced it (see ANALYZER_VERSIONS and analyzer_config in
+analysis_modules). After a rule change, such as a FUNNEL_STAGES keyword
+edit or a new threshold, only the analyzers whose fingerprint differs are
+rerun, over the stored full text of each record. Every other field is
+left as it was. Records without stored full text are skipped.
+
+    python recompute.py status
+    python recompute.py run [--analyzer funnel_analysis] [--dry-run]
+    python recompute.py stamp    # adopt current fingerprints for records saved before versioning
+"""
+
+import argparse
+import sys
+from collections import Counter
+
+import competitor_rollups
+import content_store
+import data_store
+import record_schema
+import resources
+import search_index
+
+RECORD_TYPES = record_schema.RECORD_TYPES
+
+
+def _analysis():
+    import analysis_modules
+    return analysis_modules
+
+
+def _headings(record):
+    """Headings as extracted, rebuilt from the stored heading analysis"""
+    rows = (record.get('heading_analysis') or {}).get('heading_analysis', [])
+    return [{'text': row['heading'], 'level': row['level']} for row in rows]
+
+
+def _keywords(record):
+    if 'target_keywords' in record:
+        return record['target_keywords']
+    return [row['keyword'] for row in (record.get('keyword_analysis') or {}).get('keyword_analysis', [])]
+
+
+def _rerun(name, data_type, record, text):
+    """Recompute one analyzer's output in place"""
+    am = _analysis()
+    if name == 'funnel_analysis':
+        funnel_analysis = am.analyze_funnel_stage(text)
+        if data_type == 'persona_analyses':
+            record['funnel_stage'] = funnel_analysis['primary_stage']
+        else:
+            record['funnel_analysis'] = funnel_analysis
+    elif name == 'entity_analysis':
+        record['entity_analysis'] = am.extract_entities(text)
+    elif name == 'heading_analysis':
+        record['heading_analysis'] = am.analyze_heading_alignment(text, _headings(record))
+    elif name == 'keyword_analysis':
+        record['keyword_analysis'] = am.analyze_keyword_optimization(text, _keywords(record))
+    elif name == 'competitive_insights':
+        record['competitive_insights'] = am.assess_competitor(record['entity_analysis'], record.get('headings_count', 0))
+
+
+def stale_analyzers(record, fingerprints, only=None):
+    """Analyzers whose stored fingerprint differs from the current one, in run order"""
+    stamps = record.get('analyzers') or {}
+    return [name for name, fingerprint in fingerprints.items()
+            if stamps.get(name) != fingerprint and (not only or name in only)]
+
+
+def status(data_dir=None):
+    """Stale record counts as {data type: {analyzer: count}} plus the total records per type"""
+    am = _analysis()
+    report = {}
+    for data_type in RECORD_TYPES:
+        fingerprints = am.analyzer_fingerprints(data_type)
+        records = data_store.load_data(data_type, default=[], data_dir=data_dir)
+        stale = Counter(name for record in records for name in stale_analyzers(record, fingerprints))
+        report[data_type] = {'records': len(records), 'stale': dict(stale)}
+    return report
+
+
+def _merge(data_type, updates, data_dir=None):
+    """Write recomputed records back by id; returns the records written
+
+    Runs under the store lock, but only for the merge: records saved during
+    the recompute are kept, and records changed or removed meanwhile are
+    left as they now are.
+    """
+    written = []
+    with data_store._store_lock:
+        stored = data_store.load_data(data_type, default=[], data_dir=data_dir)
+        for position, current in enumerate(stored):
+            update = updates.get(search_index.record_key(current))
+            if update and current == update[0]:
+                stored[position] = record_schema.compact_record(update[1])
+                written.append(update[1])
+        if written:
+            data_store.save_data(data_type, stored, data_dir=data_dir)
+    return written
+
+
+def recompute(analyzers=None, data_dir=None, dry_run=False, on_progress=None):
+    """Rerun stale analyzers over stored full text and save the updated records
+
+    Returns {data type: {'records', 'missing_text', 'analyzers': {name: count}}}
+    where records counts the records updated (or that would be, on a dry run).
+    Analysis runs without holding the store lock, so the app keeps saving;
+    each record file is then rewritten once with the results merged in by id.
+    """
+    am = _analysis()
+    summary = {}
+    for data_type in RECORD_TYPES:
+        fingerprints = am.analyzer_fingerprints(data_type)
+        counts = Counter()
+        missing_text = stale_records = 0
+        # id -> (stored record as read, recomputed record)
+        updates = {}
+        personas = data_store.load_data('personas', default=[], data_dir=data_dir)
+        for compact in data_store.load_data(data_type, default=[], data_dir=data_dir):
+            names = stale_analyzers(compact, fingerprints, analyzers)
+            if not names:
+                continue
+            text = content_store.get(compact['content_hash'], data_dir) if compact.get('content_hash') else None
+            if text is None:
+                missing_text += 1
+                continue
+            counts.update(names)
+            stale_records += 1
+            if dry_run:
+                continue
+            record = record_schema.expand_record(compact, personas)
+            for name in names:
+                _rerun(name, data_type, record, text)
+            record['analyzers'] = {**(compact.get('analyzers') or {}), **{n: fingerprints[n] for n in names}}
+            updates[search_index.record_key(compact)] = (compact, record)
+            if on_progress:
+                on_progress(data_type, len(updates))
+        changed = _merge(data_type, updates, data_dir) if updates else []
+        if changed and any(name == 'funnel_analysis' for name in counts):
+            resources.search_index(data_dir).update_stages(data_type, changed)
+        if changed and data_type == competitor_rollups.DATA_TYPE:
+            competitor_rollups.rebuild(data_dir=data_dir)
+        records = stale_records if dry_run else len(changed)
+        summary[data_type] = {'records': records, 'missing_text': missing_text, 'analyzers': dict(counts)}
+    return summary
+
+
+def stamp(data_dir=None):
+    """Record current fingerprints on records that have none, without recomputing; returns counts per type"""
+    am = _analysis()
+    counts = {}
+    for data_type in RECORD_TYPES:
+        fingerprints = am.analyzer_fingerprints(data_type)
+        with data_store._store_lock:
+            stored = data_store.load_data(data_type, default=[], data_dir=data_dir)
+            unstamped = [record for record in stored if not record.get('analyzers')]
+            for record in unstamped:
+                record['analyzers'] = dict(fingerprints)
+            if unstamped:
+                data_store.save_data(data_type, stored, data_dir=data_dir)
+        counts[data_type] = len(unstamped)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute stored analyses whose analyzer rules changed")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('status', help="Count stale results per analyzer")
+    run_parser = subparsers.add_parser('run', help="Rerun stale analyzers over stored full text")
+    run_parser.add_argument('--analyzer', action='append', help="Only these analyzers (repeatable)")
+    run_parser.add_argument('--dry-run', action='store_true', help="Report what would be recomputed")
+    subparsers.add_parser('stamp', help="Mark records saved before versioning as current")
+    for sub in subparsers.choices.values():
+        sub.add_argument('--data-dir')
+    args = parser.parse_args(argv)
+
+    if args.command == 'status':
+        for data_type, report in status(args.data_dir).items():
+            stale = ', '.join(f"{name} {count}" for name, count in report['stale'].items()) or 'up to date'
+            print(f"{data_type:<22} {report['records']:>7,} records  stale: {stale}")
+    elif args.command == 'run':
+        for data_type, result in recompute(args.analyzer, args.data_dir, args.dry_run).items():
+            reruns = ', '.join(f"{name} {count}" for name, count in result['analyzers'].items()) or 'nothing stale'
+            verb = "would update" if args.dry_run else "updated"
+            print(f"🔁 {data_type}: {verb} {result['records']} records ({reruns}); "
+                  f"{result['missing_text']} skipped without stored text")
+    else:
+        for data_type, count in stamp(args.data_dir).items():
+            print(f"🏷️ {data_type}: stamped {count} records")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
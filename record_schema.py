@@ -0,0 +1,168 @@
+"""
+Normalized storage of analysis records
+
+Saved records keep references instead of copies of shared data: the funnel
+stage id instead of its FUNNEL_STAGES definition, the persona id and name
+instead of the whole persona, and suggestion template ids instead of the
+suggestion texts. expand_records() rebuilds the full view on read. Records
+saved before normalization already hold the full view and pass through
+unchanged.
+
+Compact existing data files in place with:
+    python record_schema.py migrate
+"""
+
+import argparse
+import sys
+
+import data_store
+
+# Data files holding analysis records
+RECORD_TYPES = ('analyses', 'competitor_analyses', 'persona_analyses')
+# Templates filled in from one row of keyword_analysis; referenced as '<id>:<row index>'
+KEYWORD_TEMPLATES = ('keyword_low', 'keyword_high')
+# Sections whose suggestions can be stored as template ids
+SUGGESTION_SECTIONS = ('heading_analysis', 'keyword_analysis')
+
+
+def _templates():
+    from analysis_modules import SUGGESTION_TEMPLATES
+    return SUGGESTION_TEMPLATES
+
+
+def _suggestion_ids(suggestions, keyword_rows):
+    """Template ids that reproduce the suggestions exactly, or None if any suggestion is free text"""
+    templates = _templates()
+    ids_by_text = {text: template_id for template_id, text in templates.items() if template_id not in KEYWORD_TEMPLATES}
+    for template_id in KEYWORD_TEMPLATES:
+        for i, row in enumerate(keyword_rows):
+            ids_by_text.setdefault(templates[template_id].format(**row), f"{template_id}:{i}")
+
+    ids = []
+    for text in suggestions:
+        if text not in ids_by_text:
+            return None
+        ids.append(ids_by_text[text])
+    return ids
+
+
+def _suggestion_texts(ids, keyword_rows):
+    templates = _templates()
+    texts = []
+    for suggestion_id in ids:
+        template_id, _, row = suggestion_id.partition(':')
+        if row:
+            texts.append(templates[template_id].format(**keyword_rows[int(row)]))
+        else:
+            texts.append(templates[template_id])
+    return texts
+
+
+def compact_record(record):
+    """Return a copy of an analysis record with shared data replaced by references"""
+    record = dict(record)
+
+    funnel_analysis = record.get('funnel_analysis')
+    if funnel_analysis and 'stage_info' in funnel_analysis:
+        record['funnel_analysis'] = {k: v for k, v in funnel_analysis.items() if k != 'stage_info'}
+
+    for key in SUGGESTION_SECTIONS:
+        section = record.get(key)
+        if section and 'suggestions' in section:
+            ids = _suggestion_ids(section['suggestions'], section.get('keyword_analysis', []))
+            if ids is not None:
+                section = {k: v for k, v in section.items() if k != 'suggestions'}
+                section['suggestion_ids'] = ids
+                record[key] = section
+
+    persona = record.get('persona')
+    if isinstance(persona, dict):
+        del record['persona']
+        record['persona_id'] = persona.get('id')
+        record['persona_name'] = persona.get('name', '')
+
+    return record
+
+
+def compact_records(records):
+    return [compact_record(r) for r in records]
+
+
+def _persona_lookup(personas):
+    by_id = {p.get('id'): p for p in personas or []}
+    by_name = {p.get('name'): p for p in personas or []}
+
+    def lookup(persona_id, name):
+        persona = by_id.get(persona_id)
+        if persona is not None and persona.get('name') == name:
+            return persona
+        if name in by_name:
+            return by_name[name]
+        # The persona was deleted; keep enough for the record to display
+        return {'id': persona_id, 'name': name, 'role': '', 'description': '',
+                'pain_points': [], 'goals': [], 'deleted': True}
+    return lookup
+
+
+def _expand(record, lookup):
+    from analysis_modules import FUNNEL_STAGES
+
+    record = dict(record)
+
+    funnel_analysis = record.get('funnel_analysis')
+    if funnel_analysis and 'stage_info' not in funnel_analysis:
+        record['funnel_analysis'] = dict(funnel_analysis, stage_info=FUNNEL_STAGES[funnel_analysis['primary_stage']])
+
+    for key in SUGGESTION_SECTIONS:
+        section = record.get(key)
+        if section and 'suggestion_ids' in section:
+            section = {k: v for k, v in section.items() if k != 'suggestion_ids'}
+            section['suggestions'] = _suggestion_texts(record[key]['suggestion_ids'], section.get('keyword_analysis', []))
+            record[key] = section
+
+    if 'persona' not in record and 'persona_id' in record:
+        record['persona'] = lookup(record.pop('persona_id'), record.pop('persona_name', ''))
+
+    return record
+
+
+def expand_record(record, personas=None):
+    """Rebuild the full view of a stored record"""
+    return _expand(record, _persona_lookup(personas))
+
+
+def expand_records(records, personas=None):
+    """Rebuild the full view of stored records, resolving persona references against personas"""
+    lookup = _persona_lookup(personas)
+    return [_expand(r, lookup) for r in records]
+
+
+def migrate(data_dir=None):
+    """Rewrite stored record files in compact form; returns bytes saved per data type"""
+    saved = {}
+    with data_store._store_lock:
+        for data_type in RECORD_TYPES:
+            path = data_store.data_path(data_type, data_dir)
+            records = data_store.load_data(data_type, default=[], data_dir=data_dir)
+            if not records:
+                continue
+            before = path.stat().st_size
+            after = data_store.save_data(data_type, compact_records(records), data_dir=data_dir)
+            saved[data_type] = before - after
+    return saved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Normalized storage of analysis records")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = subparsers.add_parser('migrate', help="Compact stored records in place")
+    migrate_parser.add_argument('--data-dir')
+    args = parser.parse_args(argv)
+
+    for data_type, nbytes in migrate(args.data_dir).items():
+        print(f"📦 {data_type}: {nbytes:,} bytes saved")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,21 @@
+"""
+Saving finished analysis records
+
+Every path that stores analyses (the app, the analysis API, batch jobs, site
+crawls and tracked URLs) goes through store_records, so the record files,
+the search index and the competitor rollups are always updated together.
+"""
+
+import competitor_rollups
+import data_store
+import record_schema
+import resources
+
+
+def store_records(data_type, records, data_dir=None):
+    """Append finished analysis records to the store, search index and competitor rollups"""
+    if not records:
+        return
+    data_store.append_records(data_type, record_schema.compact_records(records), data_dir=data_dir)
+    resources.search_index(data_dir).index_records(data_type, records)
+    competitor_rollups.on_saved(data_type, records, data_dir)
@@ -0,0 +1,187 @@
+"""
+Process-wide shared resources for the Content Intelligence Analyzer
+
+HTTP sessions, LLM clients and worker pools are built once per process and
+shared by every Streamlit session and background job instead of being
+recreated on each call or rerun. Under a Streamlit runtime they are held by
+st.cache_resource; headless tools (batch jobs, benchmarks, tests) fall back
+to an in-process cache. Call clear_resources() when configuration that a
+resource was built from changes (e.g. after API keys are saved).
+"""
+
+import functools
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
+
+HTTP_POOL_SIZE = 32
+HTTP_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+WORKER_POOL_SIZE = min(8, (os.cpu_count() or 1) + 4)
+# Concurrent LLM requests per process, kept low to stay under provider rate limits
+LLM_POOL_SIZE = 4
+
+_lock = threading.RLock()
+# Resource name -> cached factory, built on first use
+_caches = {}
+
+
+def _streamlit_runtime():
+    """Return the streamlit module if this process is serving a Streamlit app"""
+    st = sys.modules.get('streamlit')
+    if st is not None and st.runtime.exists():
+        return st
+    return None
+
+
+def _build_cache(factory):
+    """Wrap a factory in st.cache_resource when running under Streamlit, else a locked lru_cache"""
+    st = _streamlit_runtime()
+    if st is not None:
+        return st.cache_resource(show_spinner=False)(factory)
+
+    cached = functools.lru_cache(maxsize=None)(factory)
+
+    @functools.wraps(factory)
+    def locked(*args):
+        # Holding the lock guarantees each resource is only ever built once
+        with _lock:
+            return cached(*args)
+    locked.clear = cached.cache_clear
+    return locked
+
+
+def cached_resource(factory):
+    """Decorator making factory(*args) build its resource once per process and argument set"""
+    name = factory.__name__
+
+    @functools.wraps(factory)
+    def wrapper(*args):
+        cache = _caches.get(name)
+        if cache is None:
+            with _lock:
+                cache = _caches.get(name)
+                if cache is None:
+                    cache = _caches[name] = _build_cache(factory)
+        return cache(*args)
+    return wrapper
+
+
+def _build_versioned_cache(loader):
+    """Cache keeping only the newest loaded version of each path"""
+    versions = {}
+
+    def cache(path, version):
+        cached = versions.get(path)
+        if cached is None or cached[0] != version:
+            cached = versions[path] = (version, loader(path))
+        return cached[1]
+    cache.clear = versions.clear
+    return cache
+
+
+def versioned_resource(loader):
+    """Decorator making loader(path) load once per path, and again only when version (e.g. an mtime) changes
+
+    Unlike cached_resource, an older version is replaced rather than kept, so
+    a file rewritten on every sync or retrain never piles up stale copies.
+    """
+    name = loader.__name__
+
+    @functools.wraps(loader)
+    def wrapper(path, version):
+        with _lock:
+            cache = _caches.get(name)
+            if cache is None:
+                cache = _caches[name] = _build_versioned_cache(loader)
+            return cache(path, version)
+    return wrapper
+
+
+def clear_resources(*names):
+    """Drop cached resources by factory name (all of them if no names are given)"""
+    with _lock:
+        for name in names or list(_caches):
+            cache = _caches.pop(name, None)
+            if cache is not None:
+                cache.clear()
+
+
+@cached_resource
+def http_session():
+    """Pooled HTTP session for fetching URLs, with keep-alive and no shared cookies"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = HTTP_USER_AGENT
+    # The session is shared by every analyst, so never carry cookies between requests
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+@cached_resource
+def llm_client(provider, api_key):
+    """Client for an LLM provider, reused for as long as the API key is unchanged"""
+    if provider == 'openai':
+        import openai
+        return openai.OpenAI(api_key=api_key)
+    if provider == 'claude':
+        import anthropic
+        return anthropic.Anthropic(api_key=api_key)
+    if provider == 'gemini':
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        return genai
+    raise ValueError(f"Unknown LLM provider: {provider}")
+
+
+@cached_resource
+def worker_pool():
+    """Thread pool shared by bulk extraction across all sessions"""
+    return ThreadPoolExecutor(max_workers=WORKER_POOL_SIZE, thread_name_prefix='bulk-extract')
+
+
+@cached_resource
+def llm_pool():
+    """Thread pool for concurrent LLM requests across all sessions"""
+    return ThreadPoolExecutor(max_workers=LLM_POOL_SIZE, thread_name_prefix='llm')
+
+
+@cached_resource
+def response_cache():
+    """Persistent LLM response cache shared by every session"""
+    import llm_cache
+    return llm_cache.ResponseCache()
+
+
+@cached_resource
+def search_index(data_dir=None):
+    """Full-text index of saved analyses shared by every session and job writing to data_dir"""
+    import search_index as search
+    return search.SearchIndex(data_dir=data_dir)
+
+
+@versioned_resource
+def funnel_model(path):
+    """Trained funnel-stage classifier, loaded once per artifact version"""
+    import funnel_classifier
+    return funnel_classifier.load_model(path=path)
+
+
+@versioned_resource
+def topic_model(path):
+    """Topic clusters of the content library, loaded once per saved version"""
+    import topic_clusters
+    return topic_clusters.TopicModel.load(path)
+
+
+@versioned_resource
+def keyword_sketch(path):
+    """Phrase counts of own and competitor content, loaded once per saved version"""
+    import keyword_discovery
+    return keyword_discovery.KeywordSketch.load(path)
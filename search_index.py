@@ -0,0 +1,291 @@
+"""
+Full-text search across saved analyses
+
+Records are indexed in a SQLite FTS5 table (analyzer_data/search.sqlite) over
+their source, competitor or persona name, headings, keywords and full stored
+content. Search is ranked with BM25, supports prefix queries (e.g. 'analyt*')
+and filters on record type, funnel stage and date.
+
+Rebuild the index from the stored records with:
+    python search_index.py rebuild
+"""
+
+import argparse
+import re
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+import content_store
+import data_store
+
+INDEX_FILE_NAME = 'search.sqlite'
+RECORD_TYPES = ('analyses', 'competitor_analyses', 'persona_analyses')
+# BM25 weights for source, name, headings, keywords and content: a match in a name counts most
+COLUMN_WEIGHTS = (2.0, 3.0, 2.0, 2.0, 1.0)
+DEFAULT_LIMIT = 50
+SNIPPET_TOKENS = 16
+# Ids looked up per query, below SQLite's limit on bound parameters
+LOOKUP_BATCH = 500
+# sync() looks up this many of the newest records by id even when the counts match
+SYNC_CHECK_RECORDS = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    record_id TEXT NOT NULL UNIQUE,
+    data_type TEXT NOT NULL,
+    stage TEXT,
+    timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS records_type_stage_time ON records (data_type, stage, timestamp);
+CREATE INDEX IF NOT EXISTS records_time ON records (timestamp);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(
+    source, name, headings, keywords, content,
+    tokenize = 'porter unicode61', prefix = '2 3'
+);
+"""
+
+# Word characters plus an optional trailing '*' for prefix search
+_TERM_PATTERN = re.compile(r'\w+\*?')
+
+
+def record_key(record):
+    """Stable identifier of a record; records saved before ids existed fall back to time and source"""
+    return record.get('id') or f"{record.get('timestamp', '')}|{record.get('source', record.get('asset_url', ''))}"
+
+
+def _document(record, data_dir=None):
+    """The searchable fields of a record"""
+    heading_rows = (record.get('heading_analysis') or {}).get('heading_analysis', [])
+    keywords = record.get('target_keywords') or [
+        row['keyword'] for row in (record.get('keyword_analysis') or {}).get('keyword_analysis', [])
+    ]
+    persona = record.get('persona') or {}
+    content = None
+    if record.get('content_hash'):
+        content = content_store.get(record['content_hash'], data_dir)
+    return (
+        record.get('source') or record.get('asset_url') or '',
+        record.get('competitor_name') or persona.get('name') or record.get('persona_name') or '',
+        ' '.join(row['heading'] for row in heading_rows),
+        ' '.join(keywords),
+        content if content is not None else record.get('content_preview', '')
+    )
+
+
+def _stage(record):
+    return (record.get('funnel_analysis') or {}).get('primary_stage') or record.get('funnel_stage')
+
+
+def build_query(text):
+    """Turn free text into an FTS5 query: every word must match, 'word*' matches a prefix"""
+    terms = []
+    for term in _TERM_PATTERN.findall(text):
+        word = term.rstrip('*')
+        terms.append(f'"{word}"*' if term.endswith('*') else f'"{word}"')
+    return ' '.join(terms)
+
+
+class SearchIndex:
+    """SQLite FTS5 index of saved analysis records"""
+
+    def __init__(self, path=None, data_dir=None):
+        self.data_dir = data_dir
+        self.path = Path(path) if path else Path(data_dir or data_store.DATA_DIR) / INDEX_FILE_NAME
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # One connection shared by all threads; the lock serializes its use
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def count(self, data_type=None):
+        with self._lock:
+            if data_type:
+                return self._conn.execute("SELECT COUNT(*) FROM records WHERE data_type = ?", (data_type,)).fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def missing_keys(self, data_type, keys):
+        """Those of keys that are not indexed yet, looked up by id"""
+        keys = list(keys)
+        found = set()
+        with self._lock:
+            for start in range(0, len(keys), LOOKUP_BATCH):
+                batch = keys[start:start + LOOKUP_BATCH]
+                found.update(row[0] for row in self._conn.execute(
+                    f"SELECT record_id FROM records WHERE data_type = ? AND record_id IN ({', '.join('?' * len(batch))})",
+                    (data_type, *batch)
+                ))
+        return [key for key in keys if key not in found]
+
+    def index_records(self, data_type, records):
+        """Add records that are not indexed yet; returns how many were added"""
+        keys = [record_key(r) for r in records]
+        missing = set(self.missing_keys(data_type, keys))
+        # Reading stored content happens outside the lock
+        rows = [(key, _stage(r), r.get('timestamp', ''), _document(r, self.data_dir))
+                for key, r in zip(keys, records) if key in missing]
+
+        added = 0
+        with self._lock:
+            for key, stage, timestamp, document in rows:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO records (record_id, data_type, stage, timestamp) VALUES (?, ?, ?, ?)",
+                    (key, data_type, stage, timestamp)
+                )
+                if cursor.rowcount:
+                    self._conn.execute(
+                        "INSERT INTO documents (rowid, source, name, headings, keywords, content) VALUES (?, ?, ?, ?, ?, ?)",
+                        (cursor.lastrowid, *document)
+                    )
+                    added += 1
+            self._conn.commit()
+        return added
+
+    def remove_missing(self, data_type, records):
+        """Drop indexed records of a type that are not in records; returns how many were dropped"""
+        keys = {record_key(r) for r in records}
+        with self._lock:
+            stale = [(row_id,) for row_id, key in self._conn.execute(
+                "SELECT id, record_id FROM records WHERE data_type = ?", (data_type,)
+            ) if key not in keys]
+            self._conn.executemany("DELETE FROM documents WHERE rowid = ?", stale)
+            self._conn.executemany("DELETE FROM records WHERE id = ?", stale)
+            self._conn.commit()
+        return len(stale)
+
+    def update_stages(self, data_type, records):
+        """Refresh the funnel stage of already indexed records, e.g. after they were recomputed"""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE records SET stage = ? WHERE record_id = ? AND data_type = ?",
+                [(_stage(r), record_key(r), data_type) for r in records]
+            )
+            self._conn.commit()
+
+    def sync(self, data_type, records):
+        """Make the index hold exactly a record list's records; returns how many were added
+
+        Cheap when nothing changed: the counts are compared and only the newest
+        records are looked up by id, which catches records replaced by others
+        without changing the count. Otherwise missing records are indexed and
+        ones no longer in the list dropped.
+        """
+        newest = [record_key(r) for r in records[-SYNC_CHECK_RECORDS:]]
+        if self.count(data_type) == len(records) and not self.missing_keys(data_type, newest):
+            return 0
+        added = self.index_records(data_type, records)
+        if self.count(data_type) > len(records):
+            self.remove_missing(data_type, records)
+        return added
+
+    def search(self, text='', data_types=None, stages=None, since=None, until=None, limit=DEFAULT_LIMIT):
+        """Ranked search; with no query text, the newest records matching the filters
+
+        since/until are ISO date strings compared against record timestamps
+        (until is exclusive). Returns dicts with record_id, data_type, stage,
+        timestamp, source, name, snippet and score (lower is better).
+        """
+        filters = []
+        params = []
+        for column, values in (('r.data_type', data_types), ('r.stage', stages)):
+            if values:
+                filters.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        if since:
+            filters.append("r.timestamp >= ?")
+            params.append(since)
+        if until:
+            filters.append("r.timestamp < ?")
+            params.append(until)
+
+        query = build_query(text)
+        if query:
+            weights = ', '.join(str(w) for w in COLUMN_WEIGHTS)
+            sql = (
+                f"SELECT r.record_id, r.data_type, r.stage, r.timestamp, d.source, d.name, "
+                f"snippet(documents, 4, '**', '**', ' … ', {SNIPPET_TOKENS}), bm25(documents, {weights}) AS score "
+                f"FROM documents d JOIN records r ON r.id = d.rowid WHERE documents MATCH ?"
+            )
+            params.insert(0, query)
+            order = "score"
+        else:
+            sql = (
+                "SELECT r.record_id, r.data_type, r.stage, r.timestamp, d.source, d.name, "
+                "substr(d.content, 1, 200), 0.0 AS score FROM records r JOIN documents d ON d.rowid = r.id WHERE 1 = 1"
+            )
+            order = "r.timestamp DESC"
+        for condition in filters:
+            sql += f" AND {condition}"
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            {
+                'record_id': record_id, 'data_type': data_type, 'stage': stage, 'timestamp': timestamp,
+                'source': source, 'name': name, 'snippet': snippet, 'score': round(score, 3)
+            }
+            for record_id, data_type, stage, timestamp, source, name, snippet, score in rows
+        ]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM documents")
+            self._conn.execute("DELETE FROM records")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def rebuild(data_dir=None, index=None):
+    """Re-index every stored record from the data files; returns counts per data type"""
+    import record_schema
+
+    index = index or SearchIndex(data_dir=data_dir)
+    index.clear()
+    personas = data_store.load_data('personas', default=[], data_dir=data_dir)
+    counts = {}
+    for data_type in RECORD_TYPES:
+        records = record_schema.expand_records(data_store.load_data(data_type, default=[], data_dir=data_dir), personas)
+        counts[data_type] = index.index_records(data_type, records)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Full-text search across saved analyses")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    rebuild_parser = subparsers.add_parser('rebuild', help="Re-index all stored records")
+    rebuild_parser.add_argument('--data-dir')
+
+    search_parser = subparsers.add_parser('search', help="Search the index")
+    search_parser.add_argument('query')
+    search_parser.add_argument('--stage', action='append')
+    search_parser.add_argument('--since')
+    search_parser.add_argument('--until')
+    search_parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    search_parser.add_argument('--data-dir')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'rebuild':
+        for data_type, count in rebuild(args.data_dir).items():
+            print(f"🔎 {data_type}: {count} records indexed")
+        return 0
+
+    for hit in SearchIndex(data_dir=args.data_dir).search(args.query, stages=args.stage, since=args.since,
+                                                          until=args.until, limit=args.limit):
+        print(f"{hit['score']:>8} {hit['timestamp'][:10]} {hit['data_type']:<20} {hit['stage'] or '-':<14} "
+              f"{hit['name'] or hit['source']}")
+        print(f"         {hit['snippet']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,452 @@
+"""
+Polite whole-site crawler feeding the competitor analysis pipeline
+
+A crawl starts from a site (e.g. competitor.com) or a sitemap.xml. Seed URLs
+come from the start page and the site's sitemaps; further pages are found by
+following links breadth-first, up to a depth and page budget. Every URL is
+canonicalized before it enters the frontier so each page is fetched once.
+robots.txt is read once per host and honored (including Crawl-delay), and
+requests to a host are spaced out while several pages are fetched at once.
+
+Usage:
+    python site_crawler.py crawl competitor.com --competitor "Competitor Inc." --max-pages 200
+    python site_crawler.py crawl https://competitor.com/sitemap.xml --competitor "Competitor Inc." --keyword pricing
+"""
+
+import argparse
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from urllib.parse import parse_qsl, quote, urlencode, urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+from xml.etree import ElementTree
+
+import content_store
+import record_store
+import resources
+
+DEFAULT_MAX_PAGES = 100
+DEFAULT_MAX_DEPTH = 3
+DEFAULT_CONCURRENCY = 4
+# Minimum seconds between requests to the same host; robots.txt Crawl-delay can raise it
+DEFAULT_DELAY = 0.5
+REQUEST_TIMEOUT = 10
+# Token matched against robots.txt User-agent lines
+ROBOTS_USER_AGENT = 'ContentIntelligenceAnalyzer'
+# Sent with every crawler request so sites can tell which robots.txt group applies
+CRAWLER_USER_AGENT = f'Mozilla/5.0 (compatible; {ROBOTS_USER_AGENT}/1.0)'
+CRAWLER_HEADERS = {'User-Agent': CRAWLER_USER_AGENT}
+# robots.txt beyond this size is ignored, as RFC 9309 allows
+MAX_ROBOTS_BYTES = 512 * 1024
+MAX_SITEMAPS = 50
+# Limit on a sitemap's size, before and after gzip decompression
+MAX_SITEMAP_BYTES = 50 * 1024 * 1024
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+# Query parameters that only track campaigns and never change the page
+TRACKING_PARAMS = ('utm_', 'gclid', 'fbclid', 'msclkid', 'mc_cid', 'mc_eid', '_ga', '_hsenc', '_hsmi')
+# Links to these files are never pages worth analyzing
+SKIP_EXTENSIONS = (
+    '.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.ico', '.bmp', '.css', '.js', '.json', '.xml', '.rss',
+    '.zip', '.gz', '.tar', '.rar', '.exe', '.dmg', '.mp3', '.mp4', '.mov', '.avi', '.webm',
+    '.woff', '.woff2', '.ttf', '.eot', '.csv', '.xls', '.xlsx', '.ppt', '.pptx'
+)
+# Characters left as they are when percent-encoding a path
+_PATH_SAFE = "/%:@!$&'()*+,;=-._~"
+
+
+def canonicalize_url(url, base=None):
+    """Normalize a URL so every spelling of a page maps to one string; None for non-web URLs
+
+    Resolves it against base, lowercases scheme and host, drops default ports,
+    fragments and tracking parameters, resolves dot segments and sorts the query.
+    """
+    try:
+        parts = urlsplit(urljoin(base, url.strip()) if base else url.strip())
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or '').lower()
+        if scheme not in DEFAULT_PORTS or not host:
+            return None
+        port = parts.port
+    except ValueError:
+        return None
+
+    netloc = host if port in (None, DEFAULT_PORTS[scheme]) else f"{host}:{port}"
+    # Joining onto the root resolves '.' and '..' segments
+    path = urlsplit(urljoin('http://x/', parts.path or '/')).path
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMS)
+    ))
+    return urlunsplit((scheme, netloc, quote(path, safe=_PATH_SAFE), query, ''))
+
+
+def site_key(host):
+    """Hosts that belong to the same site, e.g. www.example.com and example.com"""
+    host = host.lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+def is_sitemap_url(url):
+    return urlsplit(url).path.lower().endswith(('.xml', '.xml.gz'))
+
+
+def parse_sitemap(body):
+    """Return (page URLs, child sitemap URLs) listed in a sitemap or sitemap index"""
+    if body[:2] == b'\x1f\x8b':
+        # Decompress at most one byte past the limit so a gzip bomb cannot exhaust memory
+        body = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(body, MAX_SITEMAP_BYTES + 1)
+        if len(body) > MAX_SITEMAP_BYTES:
+            raise ValueError(f"Sitemap is larger than {MAX_SITEMAP_BYTES:,} bytes uncompressed")
+    root = ElementTree.fromstring(body)
+
+    locations = []
+    for entry in root:
+        for child in entry:
+            # Only <url><loc> / <sitemap><loc>, not image or video extension tags
+            if child.tag.rsplit('}', 1)[-1] == 'loc' and child.text:
+                locations.append(child.text.strip())
+    if root.tag.rsplit('}', 1)[-1] == 'sitemapindex':
+        return [], locations
+    return locations, []
+
+
+class Frontier:
+    """Breadth-first queue of URLs to visit; each canonical URL is queued at most once"""
+
+    def __init__(self):
+        self._queue = deque()
+        self._seen = set()
+
+    def add(self, url, depth):
+        """Queue url unless it was seen before; returns True if it was added"""
+        if url in self._seen:
+            return False
+        self._seen.add(url)
+        self._queue.append((url, depth))
+        return True
+
+    def pop(self):
+        return self._queue.popleft()
+
+    def seen(self, url):
+        return url in self._seen
+
+    def __len__(self):
+        return len(self._queue)
+
+
+class HostThrottle:
+    """Spaces out requests to each host by at least its delay, across all fetching threads"""
+
+    def __init__(self, sleep=time.sleep):
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, host, delay):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + delay
+        if slot > now:
+            self.sleep(slot - now)
+
+
+class RobotsCache:
+    """robots.txt rules, fetched once per host
+
+    Follows RFC 9309: a missing robots.txt allows everything, while an
+    unreachable one (server error, refused connection) or one the crawler
+    may not read disallows the whole host.
+    """
+
+    def __init__(self, get, user_agent=ROBOTS_USER_AGENT):
+        self.get = get
+        self.user_agent = user_agent
+        self._lock = threading.Lock()
+        self._parsers = {}
+
+    def _parser(self, url):
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            parser = self._parsers.get(origin)
+        if parser is not None:
+            return parser
+
+        parser = RobotFileParser(f"{origin}/robots.txt")
+        try:
+            status, body = self.get(f"{origin}/robots.txt", MAX_ROBOTS_BYTES)
+        except Exception:
+            status, body = None, b''
+        if status is not None and status < 300:
+            parser.parse(body.decode('utf-8', errors='replace').splitlines())
+        elif status in (401, 403) or status is None or status >= 500:
+            parser.disallow_all = True
+        else:
+            parser.allow_all = True
+        with self._lock:
+            return self._parsers.setdefault(origin, parser)
+
+    def allowed(self, url):
+        return self._parser(url).can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, url):
+        return self._parser(url).crawl_delay(self.user_agent)
+
+    def sitemaps(self, url):
+        return self._parser(url).site_maps() or []
+
+
+class SiteCrawler:
+    """Crawls one site breadth-first within a depth and page budget"""
+
+    def __init__(self, start, max_pages=DEFAULT_MAX_PAGES, max_depth=DEFAULT_MAX_DEPTH,
+                 concurrency=DEFAULT_CONCURRENCY, delay=DEFAULT_DELAY, use_sitemaps=True, fetch=None,
+                 sleep=time.sleep):
+        if '://' not in start:
+            start = f"https://{start}"
+        self.start = canonicalize_url(start)
+        if self.start is None:
+            raise ValueError(f"Not a web address: {start}")
+        self.site = site_key(urlsplit(self.start).hostname)
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.concurrency = max(1, concurrency)
+        self.delay = delay
+        self.use_sitemaps = use_sitemaps
+        if fetch is None:
+            from analysis_modules import extract_content_from_url
+            fetch = partial(extract_content_from_url, headers=CRAWLER_HEADERS)
+        self.fetch = fetch
+        self.throttle = HostThrottle(sleep)
+        self.robots = RobotsCache(self._get)
+        self.frontier = Frontier()
+        self.skipped = {'offsite': 0, 'filtered': 0, 'blocked': 0, 'duplicate': 0}
+
+    def _host_delay(self, url):
+        return max(self.delay, self.robots.crawl_delay(url) or 0)
+
+    def _get(self, url, max_bytes, same_site=False):
+        """Polite GET of robots.txt or a sitemap; returns (status, body cut to max_bytes)
+
+        With same_site, a redirect that leaves the site raises ValueError.
+        """
+        self.throttle.wait(urlsplit(url).netloc, self.delay)
+        with resources.http_session().get(url, timeout=REQUEST_TIMEOUT, stream=True,
+                                          headers=CRAWLER_HEADERS) as response:
+            if same_site and site_key(urlsplit(response.url).hostname) != self.site:
+                raise ValueError(f"Redirected off-site to {response.url}")
+            body = bytearray()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                body.extend(chunk)
+                if len(body) >= max_bytes:
+                    break
+            return response.status_code, bytes(body[:max_bytes])
+
+    def _in_scope(self, url):
+        """Count and drop URLs that are off-site or not pages; robots.txt is checked at fetch time"""
+        if site_key(urlsplit(url).hostname) != self.site:
+            self.skipped['offsite'] += 1
+            return False
+        if urlsplit(url).path.lower().endswith(SKIP_EXTENSIONS):
+            self.skipped['filtered'] += 1
+            return False
+        return True
+
+    def _add(self, url, depth):
+        if url and not self.frontier.seen(url) and self._in_scope(url):
+            self.frontier.add(url, depth)
+
+    def sitemap_urls(self, sitemaps):
+        """Page URLs listed in the given sitemaps and the sitemap indexes they reference"""
+        pages = []
+        queue = deque(sitemaps)
+        visited = set()
+        while queue and len(visited) < MAX_SITEMAPS:
+            sitemap = canonicalize_url(queue.popleft())
+            if not sitemap or sitemap in visited or site_key(urlsplit(sitemap).hostname) != self.site:
+                continue
+            visited.add(sitemap)
+            try:
+                status, body = self._get(sitemap, MAX_SITEMAP_BYTES, same_site=True)
+                if status >= 300:
+                    continue
+                page_urls, child_sitemaps = parse_sitemap(body)
+            except Exception:
+                continue
+            pages.extend(page_urls)
+            queue.extend(child_sitemaps)
+        return pages
+
+    def seed(self):
+        """Queue the start page and the pages listed in the site's sitemaps"""
+        if is_sitemap_url(self.start):
+            sitemaps = [self.start]
+        else:
+            self._add(self.start, 0)
+            sitemaps = []
+            if self.use_sitemaps:
+                sitemaps = self.robots.sitemaps(self.start) or [urljoin(self.start, '/sitemap.xml')]
+        for url in self.sitemap_urls(sitemaps):
+            self._add(canonicalize_url(url), 0)
+
+    def _visit(self, url):
+        """Fetch one page on a worker thread, waiting for the host's politeness slot"""
+        self.throttle.wait(urlsplit(url).netloc, self._host_delay(url))
+        return self.fetch(url)
+
+    def crawl(self, on_page, on_progress=None):
+        """Fetch pages until the frontier or page budget runs out
+
+        on_page(url, page, depth) runs on the calling thread for each fetched
+        page with new content and returns its record (or None). Returns
+        {'records': [...], 'rows': [...], 'skipped': {...}}, one row per
+        page fetched or blocked by robots.txt. on_progress(done, total) is
+        called from the calling thread as pages finish.
+        """
+        self.seed()
+        records = []
+        rows = []
+        content_hashes = set()
+        fetched = 0
+        pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='crawl')
+        in_flight = {}
+        try:
+            while True:
+                while self.frontier and len(in_flight) < self.concurrency and fetched + len(in_flight) < self.max_pages:
+                    url, depth = self.frontier.pop()
+                    if not self.robots.allowed(url):
+                        self.skipped['blocked'] += 1
+                        rows.append(_status_row(url, depth, 'blocked', error="Disallowed by robots.txt"))
+                        continue
+                    in_flight[pool.submit(self._visit, url)] = (url, depth)
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, depth = in_flight.pop(future)
+                    fetched += 1
+                    try:
+                        page = future.result()
+                    except Exception as e:
+                        page = {'success': False, 'error': str(e)}
+                    rows.append(self._handle_page(url, depth, page, on_page, records, content_hashes))
+                    if on_progress:
+                        on_progress(fetched, min(self.max_pages, fetched + len(in_flight) + len(self.frontier)))
+        finally:
+            # Drop queued fetches promptly if the caller bailed out (e.g. job cancelled)
+            for future in in_flight:
+                future.cancel()
+            pool.shutdown(wait=True)
+
+        return {'records': records, 'rows': rows, 'skipped': dict(self.skipped)}
+
+    def _handle_page(self, url, depth, page, on_page, records, content_hashes):
+        """Analyze a fetched page, queue its links and return its status row"""
+        if not page['success']:
+            return _status_row(url, depth, 'failed', error=page['error'])
+
+        # Redirects are followed by the fetch, so the page's final address gets the same checks as a link
+        final_url = canonicalize_url(page.get('final_url') or url)
+        if final_url and final_url != url:
+            if not self._in_scope(final_url):
+                return _status_row(url, depth, 'offsite', error=f"Redirected to {final_url}")
+            if not self.robots.allowed(final_url):
+                self.skipped['blocked'] += 1
+                return _status_row(url, depth, 'blocked', error=f"Redirected to {final_url}, disallowed by robots.txt")
+
+        if depth < self.max_depth:
+            for link in page.get('links', []):
+                self._add(canonicalize_url(link), depth + 1)
+
+        if not page['content'].strip():
+            return _status_row(url, depth, 'failed', error="No text could be extracted")
+        # The same page is often reachable under several URLs the canonicalizer cannot unify
+        digest = content_store.content_hash(page['content'])
+        if digest in content_hashes:
+            self.skipped['duplicate'] += 1
+            return _status_row(url, depth, 'duplicate')
+        content_hashes.add(digest)
+
+        record = on_page(url, page, depth)
+        if record is None:
+            return _status_row(url, depth, 'fetched')
+        records.append(record)
+        return _status_row(url, depth, 'analyzed', record)
+
+
+def _status_row(url, depth, status, record=None, error=''):
+    """Build one row of the per-page results table"""
+    row = {'url': url, 'depth': depth, 'status': status, 'words': None, 'funnel_stage': None, 'error': error}
+    if record:
+        row['words'] = record['entity_analysis']['total_words']
+        row['funnel_stage'] = record['funnel_analysis']['primary_stage']
+    return row
+
+
+def crawl_competitor_site(start, competitor_name, keywords=(), on_progress=None, data_dir=None, **options):
+    """Crawl a competitor's site and run the competitor analyses on every page
+
+    Options are passed to SiteCrawler. Each page's full text is kept in the
+    content store; the returned records are not saved yet.
+    """
+    from analysis_modules import build_competitor_analysis
+
+    def analyze_page(url, page, depth):
+        record = build_competitor_analysis(page['content'], page['headings'], url, competitor_name, list(keywords))
+        record['crawl_depth'] = depth
+        content_store.put(page['content'], data_dir)
+        return record
+
+    return SiteCrawler(start, **options).crawl(analyze_page, on_progress=on_progress)
+
+
+def save_records(records, data_dir=None):
+    """Append crawled competitor records to the store, search index and competitor rollups"""
+    record_store.store_records('competitor_analyses', records, data_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crawl a competitor site into competitor analyses")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    crawl_parser = subparsers.add_parser('crawl', help="Crawl a site or sitemap and analyze its pages")
+    crawl_parser.add_argument('start', help="Domain, page URL or sitemap.xml URL")
+    crawl_parser.add_argument('--competitor', required=True, help="Competitor name to save the analyses under")
+    crawl_parser.add_argument('--keyword', action='append', default=[], help="Keyword to analyze (repeatable)")
+    crawl_parser.add_argument('--max-pages', type=int, default=DEFAULT_MAX_PAGES)
+    crawl_parser.add_argument('--max-depth', type=int, default=DEFAULT_MAX_DEPTH)
+    crawl_parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    crawl_parser.add_argument('--delay', type=float, default=DEFAULT_DELAY,
+                              help="Minimum seconds between requests to a host")
+    crawl_parser.add_argument('--no-sitemaps', action='store_true', help="Only follow links from the start page")
+    crawl_parser.add_argument('--data-dir')
+
+    args = parser.parse_args(argv)
+
+    def progress(done, total):
+        print(f"\r🕸️ {done}/{total} pages", end='', flush=True)
+
+    result = crawl_competitor_site(
+        args.start, args.competitor, args.keyword, on_progress=progress, data_dir=args.data_dir,
+        max_pages=args.max_pages, max_depth=args.max_depth, concurrency=args.concurrency, delay=args.delay,
+        use_sitemaps=not args.no_sitemaps
+    )
+    print()
+    for row in result['rows']:
+        if row['status'] != 'analyzed':
+            print(f"  ⚠️ {row['status']}: {row['url']} {row['error']}")
+    save_records(result['records'], args.data_dir)
+    print(f"📊 {len(result['records'])} pages analyzed and saved under {args.competitor}; skipped {result['skipped']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -17,7 +17,8 @@ def check_imports():
         'PyPDF2',
         'docx',
         'pandas',
-        'openpyxl'
+        'openpyxl',
+        'pyarrow'
     ]
     
     missing_packages = []
@@ -142,6 +143,1685 @@ def test_basic_functions():
         traceback.print_exc()
         return False
 
+def test_batch_jobs():
+    """Test that batch jobs checkpoint, resume and retry"""
+    print("\n🔍 Testing resumable batch jobs...")
+    
+    import tempfile
+    
+    try:
+        import batch_jobs
+        import data_store
+        
+        text = "Learn how to choose the best solution. " * 20
+        calls = {'count': 0}
+        
+        def fake_fetch(source):
+            calls['count'] += 1
+            if source == 'flaky' and calls['count'] < 5:
+                return {'success': False, 'error': 'temporary failure'}
+            if source == 'crash' and not calls.get('crashed'):
+                calls['crashed'] = True
+                raise KeyboardInterrupt()
+            return {'success': True, 'content': text, 'headings': []}
+        
+        with tempfile.TemporaryDirectory() as data_dir:
+            items = [{'source': s, 'kind': 'own', 'competitor_name': '', 'target_keywords': []}
+                     for s in ['a', 'b', 'crash', 'flaky', 'c']]
+            job = batch_jobs.create_job(items, checkpoint_every=2, data_dir=data_dir)
+            
+            # Simulate a run killed mid-way by a deploy
+            try:
+                batch_jobs.run_job(job, data_dir=data_dir, fetch=fake_fetch, log=lambda msg: None)
+            except KeyboardInterrupt:
+                pass
+            
+            resumed = batch_jobs.load_job(job['job_id'], data_dir=data_dir)
+            if batch_jobs.job_summary(resumed)['analyzed'] != 2:
+                print("  ❌ Checkpoint did not record completed items")
+                return False
+            
+            summary = batch_jobs.run_job(resumed, data_dir=data_dir, fetch=fake_fetch,
+                                         sleep=lambda s: None, log=lambda msg: None)
+            stored = data_store.load_data('analyses', [], data_dir=data_dir)
+            if summary['analyzed'] != 5 or len(stored) != 5:
+                print(f"  ❌ Resume failed: {summary}, {len(stored)} stored")
+                return False
+        
+        print("  ✅ Batch jobs checkpoint, resume and retry")
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing batch jobs: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_job_queue():
+    """Test background job status, per-user limits and cancellation"""
+    print("\n🔍 Testing background job queue...")
+    
+    import threading
+    
+    try:
+        from job_queue import JobQueue, wait_for
+        
+        queue = JobQueue(max_workers=4, per_user_limit=1)
+        release = threading.Event()
+        
+        def slow_job(job, value):
+            job.report(0.5, "working")
+            release.wait(5)
+            job.check_cancelled()
+            return value * 2
+        
+        saved = []
+        first = queue.submit('alice', 'test', slow_job, 1, on_complete=lambda result: saved.append(result) or 'saved')
+        second = queue.submit('alice', 'test', slow_job, 2)
+        other = queue.submit('bob', 'test', slow_job, 3)
+        
+        if queue.status(second)['status'] != 'queued':
+            print("  ❌ Per-user concurrency limit not applied")
+            return False
+        
+        queue.cancel(second)
+        release.set()
+        
+        if wait_for(first, 5, queue=queue)['result'] != 'saved' or saved != [2]:
+            print("  ❌ Job result was not handed to on_complete and replaced by its summary")
+            return False
+        if wait_for(second, 5, queue=queue)['status'] != 'cancelled':
+            print("  ❌ Queued job was not cancelled")
+            return False
+        other_job = wait_for(other, 5, queue=queue)
+        if other_job['status'] != 'completed' or other_job['result'] != 6:
+            print("  ❌ Other user's job did not complete")
+            return False
+        
+        queue.shutdown()
+        print("  ✅ Job queue limits, cancellation and results work")
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing job queue: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_bulk_upload():
+    """Test zip expansion and parallel extraction of a batch of uploads"""
+    print("\n🔍 Testing bulk upload extraction...")
+    
+    import io
+    import zipfile
+    
+    try:
+        import docx
+        from bulk_upload import analyze_uploads
+        from analysis_modules import build_analysis_result
+        
+        document = docx.Document()
+        document.add_heading("Pricing and ROI", level=1)
+        document.add_paragraph("See our pricing, book a demo and start a free trial today. " * 10)
+        docx_bytes = io.BytesIO()
+        document.save(docx_bytes)
+        
+        archive_bytes = io.BytesIO()
+        with zipfile.ZipFile(archive_bytes, 'w') as archive:
+            archive.writestr("guide.txt", "A beginner guide: what is content marketing and how to start. " * 10)
+            archive.writestr("notes.csv", "not,supported")
+            archive.writestr("broken.pdf", "this is not a pdf")
+        
+        uploads = [("proposal.docx", docx_bytes.getvalue()), ("library.zip", archive_bytes.getvalue())]
+        batch = analyze_uploads(uploads, lambda text, heads, name: build_analysis_result(text, heads, name, []))
+        statuses = {row['file']: row['status'] for row in batch['rows']}
+        
+        expected = {
+            'proposal.docx': 'analyzed',
+            'library.zip/guide.txt': 'analyzed',
+            'library.zip/notes.csv': 'skipped',
+            'library.zip/broken.pdf': 'failed'
+        }
+        if statuses != expected or len(batch['records']) != 2:
+            print(f"  ❌ Unexpected bulk results: {statuses}")
+            return False
+        
+        print("  ✅ Bulk upload extracts archives and reports per-file status")
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing bulk upload: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_url_extraction():
+    """Test streaming URL extraction with content-type gating and a size cap"""
+    print("\n🔍 Testing URL extraction limits...")
+    
+    import io
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    try:
+        import PyPDF2
+        from analysis_modules import extract_content_from_url
+        
+        pdf_bytes = io.BytesIO()
+        writer = PyPDF2.PdfWriter()
+        writer.add_blank_page(width=200, height=200)
+        writer.write(pdf_bytes)
+        
+        pages = {
+            '/article': ('text/html; charset=utf-8', b"<html><h1>Guide</h1><p>" + b"how to start " * 50000 + b"</p></html>"),
+            '/whitepaper': ('application/pdf', pdf_bytes.getvalue()),
+            '/video': ('video/mp4', b"\x00" * 1024)
+        }
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                content_type, body = pages[self.path]
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, *args):
+                pass
+        
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_port}"
+        
+        try:
+            article = extract_content_from_url(base + '/article', max_bytes=64 * 1024)
+            if not article['success'] or not article['truncated'] or len(article['content']) > 64 * 1024:
+                print("  ❌ HTML body was not capped")
+                return False
+            
+            whitepaper = extract_content_from_url(base + '/whitepaper')
+            if not whitepaper['success'] or whitepaper.get('url') != base + '/whitepaper':
+                print(f"  ❌ PDF response was not routed to the PDF extractor: {whitepaper}")
+                return False
+            
+            video = extract_content_from_url(base + '/video')
+            if video['success'] or 'video/mp4' not in video['error']:
+                print("  ❌ Unsupported binary was not rejected")
+                return False
+        finally:
+            server.shutdown()
+        
+        print("  ✅ URL extraction caps downloads and gates content types")
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing URL extraction: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_docx_extraction():
+    """Test streaming DOCX extraction of headings, tables and headers"""
+    print("\n🔍 Testing DOCX extraction...")
+    
+    import io
+    
+    try:
+        import docx
+        from analysis_modules import extract_content_from_docx
+        
+        document = docx.Document()
+        document.sections[0].header.paragraphs[0].text = "Confidential proposal"
+        document.add_heading("Executive Summary", level=1)
+        document.add_paragraph("Our platform delivers measurable ROI.")
+        table = document.add_table(rows=1, cols=2)
+        table.cell(0, 0).text = "Plan"
+        table.cell(0, 1).text = "Enterprise pricing"
+        document.add_heading("Next Steps", level=2)
+        # A text box as Word writes it: a DrawingML copy plus a VML fallback copy
+        from docx.oxml import parse_xml
+        text_box = (
+            '<w:p><w:r><w:t>{}</w:t></w:r></w:p>'
+        )
+        document.add_paragraph("Before")._p.append(parse_xml(
+            '<w:r xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+            'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006" '
+            'xmlns:wps="http://schemas.microsoft.com/office/word/2010/wordprocessingShape" '
+            'xmlns:v="urn:schemas-microsoft-com:vml"><mc:AlternateContent>'
+            '<mc:Choice Requires="wps"><w:drawing><wps:txbx><w:txbxContent>'
+            + text_box.format("Box") + '</w:txbxContent></wps:txbx></w:drawing></mc:Choice>'
+            '<mc:Fallback><w:pict><v:textbox><w:txbxContent>'
+            + text_box.format("Box") + '<w:tbl><w:tr><w:tc>' + text_box.format("Cell") + '</w:tc></w:tr></w:tbl>'
+            '</w:txbxContent></v:textbox></w:pict></mc:Fallback></mc:AlternateContent></w:r>'
+        ))
+        document.add_paragraph("After")
+        document.add_paragraph("Second paragraph")
+        buffer = io.BytesIO()
+        document.save(buffer)
+        
+        result = extract_content_from_docx(io.BytesIO(buffer.getvalue()))
+        levels = [(h['level'], h['text']) for h in result['headings']]
+        if levels != [('Heading 1', 'Executive Summary'), ('Heading 2', 'Next Steps')]:
+            print(f"  ❌ Unexpected headings: {levels}")
+            return False
+        for expected in ("measurable ROI", "Enterprise pricing", "Confidential proposal"):
+            if expected not in result['content']:
+                print(f"  ❌ Missing text: {expected}")
+                return False
+        lines = [line for line in result['content'].split('\n')
+                 if line in ("Before", "Box", "Cell", "After", "Second paragraph")]
+        # A text box's paragraphs close before the paragraph anchoring it
+        if lines != ["Box", "Before", "After", "Second paragraph"]:
+            print(f"  ❌ Text box paragraphs out of place: {lines}")
+            return False
+        
+        print("  ✅ DOCX extraction includes headings, tables, headers and text boxes")
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing DOCX extraction: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_benchmark_suite():
+    """Test a tiny offline benchmark run and the baseline regression check"""
+    print("\n🔍 Testing benchmark suite...")
+    
+    try:
+        import benchmark
+        
+        results = benchmark.run_benchmarks([1000], [10], [10], repeat=1, measure_memory=False, log=lambda msg: None)
+        names = {r['name'] for r in results}
+        for expected in ("extract_content_from_pdf[1KB]", "extract_content_from_docx[1KB]",
+                         "extract_content_from_url[1KB]", "score_persona_relevance[personas=10]"):
+            if expected not in names:
+                print(f"  ❌ Missing benchmark: {expected}")
+                return False
+        
+        fast_baseline = {'results': [dict(r, seconds=r['seconds'] / 10) for r in results]}
+        if len(benchmark.compare_to_baseline(results, fast_baseline, 0.25)) != len(results):
+            print("  ❌ Regressions against a faster baseline were not reported")
+            return False
+        
+        print(f"  ✅ Benchmark suite ran {len(results)} cases offline")
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing benchmark suite: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_metrics():
+    """Test per-stage instrumentation and metric exports"""
+    print("\n🔍 Testing stage metrics...")
+    
+    try:
+        import json
+        import metrics
+        from analysis_modules import build_analysis_result
+        
+        metrics.reset()
+        metrics.enable_memory_tracking(True)
+        try:
+            build_analysis_result("Compare the best pricing options. " * 50, [], "metrics test", ["pricing"])
+        finally:
+            metrics.enable_memory_tracking(False)
+        
+        stages = metrics.snapshot()
+        for stage in ('funnel', 'entities', 'headings', 'keywords'):
+            if stages.get(stage, {}).get('count') != 1 or not stages[stage]['bytes_total']:
+                print(f"  ❌ Stage not recorded: {stage}")
+                return False
+        if stages['entities']['peak_alloc_bytes'] <= 0:
+            print("  ❌ Peak allocation not recorded")
+            return False
+        
+        prometheus = metrics.export_prometheus()
+        if 'analyzer_stage_duration_seconds_count{stage="funnel"} 1' not in prometheus:
+            print("  ❌ Prometheus export missing histogram count")
+            return False
+        if json.loads(metrics.export_json())['stages']['keywords']['count'] != 1:
+            print("  ❌ JSON export mismatch")
+            return False
+        
+        print("  ✅ Stage metrics recorded and exported")
+        
+        # A stage starting on another thread must not reset a running stage's peak
+        import threading
+        freed = threading.Event()
+        started = threading.Event()
+        
+        def other_stage():
+            freed.wait()
+            with metrics.track('other'):
+                started.set()
+        
+        metrics.reset()
+        metrics.enable_memory_tracking(True)
+        try:
+            other = threading.Thread(target=other_stage)
+            other.start()
+            with metrics.track('large'):
+                buffer = bytearray(5 * 10**6)
+                del buffer
+                freed.set()
+                started.wait(5)
+            other.join()
+        finally:
+            metrics.enable_memory_tracking(False)
+        if metrics.snapshot()['large']['peak_alloc_bytes'] < 5 * 10**6:
+            print("  ❌ A concurrent stage reset the peak allocation")
+            return False
+        print("  ✅ Concurrent stages keep each other's peaks")
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing metrics: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_profiling():
+    """Test that a profiled batch item saves its profile next to the record"""
+    print("\n🔍 Testing profiling mode...")
+    
+    import tempfile
+    
+    try:
+        import batch_jobs
+        import data_store
+        import profiling
+        
+        def fake_fetch(source):
+            return {'success': True, 'content': "Request a demo of our pricing. " * 40, 'headings': []}
+        
+        with tempfile.TemporaryDirectory() as data_dir:
+            items = [{'source': 'page', 'kind': 'own', 'competitor_name': '', 'target_keywords': ['demo']}]
+            job = batch_jobs.create_job(items, data_dir=data_dir, profile=True)
+            batch_jobs.run_job(job, data_dir=data_dir, fetch=fake_fetch, log=lambda msg: None)
+            
+            record = data_store.load_data('analyses', [], data_dir=data_dir)[0]
+            functions = [f['function'] for f in record['profile']['top_functions']]
+            if not profiling.profile_path(record['id'], data_dir).exists():
+                print("  ❌ Profile file was not saved")
+                return False
+            if not functions:
+                print("  ❌ No hot functions recorded")
+                return False
+        
+        print(f"  ✅ Profile saved (hottest: {functions[0]})")
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing profiling: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+IMPORT_TIME_BUDGET_SECONDS = 0.5
+HEAVY_MODULES = ('streamlit', 'pandas', 'requests', 'bs4', 'PyPDF2', 'docx', 'openai', 'anthropic')
+
+def test_import_time():
+    """Test that importing the analysis engines stays within the cold-start budget"""
+    print("\n🔍 Testing cold import time...")
+    
+    import json
+    import subprocess
+    
+    try:
+        script = (
+            "import json, sys, time\n"
+            "start = time.perf_counter()\n"
+            "import analysis_modules\n"
+            "elapsed = time.perf_counter() - start\n"
+            f"print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+        )
+        output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+        report = json.loads(output.stdout.strip().splitlines()[-1])
+        
+        if report['loaded']:
+            print(f"  ❌ Heavy modules imported eagerly: {', '.join(report['loaded'])}")
+            return False
+        if report['seconds'] > IMPORT_TIME_BUDGET_SECONDS:
+            print(f"  ❌ Cold import took {report['seconds']:.3f}s (budget {IMPORT_TIME_BUDGET_SECONDS}s)")
+            return False
+        
+        print(f"  ✅ Cold import took {report['seconds']:.3f}s (budget {IMPORT_TIME_BUDGET_SECONDS}s)")
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing import time: {str(e)}")
+        return False
+
+def test_shared_resources():
+    """Test that shared resources are built once per process and rebuilt after clearing"""
+    print("\n🔍 Testing shared resources...")
+    
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    
+    try:
+        import data_store
+        import resources
+        
+        builds = []
+        
+        @resources.cached_resource
+        def expensive_thing(name):
+            builds.append(name)
+            return object()
+        
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            things = list(pool.map(lambda _: expensive_thing('a'), range(32)))
+        assert len({id(t) for t in things}) == 1 and builds == ['a']
+        assert expensive_thing('b') is not things[0]
+        
+        resources.clear_resources('expensive_thing')
+        assert expensive_thing('a') is not things[0] and builds == ['a', 'b', 'a']
+        print("  ✅ Resources built once and rebuilt after clearing")
+        
+        import gc
+        import weakref
+        
+        class SavedThing:
+            pass
+        
+        loads = []
+        
+        @resources.versioned_resource
+        def saved_thing(path):
+            loads.append(path)
+            return SavedThing()
+        
+        first = saved_thing('a.npz', 1)
+        assert saved_thing('a.npz', 1) is first and saved_thing('a.npz', 2) is not first
+        assert saved_thing('b.npz', 1) is not saved_thing('a.npz', 2) and loads == ['a.npz', 'a.npz', 'b.npz']
+        first = weakref.ref(first)
+        gc.collect()
+        assert first() is None, "An older version stayed cached"
+        resources.clear_resources('saved_thing')
+        print("  ✅ File-backed resources keep only their newest version")
+        
+        assert resources.http_session() is resources.http_session()
+        assert resources.worker_pool() is resources.worker_pool()
+        assert resources.llm_client('openai', 'key-1') is resources.llm_client('openai', 'key-1')
+        assert resources.llm_client('openai', 'key-1') is not resources.llm_client('openai', 'key-2')
+        print("  ✅ HTTP session, worker pool and LLM clients shared")
+        
+        with tempfile.TemporaryDirectory() as data_dir:
+            assert data_store.file_signature('personas', data_dir) is None
+            data_store.save_data('personas', [], data_dir=data_dir)
+            first = data_store.file_signature('personas', data_dir)
+            data_store.save_data('personas', [{'name': 'Ops Lead'}], data_dir=data_dir)
+            assert data_store.file_signature('personas', data_dir) != first
+        print("  ✅ Data file signatures change on write")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing shared resources: {str(e)}")
+        return False
+
+def test_llm_map_reduce():
+    """Test that long documents are analyzed section by section and merged"""
+    print("\n🔍 Testing map-reduce LLM analysis...")
+    
+    import tempfile
+    import threading
+    
+    try:
+        import llm_analysis
+        import llm_cache
+        
+        prompts = []
+        lock = threading.Lock()
+        
+        def fake_complete(api_key, model, system, prompt, max_tokens):
+            with lock:
+                prompts.append(prompt)
+            if 'Merge them' in prompt:
+                return f"merged {prompt.count('### Part')} parts"
+            return f"analysis of {len(prompt)} chars"
+        
+        llm_analysis.register_provider('fake', fake_complete, 'fake-model')
+        cache_dir = tempfile.TemporaryDirectory()
+        cache = llm_cache.ResponseCache(f"{cache_dir.name}/llm_cache.sqlite")
+        
+        sections = [f"Section {i}" for i in range(12)]
+        headings = [{'level': 'h2', 'text': title} for title in sections]
+        content = ' '.join(f"{title} " + "Our platform cuts reporting time in half. " * 120 for title in sections)
+        
+        result = llm_analysis.analyze_document(content, "Analyze this", 'fake', 'key', headings=headings,
+                                               chunk_tokens=1500, cache=cache)
+        assert result['success'] and result['report'].startswith('merged'), result
+        assert result['chunks'] > 1 and result['cached_calls'] == 0
+        map_prompts = [p for p in prompts if 'Merge them' not in p]
+        assert all(any(title in p for p in map_prompts) for title in sections), "Not every section was sent"
+        print(f"  ✅ {len(content):,} chars covered in {result['chunks']} chunks and merged")
+        
+        # Editing one section only re-runs its chunk and the merge
+        prompts.clear()
+        edited = content.replace("Section 5 Our", "Section 5 Their", 1)
+        rerun = llm_analysis.analyze_document(edited, "Analyze this", 'fake', 'key', headings=headings,
+                                              chunk_tokens=1500, cache=cache)
+        assert rerun['success']
+        assert len([p for p in prompts if 'Merge them' not in p]) == 1, prompts
+        print(f"  ✅ Edited section re-ran alone ({rerun['cached_calls']} of {rerun['calls']} calls cached)")
+        
+        # Growing one section and adding another leaves every other chunk cached
+        prompts.clear()
+        grown = edited.replace("Section 3 ", "Section 3 Pricing starts at $99 per seat. ", 1)
+        grown += " Section 12 " + "New teams onboard in a day. " * 40
+        grown_headings = headings + [{'level': 'h2', 'text': "Section 12"}]
+        rerun = llm_analysis.analyze_document(grown, "Analyze this", 'fake', 'key', headings=grown_headings,
+                                              chunk_tokens=1500, cache=cache)
+        map_prompts = [p for p in prompts if 'Merge them' not in p]
+        assert rerun['success'] and len(map_prompts) == 2, f"{len(map_prompts)} chunks re-ran"
+        assert all('section: Section 3)' in p or 'section: Section 12)' in p for p in map_prompts)
+        
+        over_budget = llm_analysis.analyze_document(content, "Analyze this", 'fake', 'key', token_budget=100, cache=cache)
+        assert not over_budget['success'] and 'budget' in over_budget['error']
+        print("  ✅ Documents over the token budget are rejected")
+        
+        cache.close()
+        cache_dir.cleanup()
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing map-reduce analysis: {str(e)}")
+        return False
+
+def test_llm_cache():
+    """Test the persistent LLM response cache"""
+    print("\n🔍 Testing LLM response cache...")
+    
+    import tempfile
+    import time
+    
+    try:
+        import llm_analysis
+        import llm_cache
+        
+        calls = []
+        
+        def slow_fake_complete(api_key, model, system, prompt, max_tokens):
+            calls.append(prompt)
+            time.sleep(0.2)
+            return f"report for {len(prompt)} chars"
+        
+        llm_analysis.register_provider('slow-fake', slow_fake_complete, 'fake-model')
+        
+        with tempfile.TemporaryDirectory() as cache_dir:
+            path = f"{cache_dir}/llm_cache.sqlite"
+            cache = llm_cache.ResponseCache(path)
+            content = "Compare our pricing plans before you request a demo. " * 50
+            
+            first = llm_analysis.analyze_document(content, "Analyze this", 'slow-fake', 'key', cache=cache)
+            assert first['success'] and not first['cache_hit']
+            
+            # A new process opening the same file answers from disk
+            cache.close()
+            cache = llm_cache.ResponseCache(path)
+            start = time.perf_counter()
+            second = llm_analysis.analyze_document(content, "Analyze this", 'slow-fake', 'key', cache=cache)
+            elapsed = time.perf_counter() - start
+            assert second['cache_hit'] and second['report'] == first['report'] and len(calls) == 1
+            assert elapsed < 0.1, f"Cached answer took {elapsed:.3f}s"
+            print(f"  ✅ Cached answer returned in {elapsed * 1000:.1f} ms")
+            
+            # Any change to provider, model, system prompt, prompt or content misses
+            base = llm_cache.cache_key('openai', 'gpt-4', 'sys', 'prompt', content)
+            variants = [
+                llm_cache.cache_key('claude', 'gpt-4', 'sys', 'prompt', content),
+                llm_cache.cache_key('openai', 'gpt-4o', 'sys', 'prompt', content),
+                llm_cache.cache_key('openai', 'gpt-4', 'other', 'prompt', content),
+                llm_cache.cache_key('openai', 'gpt-4', 'sys', 'other', content),
+                llm_cache.cache_key('openai', 'gpt-4', 'sys', 'prompt', content + '.')
+            ]
+            assert base not in variants and len(set(variants)) == len(variants)
+            
+            stats = cache.stats()
+            assert stats['hits'] == 1 and stats['misses'] == 0 and stats['entries'] == 1
+            print(f"  ✅ Stats: {stats['hits']} hit, {stats['entries']} entry, {stats['bytes']} bytes")
+            cache.close()
+            
+            expiring = llm_cache.ResponseCache(f"{cache_dir}/expiring.sqlite", ttl_seconds=0)
+            expiring.put(base, "stale report")
+            time.sleep(0.01)
+            assert expiring.get(base) is None and expiring.stats()['entries'] == 0
+            expiring.close()
+            
+            bounded = llm_cache.ResponseCache(f"{cache_dir}/bounded.sqlite", max_bytes=1000)
+            for i in range(20):
+                bounded.put(f"key-{i}", "x" * 100)
+                if i == 0:
+                    continue
+                bounded.get("key-0")
+            assert bounded.stats()['bytes'] <= 1000
+            assert bounded.get("key-0") is not None and bounded.get("key-1") is None
+            bounded.close()
+            print("  ✅ Expired entries ignored and least recently used entries evicted")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing LLM cache: {str(e)}")
+        return False
+
+def test_llm_budget():
+    """Test token estimates, window sizing, cost planning and token budgets"""
+    print("\n🔍 Testing LLM token budgeting...")
+    
+    import tempfile
+    
+    try:
+        import llm_analysis
+        import llm_budget
+        import llm_cache
+        
+        prose = "Our analytics platform helps marketing teams measure campaign performance. " * 100
+        tokens = llm_budget.estimate_tokens(prose, 'openai')
+        assert 1.0 <= tokens / len(prose.split()) <= 1.6, tokens
+        
+        cut = llm_budget.truncate_to_tokens(prose, 50, 'openai')
+        assert llm_budget.estimate_tokens(cut, 'openai') <= 50 and prose.startswith(cut) and prose[len(cut)] in ' .'
+        print(f"  ✅ {len(prose.split())} words ≈ {tokens} tokens; truncation ends on a word boundary")
+        
+        assert llm_budget.output_token_limit(7000, 'gpt-4', 1000) < 1000
+        try:
+            llm_budget.output_token_limit(8000, 'gpt-4', 1000)
+            raise AssertionError("Oversized prompt was not rejected")
+        except llm_budget.PromptTooLarge:
+            pass
+        print("  ✅ Answers sized to the model window; oversized prompts rejected")
+        
+        sent = []
+        
+        def fake_complete(api_key, model, system, prompt, max_tokens):
+            sent.append((llm_budget.estimate_tokens(system + prompt, 'openai'), max_tokens))
+            return "Merged findings." if 'Merge them' in prompt else "Section findings."
+        
+        llm_analysis.register_provider('openai-fake', fake_complete, 'gpt-4')
+        # Numbered parts keep the chunks distinct; identical chunks would share one cached answer
+        long_doc = ' '.join(f"Part {i}. {prose}" for i in range(10))
+        plan = llm_analysis.plan_document(long_doc, "Analyze this", 'openai-fake', chunk_tokens=20000)
+        assert plan['chunks'] > 1 and plan['cost'] > 0 and plan['seconds'] > 0
+        
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = llm_cache.ResponseCache(f"{cache_dir}/llm_cache.sqlite")
+            ledger = llm_budget.TokenLedger(limit=plan['total_tokens'] * 3)
+            result = llm_analysis.analyze_document(long_doc, "Analyze this", 'openai-fake', 'key', chunk_tokens=20000,
+                                                   cache=cache, user='analyst', ledger=ledger)
+            assert result['success'] and result['calls'] == plan['calls'] == len(sent)
+            assert all(prompt_tokens + max_tokens <= 8192 for prompt_tokens, max_tokens in sent)
+            assert ledger.spent('analyst') == result['spent_tokens'] < plan['total_tokens']
+            print(f"  ✅ {plan['calls']} calls planned and made within gpt-4's window (~${plan['cost']:.2f} estimated)")
+            
+            sent.clear()
+            tight = llm_budget.TokenLedger(limit=100)
+            refused = llm_analysis.analyze_document(long_doc, "Another prompt", 'openai-fake', 'key',
+                                                    cache=cache, user='analyst', ledger=tight)
+            assert not refused['success'] and 'budget' in refused['error'] and not sent
+            cache.close()
+        print("  ✅ Requests over a user's budget are refused before dispatch")
+        
+        batch = llm_analysis.plan_batch([(long_doc, []), (prose, [])], "Analyze this", 'openai-fake', chunk_tokens=20000)
+        assert batch['documents'] == 2 and batch['calls'] == plan['calls'] + 1 and batch['cost'] > plan['cost']
+        print(f"  ✅ Batch plan: {batch['calls']} calls, {batch['total_tokens']:,} tokens, ~{batch['seconds']}s")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing token budgeting: {str(e)}")
+        return False
+
+def test_record_schema():
+    """Test that records are stored normalized and rebuilt in full on read"""
+    print("\n🔍 Testing normalized record storage...")
+    
+    import json
+    import tempfile
+    
+    try:
+        import data_store
+        import record_schema
+        from analysis_modules import build_analysis_result, build_competitor_analysis, build_persona_analysis
+        
+        content = "Compare pricing plans and request a demo. Our guide covers the basics. " * 40
+        headings = [{'level': 'h2', 'text': 'Pricing plans'}]
+        persona = {'id': 'p1', 'name': 'Ops Lead', 'role': 'Operations', 'description': '',
+                   'pain_points': ['manual reporting', 'slow onboarding'], 'goals': ['faster pricing decisions']}
+        records = {
+            'analyses': [build_analysis_result(content, headings, 'a.txt', ['pricing', 'demo', 'onboarding'])
+                         for _ in range(20)],
+            'competitor_analyses': [build_competitor_analysis(content, [], 'b.txt', 'Rival', ['pricing'])
+                                    for _ in range(20)],
+            'persona_analyses': [build_persona_analysis(content, persona, 'Case Study', 'c.txt') for _ in range(20)]
+        }
+        
+        for data_type, full in records.items():
+            compact = record_schema.compact_records(full)
+            assert record_schema.expand_records(compact, [persona]) == full, f"{data_type} did not round-trip"
+            assert record_schema.expand_records(full, [persona]) == full, f"Legacy {data_type} changed on read"
+            full_size, compact_size = len(json.dumps(full)), len(json.dumps(compact))
+            assert compact_size < full_size
+            print(f"  ✅ {data_type}: {full_size:,} → {compact_size:,} bytes, rebuilt exactly on read")
+        
+        # Deleted personas still display by name
+        orphan = record_schema.expand_record(record_schema.compact_record(records['persona_analyses'][0]), [])
+        assert orphan['persona']['name'] == 'Ops Lead' and orphan['persona']['deleted']
+        
+        with tempfile.TemporaryDirectory() as data_dir:
+            data_store.save_data('analyses', records['analyses'], data_dir=data_dir)
+            saved = record_schema.migrate(data_dir)
+            assert saved['analyses'] > 0
+            stored = data_store.load_data('analyses', data_dir=data_dir)
+            assert 'stage_info' not in stored[0]['funnel_analysis']
+            assert record_schema.expand_records(stored) == records['analyses']
+        print(f"  ✅ Migration compacted existing analyses ({saved['analyses']:,} bytes saved)")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing normalized records: {str(e)}")
+        return False
+
+def test_search_index():
+    """Test full-text search over saved records"""
+    print("\n🔍 Testing full-text search...")
+    
+    import tempfile
+    import time
+    
+    try:
+        import content_store
+        import search_index
+        
+        stages = ['awareness', 'consideration', 'decision', 'retention']
+        words = ['analytics', 'pipeline', 'dashboard', 'onboarding', 'reporting', 'integration', 'security', 'billing']
+        with tempfile.TemporaryDirectory() as data_dir:
+            index = search_index.SearchIndex(data_dir=data_dir)
+            records = []
+            for i in range(20000):
+                records.append({
+                    'id': f"r{i}", 'timestamp': f"2026-{i % 12 + 1:02d}-{i % 28 + 1:02d}T10:00:00",
+                    'source': f"page{i}.txt", 'funnel_analysis': {'primary_stage': stages[i % 4]},
+                    'content_preview': f"{words[i % 8]} {words[(i * 3) % 8]} guide number {i}"
+                })
+            # One record whose full text is in the content store and is not visible in its preview
+            full_text = "Short intro. " + "filler text " * 200 + "The zeppelin pricing appendix."
+            records.append({'id': 'full', 'timestamp': '2026-06-01T10:00:00', 'source': 'long.txt',
+                            'content_hash': content_store.put(full_text, data_dir),
+                            'content_preview': full_text[:500], 'competitor_name': 'Acme Pricing'})
+            
+            start = time.perf_counter()
+            assert index.index_records('analyses', records) == len(records)
+            print(f"  ✅ Indexed {len(records):,} records in {time.perf_counter() - start:.2f}s")
+            assert index.index_records('analyses', records) == 0, "Re-indexing added duplicates"
+            assert index.sync('analyses', records) == 0
+            
+            # A record replaced by another leaves the count unchanged
+            replaced = records[:-2] + [dict(records[-2], id='replacement', content_preview='quokka guide'), records[-1]]
+            assert index.sync('analyses', replaced) == 1 and index.count('analyses') == len(records)
+            assert [h['record_id'] for h in index.search('quokka')] == ['replacement']
+            assert index.sync('analyses', records) == 1 and not index.search('quokka')
+            
+            hits = index.search('zeppelin')
+            assert [h['record_id'] for h in hits] == ['full'], "Stored full content was not searched"
+            assert index.search('pricing')[0]['record_id'] == 'full', "Name match did not rank first"
+            assert index.search('analyt*', limit=5), "Prefix query found nothing"
+            
+            filtered = index.search('dashboard', stages=['decision'], since='2026-03-01', until='2026-04-01', limit=500)
+            assert filtered and all(h['stage'] == 'decision' and h['timestamp'].startswith('2026-03') for h in filtered)
+            assert index.search('', limit=1)[0]['timestamp'].startswith('2026-12'), "Empty query is not newest first"
+            
+            start = time.perf_counter()
+            for query in ('analytics', 'pipe*', 'security billing', 'guide'):
+                index.search(query, stages=['awareness'])
+            elapsed = (time.perf_counter() - start) / 4
+            assert elapsed < 0.1, f"Search took {elapsed * 1000:.0f} ms"
+            print(f"  ✅ Ranked, prefix and filtered queries in {elapsed * 1000:.1f} ms each")
+            index.close()
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing full-text search: {str(e)}")
+        return False
+
+def test_site_crawler():
+    """Test crawling a local fixture site"""
+    print("\n🔍 Testing site crawler...")
+    
+    import os
+    import tempfile
+    import threading
+    from functools import partial
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+    
+    try:
+        import site_crawler
+        
+        assert site_crawler.canonicalize_url("HTTP://Example.COM:80/a/./b/../c?utm_source=x&b=2&a=1#top") == \
+            "http://example.com/a/c?a=1&b=2"
+        assert site_crawler.canonicalize_url("mailto:team@example.com") is None
+        
+        with tempfile.TemporaryDirectory() as site_dir:
+            requested = []
+            user_agents = set()
+            
+            class Handler(SimpleHTTPRequestHandler):
+                def do_GET(self):
+                    user_agents.add(self.headers.get('User-Agent'))
+                    if self.path == '/moved.html':
+                        # Same server under another host name, so a different site to the crawler
+                        self.send_response(301)
+                        self.send_header('Location', f"http://localhost:{server.server_port}/elsewhere.html")
+                        self.end_headers()
+                        return
+                    super().do_GET()
+                
+                def log_message(self, *args):
+                    requested.append(self.path)
+            
+            server = ThreadingHTTPServer(('127.0.0.1', 0), partial(Handler, directory=site_dir))
+            origin = f"http://127.0.0.1:{server.server_port}"
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            
+            def page(path, text, links=()):
+                full_path = os.path.join(site_dir, path)
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                anchors = ''.join(f'<a href="{link}">link</a>' for link in links)
+                with open(full_path, 'w') as f:
+                    f.write(f"<html><body><h1>Fixture Co</h1><p>{text}</p>{anchors}</body></html>")
+            
+            page('index.html', "Compare pricing plans and request a demo.", [
+                'about.html', '/about.html#team', 'about.html?utm_source=nav', 'copy.html', '/private/secret.html',
+                'logo.png', 'https://other.example.com/', 'mailto:team@example.com', 'deep/level1.html', 'moved.html'
+            ])
+            page('elsewhere.html', "A page on another site.", ['trap.html'])
+            page('about.html', "Our team builds analytics for marketers.")
+            page('copy.html', "Our team builds analytics for marketers.")
+            page('orphan.html', "Only the sitemap links to this guide.")
+            page('private/secret.html', "Internal roadmap.")
+            page('deep/level1.html', "Level one.", ['level2.html'])
+            page('deep/level2.html', "Level two.", ['level3.html'])
+            page('deep/level3.html', "Level three is past the depth budget.")
+            with open(os.path.join(site_dir, 'robots.txt'), 'w') as f:
+                f.write(f"User-agent: *\nDisallow: /private/\nSitemap: {origin}/sitemap.xml\n")
+            with open(os.path.join(site_dir, 'sitemap.xml'), 'w') as f:
+                f.write('<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                        f'<url><loc>{origin}/orphan.html</loc></url><url><loc>{origin}/</loc></url></urlset>')
+            
+            try:
+                result = site_crawler.crawl_competitor_site(origin, "Fixture Co", ['pricing'], data_dir=site_dir,
+                                                            max_depth=2, delay=0)
+                analyzed = {row['url'][len(origin):] for row in result['rows'] if row['status'] == 'analyzed'}
+                # about.html and copy.html hold the same text, so only whichever arrives first is analyzed
+                assert len(analyzed & {'/about.html', '/copy.html'}) == 1, analyzed
+                assert analyzed - {'/about.html', '/copy.html'} == {'/', '/orphan.html', '/deep/level1.html',
+                                                                     '/deep/level2.html'}, analyzed
+                assert all(r['competitor_name'] == "Fixture Co" for r in result['records'])
+                assert result['skipped'] == {'offsite': 2, 'filtered': 1, 'blocked': 1, 'duplicate': 1}, result['skipped']
+                assert [row['status'] for row in result['rows'] if row['url'].endswith('/moved.html')] == ['offsite']
+                assert '/private/secret.html' not in requested and '/deep/level3.html' not in requested
+                assert '/trap.html' not in requested, "Links of an off-site redirect were followed"
+                assert all(site_crawler.ROBOTS_USER_AGENT in agent for agent in user_agents), user_agents
+                pages = [path for path in requested if path.endswith('.html')]
+                assert len(pages) == len(set(pages)), "A page was fetched twice"
+                print(f"  ✅ Crawled {len(analyzed)} pages: sitemap seeds, robots.txt, depth limit, redirects and dedupe honored")
+                
+                limited = site_crawler.crawl_competitor_site(origin, "Fixture Co", max_pages=2, delay=0, data_dir=site_dir)
+                assert len(limited['rows']) == 2
+                print("  ✅ Page budget respected")
+            finally:
+                server.shutdown()
+                server.server_close()
+        
+        import gzip
+        sitemap = b'<urlset><url><loc>https://example.com/</loc></url></urlset>'
+        assert site_crawler.parse_sitemap(gzip.compress(sitemap)) == (['https://example.com/'], [])
+        original_limit = site_crawler.MAX_SITEMAP_BYTES
+        site_crawler.MAX_SITEMAP_BYTES = 1000
+        try:
+            site_crawler.parse_sitemap(gzip.compress(sitemap[:-10] + b' ' * 10**6 + sitemap[-10:]))
+            assert False, "An oversized gzip sitemap was decompressed"
+        except ValueError:
+            pass
+        finally:
+            site_crawler.MAX_SITEMAP_BYTES = original_limit
+        print("  ✅ Gzip sitemaps are capped after decompression")
+        
+        sleeps = []
+        throttle = site_crawler.HostThrottle(sleep=sleeps.append)
+        for _ in range(3):
+            throttle.wait('example.com', 1.0)
+        assert len(sleeps) == 2 and sleeps[-1] > 1.5
+        print("  ✅ Requests to a host are spaced out")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing site crawler: {str(e)}")
+        return False
+
+def test_tracked_urls():
+    """Test change detection and version history of tracked URLs"""
+    print("\n🔍 Testing tracked URLs...")
+    
+    import os
+    import tempfile
+    import threading
+    import time
+    from functools import partial
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+    
+    try:
+        import data_store
+        import resources
+        import tracked_urls
+        
+        with tempfile.TemporaryDirectory() as site_dir, tempfile.TemporaryDirectory() as data_dir:
+            class Handler(SimpleHTTPRequestHandler):
+                def log_message(self, *args):
+                    pass
+            
+            server = ThreadingHTTPServer(('127.0.0.1', 0), partial(Handler, directory=site_dir))
+            origin = f"http://127.0.0.1:{server.server_port}"
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            
+            mtime = [time.time() - 1000]
+            
+            def publish(updated, pricing):
+                path = os.path.join(site_dir, 'pricing.html')
+                with open(path, 'w') as f:
+                    f.write(f"<html><body><p>Updated {updated}</p><h2>Plans</h2><p>{pricing}</p>"
+                            "<h2>FAQ</h2><p>Cancel any time. No setup fees.</p></body></html>")
+                # Each publish gets a later Last-Modified so conditional requests see it
+                mtime[0] += 100
+                os.utime(path, (mtime[0], mtime[0]))
+            
+            def check():
+                return tracked_urls.check_urls(force=True, delay=0, data_dir=data_dir)
+            
+            try:
+                publish("2026-01-05 09:30", "Starter costs $10. Pro costs $30.")
+                tracked_urls.track_url(f"{origin}/pricing.html", 'competitor', "Rival", ['pricing'], data_dir=data_dir)
+                tracked_urls.track_url(f"{origin}/missing.html", data_dir=data_dir)
+                
+                assert check()['counts'] == {'new': 1, 'failed': 1}
+                assert check()['counts'] == {'not_modified': 1, 'failed': 1}, "Conditional request was not used"
+                publish("2026-02-10 17:45", "Starter costs $10. Pro costs $30.")
+                counts = check()["counts"]
+                assert counts == {"unchanged": 1, "failed": 1}, f"A date-only change was treated as a change: {counts}"
+                publish("2026-03-01 08:00", "Starter costs $12. Pro costs $30.")
+                result = check()
+                assert result['counts'] == {'changed': 1, 'failed': 1}
+                assert len(data_store.load_data('competitor_analyses', data_dir=data_dir)) == 2
+                assert resources.search_index(data_dir).count('competitor_analyses') == 2
+                print("  ✅ Only real content changes are re-analyzed (304s and date-only edits skipped)")
+                
+                entry = tracked_urls.find_entry(f"{origin}/pricing.html", data_dir)
+                versions = tracked_urls.load_versions(entry['id'], data_dir)
+                assert [v['version'] for v in versions] == [1, 2] and entry['versions'] == 2
+                changes = versions[-1]['changes']
+                assert [m['title'] for m in changes['modified']] == ['Plans'] and not changes['added']
+                removed, added = changes['modified'][0]['diff']
+                assert removed.startswith('-') and removed.endswith('$10.') and added.startswith('+') and added.endswith('$12.')
+                print(f"  ✅ Version history records section diffs: {tracked_urls.describe_changes(changes)}")
+                
+                due = tracked_urls.check_urls(delay=0, data_dir=data_dir)
+                assert due['counts'] == {}, "URLs were re-checked before they were due"
+                
+                # A crash while saving the registry leaves no version behind to be numbered again
+                publish("2026-04-01 08:00", "Starter costs $15. Pro costs $30.")
+                save_entries = tracked_urls._save_entries
+                tracked_urls._save_entries = lambda *args: 1 / 0
+                try:
+                    check()
+                    assert False, "The registry save did not fail"
+                except ZeroDivisionError:
+                    pass
+                finally:
+                    tracked_urls._save_entries = save_entries
+                assert len(tracked_urls.load_versions(entry['id'], data_dir)) == 2
+                
+                # Settings edited while a check runs are kept
+                def fetch_and_edit(url, headers):
+                    tracked_urls.track_url(url, 'competitor', "Rival", ['pricing', 'plans'], 12, data_dir=data_dir)
+                    return tracked_urls.fetch_url(url, headers)
+                assert tracked_urls.check_urls(force=True, fetch=fetch_and_edit, delay=0, data_dir=data_dir)['counts'] == \
+                    {'changed': 1, 'failed': 1}
+                entry = tracked_urls.find_entry(f"{origin}/pricing.html", data_dir)
+                assert entry['target_keywords'] == ['pricing', 'plans'] and entry['interval_hours'] == 12
+                assert [v['version'] for v in tracked_urls.load_versions(entry['id'], data_dir)] == [1, 2, 3]
+                assert entry['versions'] == 3
+                print("  ✅ Versions are written after the registry; concurrent settings edits are kept")
+            finally:
+                server.shutdown()
+                server.server_close()
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing tracked URLs: {str(e)}")
+        return False
+
+def test_persona_import():
+    """Test bulk persona import with stable ids and upsert by name"""
+    print("\n🔍 Testing persona import...")
+    
+    import io
+    import tempfile
+    import time
+    
+    try:
+        import pandas as pd
+        import data_store
+        import persona_import
+        
+        rows = 10000
+        sheet = pd.DataFrame({
+            'Persona Name': [f"Segment {i}" for i in range(rows)],
+            'Role/Title': ['Marketing Manager'] * rows,
+            'Description': ['Mid-market B2B buyer'] * rows,
+            'Pain Points': ['Limited budget, Proving ROI\nToo many tools'] * rows,
+            'Goals': ['More qualified leads'] * rows
+        })
+        sheet.loc[5, 'Role/Title'] = ''
+        sheet.loc[rows - 1, 'Persona Name'] = 'segment 10'
+        sheet.loc[rows - 1, 'Goals'] = 'Shorter sales cycle'
+        df = persona_import.read_persona_sheet(io.BytesIO(sheet.to_csv(index=False).encode()), 'crm.csv')
+        
+        with tempfile.TemporaryDirectory() as data_dir:
+            # Ids from the old length-based numbering collide after a delete
+            data_store.save_data('personas', [
+                {'id': 1, 'name': 'Segment 0', 'role': 'Old role', 'description': '', 'pain_points': [], 'goals': [],
+                 'created_at': '2025-01-01T00:00:00'},
+                {'id': 1, 'name': 'CEO Carol', 'role': 'CEO', 'description': '', 'pain_points': [], 'goals': [],
+                 'created_at': '2025-01-01T00:00:00'}
+            ], data_dir=data_dir)
+            
+            start = time.perf_counter()
+            result = persona_import.import_personas(df, data_dir=data_dir)
+            elapsed = time.perf_counter() - start
+            assert result['success'], result.get('error')
+            assert (result['added'], result['updated']) == (rows - 3, 1), (result['added'], result['updated'])
+            assert [r['row'] for r in result['rejected']] == [7, 12]
+            
+            personas = data_store.load_data('personas', data_dir=data_dir)
+            assert len(personas) == rows - 1
+            assert len({p['id'] for p in personas}) == len(personas), "Persona ids are not unique"
+            by_name = {p['name']: p for p in personas}
+            assert by_name['Segment 0']['id'] == 1 and by_name['Segment 0']['role'] == 'Marketing Manager'
+            assert by_name['Segment 1']['pain_points'] == ['Limited budget', 'Proving ROI', 'Too many tools']
+            assert by_name['segment 10']['goals'] == ['Shorter sales cycle']
+            print(f"  ✅ Imported {rows:,} rows in {elapsed:.2f}s: ids unique, existing personas updated in place")
+            
+            again = persona_import.import_personas(df, data_dir=data_dir)
+            assert again['added'] == 0 and len(data_store.load_data('personas', data_dir=data_dir)) == rows - 1
+            print("  ✅ Re-importing the same sheet adds nothing")
+        
+        missing = persona_import.import_personas(pd.DataFrame({'Name': ['x']}))
+        assert not missing['success'] and 'Persona Name' in missing['error']
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing persona import: {str(e)}")
+        return False
+
+def test_funnel_classifier():
+    """Test the trained funnel-stage classifier and its fallback to keyword heuristics"""
+    print("\n🔍 Testing funnel classifier...")
+    
+    import os
+    import random
+    import tempfile
+    import time
+    
+    try:
+        import funnel_classifier
+        import resources
+        from analysis_modules import analyze_funnel_stage
+        
+        phrases = {
+            'awareness': ['why teams struggle with', 'the hidden cost of', 'a beginner primer on', 'trends shaping',
+                          'what everyone gets wrong about', 'an introduction to'],
+            'consideration': ['side by side with', 'how we stack up against', 'evaluating vendors for',
+                              'feature matrix for', 'alternatives to', 'choosing between options for'],
+            'decision': ['book a demo of', 'start your free trial of', 'pricing plans for', 'talk to sales about',
+                         'request a quote for', 'sign the contract for']
+        }
+        topics = ['onboarding', 'analytics', 'security', 'payroll', 'invoicing', 'content', 'hiring', 'support']
+        filler = 'our platform helps busy teams save time every week with simple reliable workflows'.split()
+        rng = random.Random(7)
+        
+        def document(stage):
+            words = []
+            for _ in range(20):
+                words += rng.sample(filler, 6) + f"{rng.choice(phrases[stage])} {rng.choice(topics)}".split()
+            return ' '.join(words)
+        
+        stages = list(phrases)
+        labels = [stages[i % 3] for i in range(1500)]
+        texts = [document(stage) for stage in labels]
+        examples = list(zip(texts, labels))
+        training, holdout = funnel_classifier.split_holdout(examples, 0.2)
+        model = funnel_classifier.train([t for t, _ in training], [s for _, s in training])
+        evaluation = funnel_classifier.evaluate(model, [t for t, _ in holdout], [s for _, s in holdout])
+        assert evaluation['accuracy'] >= 0.95, evaluation
+        print(f"  ✅ Holdout accuracy {evaluation['accuracy']:.1%} "
+              f"(keyword heuristic {evaluation['heuristic_accuracy']:.1%})")
+        
+        start = time.perf_counter()
+        results = funnel_classifier.classify(model, texts)
+        rate = len(texts) / (time.perf_counter() - start)
+        assert len(results) == len(texts) and rate > 1000, f"{rate:.0f} docs/s"
+        assert abs(sum(results[0]['scores'].values()) - 1) < 0.01
+        print(f"  ✅ Scored {len(texts):,} documents at {rate:,.0f} docs/s")
+        
+        with tempfile.TemporaryDirectory() as data_dir:
+            path = funnel_classifier.save_model(model, data_dir)
+            loaded = funnel_classifier.load_model(data_dir)
+            assert loaded['meta']['examples'] == model['meta']['examples']
+            assert [r['primary_stage'] for r in funnel_classifier.classify(loaded, texts[:50])] == \
+                [r['primary_stage'] for r in results[:50]]
+            print(f"  ✅ Model artifact round-trips ({path.stat().st_size:,} bytes)")
+            
+            previous = os.environ.get(funnel_classifier.MODE_ENV)
+            os.environ[funnel_classifier.MODE_ENV] = 'model'
+            try:
+                assert funnel_classifier.active_model(data_dir) is not None
+                os.remove(path)
+                assert funnel_classifier.active_model(data_dir) is None
+            finally:
+                if previous is None:
+                    os.environ.pop(funnel_classifier.MODE_ENV)
+                else:
+                    os.environ[funnel_classifier.MODE_ENV] = previous
+                resources.clear_resources('funnel_model')
+        
+        assert analyze_funnel_stage(texts[0])['method'] == 'keywords'
+        print("  ✅ Falls back to keyword heuristics without a model")
+        
+        try:
+            funnel_classifier.train(texts[:10], ['awareness'] * 10)
+            raise AssertionError("Training without every stage should fail")
+        except ValueError:
+            pass
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing funnel classifier: {str(e)}")
+        return False
+
+def test_topic_clusters():
+    """Test mini-batch k-means topic clustering, incremental updates and coverage"""
+    print("\n🔍 Testing topic clusters...")
+    
+    import random
+    import tempfile
+    import time
+    from collections import Counter
+    
+    try:
+        import content_store
+        import topic_clusters
+        
+        topics = {
+            'payroll': 'payroll salary withholding employees paycheck deductions benefits overtime',
+            'security': 'encryption firewall breach vulnerability password phishing compliance audit',
+            'analytics': 'dashboard metrics conversion cohort retention attribution reporting segments'
+        }
+        filler = 'team business growth strategy customers modern simple platform'.split()
+        rng = random.Random(3)
+        
+        def text(topic):
+            return ' '.join(rng.choices(topics[topic].split(), k=30) + rng.choices(filler, k=40))
+        
+        with tempfile.TemporaryDirectory() as data_dir:
+            records = []
+            truth = {}
+            for i in range(6000):
+                topic = list(topics)[i % 3]
+                content = text(topic)
+                record = {'id': f"doc{i}", 'content_preview': content[:100],
+                          'content_hash': content_store.put(content, data_dir),
+                          'funnel_analysis': {'primary_stage': 'awareness'}}
+                data_type = 'analyses'
+                if topic == 'security' and i % 2:
+                    data_type = 'competitor_analyses'
+                elif topic == 'payroll' and i % 2:
+                    data_type = 'persona_analyses'
+                    record = {'id': record['id'], 'content_preview': record['content_preview'],
+                              'content_hash': record['content_hash'], 'funnel_stage': 'decision',
+                              'persona': {'name': 'HR Hannah'}}
+                records.append((data_type, record))
+                truth[record['id']] = topic
+            
+            start = time.perf_counter()
+            model = topic_clusters.build_clusters(3, records=records, data_dir=data_dir, batch_size=500)
+            elapsed = time.perf_counter() - start
+            pairs = Counter((truth[key], cluster) for key, cluster in model.assignments.items())
+            purity = sum(max(n for (t, _), n in pairs.items() if t == topic) for topic in topics) / len(records)
+            assert purity > 0.95, pairs
+            print(f"  ✅ Clustered {len(records):,} documents in {elapsed:.2f}s, purity {purity:.1%}")
+            
+            cluster_of = {topic: next(c for (t, c), _ in pairs.most_common() if t == topic) for topic in topics}
+            assert 'encryption' in model.top_terms()[cluster_of['security']]
+            coverage = {c['cluster']: c for c in topic_clusters.cluster_coverage(model, records)}
+            assert coverage[cluster_of['security']]['competitor_assets'] == 1000
+            assert coverage[cluster_of['payroll']]['coverage']['HR Hannah'] == {'decision': 1000}
+            print(f"  ✅ Labels and coverage: {coverage[cluster_of['security']]['label']}")
+            
+            new_records = [('analyses', {'id': f"new{i}", 'content_preview': text('analytics')}) for i in range(50)]
+            added = topic_clusters.update_clusters(records + new_records, data_dir=data_dir)
+            assert added == 50 and topic_clusters.update_clusters(records + new_records, data_dir=data_dir) == 0
+            loaded = topic_clusters.TopicModel.load(topic_clusters.model_path(data_dir))
+            assert {loaded.assignments[f"new{i}"] for i in range(50)} == {cluster_of['analytics']}
+            assert loaded.assignments['doc0'] == model.assignments['doc0']
+            print("  ✅ New analyses join their topic incrementally without a rebuild")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing topic clusters: {str(e)}")
+        return False
+
+def test_keyword_discovery():
+    """Test streaming phrase counts and competitor keyword gaps"""
+    print("\n🔍 Testing keyword discovery...")
+    
+    import random
+    import tempfile
+    import time
+    
+    try:
+        import data_store
+        import keyword_discovery
+        from analysis_modules import analyze_keyword_optimization
+        
+        rng = random.Random(5)
+        vocabulary = [f"term{i}" for i in range(3000)]
+        
+        def page(extra):
+            return ' '.join(rng.choices(vocabulary, k=120)) + ' ' + extra
+        
+        own = [{'id': f"own{i}", 'content_preview': page("our workflow automation platform")} for i in range(2000)]
+        competitor = [{'id': f"comp{i}", 'content_preview': page(
+            "start a free trial with usage based pricing" if i % 2 else "workflow automation platform")}
+            for i in range(2000)]
+        
+        with tempfile.TemporaryDirectory() as data_dir:
+            data_store.save_data('analyses', own[:1500], data_dir=data_dir)
+            data_store.save_data('competitor_analyses', competitor, data_dir=data_dir)
+            start = time.perf_counter()
+            sketch = keyword_discovery.sync_keywords(data_dir)
+            elapsed = time.perf_counter() - start
+            table_shape = sketch.own.sketch.table.shape
+            gaps = [row['keyword'] for row in sketch.gaps()]
+            for phrase in ('free trial', 'usage based pricing'):
+                assert phrase in gaps, gaps
+            assert 'workflow automation platform' not in gaps
+            assert sketch.competitor.top(1)[0][1] >= 1000
+            print(f"  ✅ Counted 3,500 documents in {elapsed:.2f}s; top gaps: {', '.join(gaps[:3])}")
+            
+            counts = {'analyses': len(own), 'competitor_analyses': len(competitor)}
+            assert sketch.pending(counts) == 500
+            data_store.append_records('analyses', own[1500:], data_dir=data_dir)
+            progress = []
+            sketch = keyword_discovery.sync_keywords(data_dir, counts, on_progress=lambda *p: progress.append(p))
+            assert progress == [(500, 500)], progress
+            assert sketch.own.documents == 2000 and sketch.competitor.documents == 2000
+            assert sketch.own.sketch.table.shape == table_shape
+            assert len(sketch.own.candidates) <= 2 * keyword_discovery.CANDIDATE_CAPACITY
+            assert sketch.pending(counts) == 0
+            
+            # A rewritten (shorter) file is counted from scratch
+            data_store.save_data('analyses', own[:100], data_dir=data_dir)
+            sketch = keyword_discovery.sync_keywords(data_dir)
+            assert sketch.own.documents == 100 and sketch.competitor.documents == 2000
+            print("  ✅ Later syncs read only new records; memory stays fixed")
+        
+        result = analyze_keyword_optimization(page("free trial"), gaps[:3])
+        assert [row['keyword'] for row in result['keyword_analysis']] == gaps[:3]
+        print("  ✅ Discovered keywords feed keyword optimization")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing keyword discovery: {str(e)}")
+        return False
+
+def test_recompute():
+    """Test analyzer fingerprints and selective recomputation of stale results"""
+    print("\n🔍 Testing selective recompute...")
+    
+    import re
+    import tempfile
+    
+    try:
+        import analysis_modules as am
+        import content_store
+        import data_store
+        import record_schema
+        import recompute
+        
+        texts = [f"Guide {i}: what is a pricing demo? Book a demo. Results grew {i}% this year." for i in range(30)]
+        headings = [{'text': 'Pricing demo', 'level': 'H2'}]
+        with tempfile.TemporaryDirectory() as data_dir:
+            own = [am.build_analysis_result(t, headings, f"page{i}", ['demo']) for i, t in enumerate(texts)]
+            competitor = [am.build_competitor_analysis(t, headings, f"comp{i}", 'Acme', []) for i, t in enumerate(texts)]
+            for text in texts:
+                content_store.put(text, data_dir)
+            data_store.append_records('analyses', record_schema.compact_records(own), data_dir=data_dir)
+            data_store.append_records('competitor_analyses', record_schema.compact_records(competitor), data_dir=data_dir)
+            assert all(not report['stale'] for report in recompute.status(data_dir).values())
+            
+            saved_keywords = am.FUNNEL_STAGES['decision']['keywords']
+            try:
+                am.FUNNEL_STAGES['decision']['keywords'] = [k for k in saved_keywords if k != 'demo']
+                report = recompute.status(data_dir)
+                assert report['analyses']['stale'] == {'funnel_analysis': 30}, report
+                result = recompute.recompute(data_dir=data_dir)
+                assert result['analyses']['analyzers'] == {'funnel_analysis': 30}
+                assert result['competitor_analyses']['analyzers'] == {'funnel_analysis': 30}
+            finally:
+                am.FUNNEL_STAGES['decision']['keywords'] = saved_keywords
+            stored = record_schema.expand_records(data_store.load_data('analyses', data_dir=data_dir))
+            assert [r['funnel_analysis']['primary_stage'] for r in own] == ['decision'] * 30
+            assert {r['funnel_analysis']['primary_stage'] for r in stored} == {'awareness'}
+            assert [r['entity_analysis'] for r in stored] == [r['entity_analysis'] for r in own]
+            assert [r['timestamp'] for r in stored] == [r['timestamp'] for r in own]
+            print("  ✅ A funnel keyword edit reruns only the funnel analyzer, other fields untouched")
+            
+            # Reverting the edit makes the new results stale in turn
+            assert recompute.recompute(data_dir=data_dir)['analyses']['analyzers'] == {'funnel_analysis': 30}
+            stored = record_schema.expand_records(data_store.load_data('analyses', data_dir=data_dir))
+            assert {r['funnel_analysis']['primary_stage'] for r in stored} == {'decision'}
+            
+            saved_threshold = am.COMPETITOR_THRESHOLDS['thin_words']
+            try:
+                am.COMPETITOR_THRESHOLDS['thin_words'] = 5
+                result = recompute.recompute(data_dir=data_dir)
+                assert result['analyses']['records'] == 0
+                assert result['competitor_analyses']['analyzers'] == {'competitive_insights': 30}
+                stored = data_store.load_data('competitor_analyses', data_dir=data_dir)
+                assert all("📝 Create more comprehensive content" not in r['competitive_insights']['opportunities']
+                           for r in stored)
+            finally:
+                am.COMPETITOR_THRESHOLDS['thin_words'] = saved_threshold
+            print("  ✅ A competitor threshold change reruns only competitor insights")
+            
+            # Insights depend on the entity analysis; saves made during a run are kept
+            saved_pattern = am.STATISTIC_PATTERN
+            late = record_schema.compact_record(dict(competitor[0], id='saved-meanwhile'))
+            def save_meanwhile(data_type, done):
+                if data_type == 'competitor_analyses' and done == 1:
+                    data_store.append_records('competitor_analyses', [late], data_dir=data_dir)
+            try:
+                am.STATISTIC_PATTERN = re.compile(r'(?!)')
+                result = recompute.recompute(data_dir=data_dir, on_progress=save_meanwhile)
+                assert result['competitor_analyses']['analyzers'] == {'entity_analysis': 30, 'competitive_insights': 30}
+                stored = data_store.load_data('competitor_analyses', data_dir=data_dir)
+                assert len(stored) == 31 and stored[-1]['id'] == 'saved-meanwhile'
+                assert all("📊 Add more data and statistics" in r['competitive_insights']['opportunities']
+                           for r in stored[:30])
+            finally:
+                am.STATISTIC_PATTERN = saved_pattern
+            recompute.recompute(data_dir=data_dir)
+            print("  ✅ Entity rule changes also rerun insights; saves during a run are kept")
+            
+            legacy = record_schema.compact_record(dict(own[0], id='legacy'))
+            del legacy['analyzers']
+            data_store.append_records('analyses', [legacy], data_dir=data_dir)
+            assert recompute.recompute(data_dir=data_dir, dry_run=True)['analyses']['records'] == 1
+            assert recompute.stamp(data_dir)['analyses'] == 1
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing selective recompute: {str(e)}")
+        return False
+
+def test_competitor_rollups():
+    """Test incremental weekly competitor rollups in Parquet"""
+    print("\n🔍 Testing competitor rollups...")
+    
+    import random
+    import statistics
+    import tempfile
+    import time
+    from datetime import datetime, timedelta
+    
+    try:
+        import competitor_rollups
+        
+        rng = random.Random(11)
+        start = datetime(2023, 1, 2)
+        stages = ['awareness', 'consideration', 'decision']
+        records = [{
+            'id': f"comp{i}",
+            'competitor_name': f"Competitor {i % 6}",
+            'timestamp': (start + timedelta(hours=rng.randrange(3 * 365 * 24))).isoformat(),
+            'funnel_analysis': {'primary_stage': rng.choice(stages)},
+            'entity_analysis': {'total_words': rng.randrange(200, 3000), 'statistics_count': rng.randrange(0, 12)},
+            'headings_count': rng.randrange(0, 10)
+        } for i in range(20000)]
+        
+        with tempfile.TemporaryDirectory() as data_dir:
+            competitor_rollups.rebuild(records[:19000], data_dir)
+            for chunk in range(19000, 20000, 250):
+                competitor_rollups.on_saved('competitor_analyses', records[chunk:chunk + 250], data_dir)
+            assert competitor_rollups.update_rollups(records[-10:], data_dir) == 0
+            incremental = competitor_rollups.load_rollups(data_dir=data_dir)
+            
+            begin = time.perf_counter()
+            rollup = competitor_rollups.load_rollups(['Competitor 1', 'Competitor 2'], data_dir=data_dir)
+            trend = competitor_rollups.weekly_trend(rollup, 'median_words')
+            elapsed = time.perf_counter() - begin
+            assert elapsed < 1.0 and list(trend.columns) == ['Competitor 1', 'Competitor 2'] and len(trend) > 150
+            print(f"  ✅ Three years of weekly trends for two competitors loaded in {elapsed * 1000:.0f} ms")
+            
+            assert competitor_rollups.counted_assets(incremental) == len(records)
+            
+            # Syncing against the stored file only adds what is missing and keeps facts saved since
+            import data_store
+            data_store.save_data('competitor_analyses', records[:50], data_dir=data_dir)
+            assert competitor_rollups.sync_rollups(data_dir) == 0
+            assert competitor_rollups.counted_assets(competitor_rollups.load_rollups(data_dir=data_dir)) == len(records)
+            competitor_rollups.rebuild(records[:19990], data_dir)
+            data_store.save_data('competitor_analyses', records, data_dir=data_dir)
+            assert competitor_rollups.sync_rollups(data_dir, batch_size=4) == 10
+            
+            competitor_rollups.rebuild(records, data_dir)
+            rebuilt = competitor_rollups.load_rollups(data_dir=data_dir)
+            columns = competitor_rollups.GROUP_COLUMNS + list(competitor_rollups.METRICS)
+            assert incremental[columns].sort_values(columns[:3], ignore_index=True).equals(
+                rebuilt[columns].sort_values(columns[:3], ignore_index=True))
+            
+            week = rebuilt['week'].iloc[0]
+            row = rebuilt[(rebuilt['week'] == week) & (rebuilt['stage'] == 'all')].iloc[0]
+            facts = competitor_rollups.facts_frame(records)
+            words = facts[(facts['week'] == week) & (facts['competitor'] == row['competitor'])]['words']
+            assert row['assets'] == len(words) and row['median_words'] == statistics.median(words)
+            print("  ✅ Incremental updates match a full rebuild, medians exact")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing competitor rollups: {str(e)}")
+        return False
+
+def test_exports():
+    """Test streaming exports of saved analyses to CSV, Parquet and Excel"""
+    print("\n🔍 Testing exports...")
+    
+    import csv
+    import tempfile
+    import tracemalloc
+    from pathlib import Path
+    
+    try:
+        import data_store
+        import exports
+        import record_schema
+        from analysis_modules import build_competitor_analysis, build_persona_analysis
+        
+        content = "Compare pricing plans and read our ROI case study. 45% of teams cut costs by $1,200. " * 20
+        # Levels as the HTML and DOCX extractors produce them
+        headings = [{'text': 'Pricing plans', 'level': 'h2'}, {'text': 'Intro', 'level': 'Heading 1'}]
+        base = [build_competitor_analysis(content, headings, f"https://acme.example/{i}", ['Acme', 'Globex'][i % 2],
+                                          ['pricing', 'roi']) for i in range(10)]
+        records = [record_schema.compact_record(dict(base[i % 10], id=f"comp{i}", timestamp=f"2026-0{1 + i % 6}-15T10:00:00"))
+                   for i in range(10000)]
+        persona = {'id': 'p1', 'name': 'CFO', 'role': 'Finance', 'pain_points': ['high costs'], 'goals': ['ROI']}
+        persona_record = record_schema.compact_record(build_persona_analysis(content, persona, 'Case Study', 'https://x'))
+        
+        with tempfile.TemporaryDirectory() as data_dir:
+            data_store.save_data('competitor_analyses', records, data_dir=data_dir)
+            data_store.save_data('persona_analyses', [persona_record], data_dir=data_dir)
+            data_store.save_data('personas', [persona], data_dir=data_dir)
+            assert list(data_store.iter_records('competitor_analyses', data_dir, read_size=1000)) == records
+            
+            out = Path(data_dir) / 'out'
+            tracemalloc.start()
+            result = exports.export_records('competitor_analyses', out / 'all.csv', 'csv',
+                                            exports.available_columns('competitor_analyses', data_dir), data_dir=data_dir,
+                                            chunk_size=500)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            size = data_store.data_path('competitor_analyses', data_dir).stat().st_size
+            assert result['success'] and result['rows'] == 10000
+            assert peak < size / 4, f"peak {peak} for a {size} byte file"
+            print(f"  ✅ 10,000 analyses ({size / 1e6:.0f} MB) exported with {peak / 1e6:.1f} MB peak memory")
+            
+            with open(out / 'all.csv', newline='') as f:
+                rows = list(csv.DictReader(f))
+            assert rows[0]['funnel_analysis.primary_stage'] == base[0]['funnel_analysis']['primary_stage']
+            assert rows[0]['keyword_analysis.keyword_analysis'].startswith('pricing (')
+            heading_cell = rows[0]['heading_analysis.heading_analysis']
+            assert heading_cell.startswith('h2 Pricing plans (') and '; Heading 1 Intro (' in heading_cell, heading_cell
+            
+            filters = {'since': '2026-02-01', 'until': '2026-04-01', 'names': ['Acme']}
+            columns = ['id', 'competitor_name', 'timestamp', 'funnel_analysis.confidence', 'heading_analysis.aligned']
+            result = exports.export_records('competitor_analyses', out / 'q1.parquet', 'parquet', columns, filters,
+                                            data_dir=data_dir, chunk_size=500)
+            import pyarrow.parquet as pq
+            table = pq.read_table(out / 'q1.parquet')
+            expected = [r for r in records if '2026-02' <= r['timestamp'] < '2026-04' and r['competitor_name'] == 'Acme']
+            assert result['rows'] == table.num_rows == len(expected) and table.column_names == columns
+            assert str(table.schema.field('funnel_analysis.confidence').type) == 'double'
+            assert str(table.schema.field('heading_analysis.aligned').type) == 'bool'
+            print("  ✅ Column selection, filters and typed Parquet columns")
+            
+            result = exports.export_records('persona_analyses', out / 'personas.xlsx', 'xlsx', data_dir=data_dir)
+            from openpyxl import load_workbook
+            sheet = load_workbook(out / 'personas.xlsx', read_only=True).active
+            sheet_rows = list(sheet.values)
+            assert result['rows'] == 1 and 'persona.name' in sheet_rows[0]
+            assert sheet_rows[1][sheet_rows[0].index('persona.name')] == 'CFO'
+            assert 'persona.name' in exports.available_columns('persona_analyses', data_dir)
+            
+            assert not exports.export_records('analyses', out / 'x.json', 'json', data_dir=data_dir)['success']
+            print("  ✅ Excel export of persona analyses, unsupported formats rejected")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing exports: {str(e)}")
+        return False
+
+def test_analysis_api():
+    """Test the HTTP analysis API with micro-batching and timeouts"""
+    print("\n🔍 Testing analysis API...")
+    
+    import json
+    import tempfile
+    import threading
+    import time
+    import urllib.error
+    import urllib.request
+    from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+    from pathlib import Path
+    
+    import data_store
+    import resources
+    original_dir = data_store.DATA_DIR
+    try:
+        import analysis_api
+        from job_queue import wait_for
+        
+        with tempfile.TemporaryDirectory() as data_dir:
+            data_store.DATA_DIR = Path(data_dir)
+            resources.clear_resources('search_index')
+            data_store.save_data('personas', [{'id': 'p1', 'name': 'CFO', 'role': 'Finance',
+                                               'pain_points': ['high costs'], 'goals': ['ROI']}])
+            server = analysis_api.create_server(port=0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            
+            def call(method, path, body=None):
+                request = urllib.request.Request(f"http://127.0.0.1:{server.server_port}{path}", method=method,
+                                                 data=json.dumps(body).encode() if body is not None else None)
+                try:
+                    with urllib.request.urlopen(request, timeout=30) as response:
+                        return response.status, json.loads(response.read())
+                except urllib.error.HTTPError as e:
+                    return e.code, json.loads(e.read())
+            
+            content = "Compare pricing plans and book a demo. Our ROI case study shows 45% lower costs. " * 20
+            status, record = call('POST', '/analyze', {'content': content, 'target_keywords': ['pricing'], 'headings': [
+                'Pricing plans', {'text': 'Pricing FAQ', 'level': 'h3'}, {'text': 'Intro', 'level': 'Heading 1'},
+                {'text': 'Pricing demo', 'level': 4}]})
+            assert status == 200 and record['funnel_analysis']['primary_stage'] == 'decision'
+            # Levels are stored the way the extractors give them, so saved records display like any other
+            assert [h['level'] for h in record['heading_analysis']['heading_analysis']] == ['h2', 'h3', 'Heading 1', 'h4']
+            assert set(record) >= {'id', 'timestamp', 'source', 'entity_analysis', 'heading_analysis',
+                                   'keyword_analysis', 'target_keywords', 'analyzers'}
+            assert call('POST', '/analyze', {'content': ' '})[0] == 400
+            assert call('POST', '/analyze', {'content': content, 'headings': 'Pricing plans'}) == \
+                (400, {'success': False, 'error': "headings must be a list"})
+            assert call('POST', '/analyze', {'content': content, 'type': 'persona', 'persona': 'Nobody'})[0] == 400
+            
+            status, batch = call('POST', '/analyze/batch', {'items': [
+                {'content': content, 'type': 'competitor', 'competitor_name': 'Acme', 'save': True},
+                {'content': content, 'type': 'persona', 'persona': 'CFO', 'save': True},
+                {'content': content, 'type': 'competitor'}
+            ]})
+            results = batch['results']
+            assert status == 200 and results[0]['competitor_name'] == 'Acme' and results[1]['persona']['name'] == 'CFO'
+            assert results[2] == {'success': False, 'error': "competitor_name is required for competitor analyses"}
+            assert len(data_store.load_data('competitor_analyses')) == 1 and len(data_store.load_data('persona_analyses')) == 1
+            print("  ✅ Single and batch analyses return saved-record JSON; save stores them")
+            
+            status, job = call('POST', '/jobs', {'items': [{'content': content}] * 40})
+            assert status == 202 and wait_for(job['job_id'], timeout=30)['status'] == 'completed'
+            status, job = call('GET', job['status_url'])
+            assert status == 200 and len(job['results']) == 40 and call('GET', '/jobs/0000')[0] == 404
+            
+            begin = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=32) as clients:
+                statuses = list(clients.map(lambda i: call('POST', '/analyze', {'content': f"{content} {i}"})[0], range(300)))
+            elapsed = time.perf_counter() - begin
+            assert statuses == [200] * 300 and server.batcher.batches < 300
+            print(f"  ✅ 300 concurrent requests in {elapsed:.2f}s, micro-batched into {server.batcher.batches} batches")
+            server.shutdown()
+            server.server_close()
+        
+        ran = []
+        def slow_handler(items):
+            ran.extend(items)
+            time.sleep(0.3)
+            return items
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            batcher = analysis_api.MicroBatcher(slow_handler, window=0.001, max_batch=1, max_pending=2, pool=pool)
+            first = batcher.submit('first')
+            time.sleep(0.05)
+            second = batcher.submit('second')
+            try:
+                batcher.submit('third')
+                assert False, "a full batcher should refuse more requests"
+            except analysis_api.Overloaded:
+                pass
+            try:
+                analysis_api.wait_all([second], timeout=0.1)
+                assert False, "the request should have timed out"
+            except FutureTimeout:
+                pass
+            assert first.result(timeout=5) == 'first'
+            time.sleep(0.1)
+            assert ran == ['first'] and second.cancelled()
+        print("  ✅ Timed-out requests are cancelled before running; overload is refused")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Error testing analysis API: {str(e)}")
+        return False
+    finally:
+        data_store.DATA_DIR = original_dir
+        resources.clear_resources('search_index')
+
 def run_all_tests():
     """Run all tests"""
     print("=" * 60)
@@ -155,6 +1835,31 @@ def run_all_tests():
     results.append(("File Check", check_files()))
     results.append(("Data Directory", test_data_directory()))
     results.append(("Function Tests", test_basic_functions()))
+    results.append(("Batch Jobs", test_batch_jobs()))
+    results.append(("Job Queue", test_job_queue()))
+    results.append(("Bulk Upload", test_bulk_upload()))
+    results.append(("URL Extraction", test_url_extraction()))
+    results.append(("DOCX Extraction", test_docx_extraction()))
+    results.append(("Benchmark Suite", test_benchmark_suite()))
+    results.append(("Stage Metrics", test_metrics()))
+    results.append(("Profiling", test_profiling()))
+    results.append(("Import Time", test_import_time()))
+    results.append(("Shared Resources", test_shared_resources()))
+    results.append(("LLM Map-Reduce", test_llm_map_reduce()))
+    results.append(("LLM Response Cache", test_llm_cache()))
+    results.append(("LLM Token Budget", test_llm_budget()))
+    results.append(("Normalized Records", test_record_schema()))
+    results.append(("Full-Text Search", test_search_index()))
+    results.append(("Site Crawler", test_site_crawler()))
+    results.append(("Tracked URLs", test_tracked_urls()))
+    results.append(("Persona Import", test_persona_import()))
+    results.append(("Funnel Classifier", test_funnel_classifier()))
+    results.append(("Topic Clusters", test_topic_clusters()))
+    results.append(("Keyword Discovery", test_keyword_discovery()))
+    results.append(("Selective Recompute", test_recompute()))
+    results.append(("Competitor Rollups", test_competitor_rollups()))
+    results.append(("Exports", test_exports()))
+    results.append(("Analysis API", test_analysis_api()))
     
     # Summary
     print("\n" + "=" * 60)
@@ -0,0 +1,394 @@
+"""
+Topic clustering of the content library with mini-batch k-means
+
+Every saved analysis (own, competitor and persona) is turned into a hashed
+TF-IDF vector and grouped by spherical mini-batch k-means. Documents are read
+from the content store and vectorized one batch at a time, so memory depends
+on the batch size and the number of clusters, never on the library size.
+Clusters are named by the top terms of their centroids. Newly saved analyses
+are assigned to the nearest cluster and fold into its centroid without a
+refit; run 'build' again to re-cluster from scratch.
+
+    python topic_clusters.py build --clusters 12
+    python topic_clusters.py update
+    python topic_clusters.py show
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import content_store
+import data_store
+import funnel_classifier
+import resources
+from lazy_imports import lazy_module
+from search_index import RECORD_TYPES, record_key
+
+np = lazy_module('numpy')
+
+MODEL_FILE_NAME = 'topic_clusters.npz'
+# Hash buckets for word features; centroids are dense over these, so keep it modest
+N_FEATURES = 2 ** 16
+DEFAULT_CLUSTERS = 12
+BATCH_SIZE = 1000
+DEFAULT_EPOCHS = 2
+TOP_TERMS = 5
+# Documents with no usable words are not assigned to any cluster
+UNCLUSTERED = -1
+NO_PERSONA = '(no persona)'
+
+STOP_WORDS = frozenset("""
+about above after again against all also among and any are because been before being below between both but
+can could did does doing down during each every few for from further had has have having her here hers him his
+how into its itself just more most much must not now off once only other our ours out over own same she should
+some such than that the their theirs them then there these they this those through too under until upon very
+was were what when where which while who whom why will with would you your yours
+""".split())
+
+_WORD_PATTERN = re.compile(r"[a-z][a-z0-9']+")
+_model_lock = threading.RLock()
+
+
+def words(text):
+    """Lowercased content words of a document: no stop words or words under three letters"""
+    return [w for w in _WORD_PATTERN.findall(text.lower()) if len(w) > 2 and w not in STOP_WORDS]
+
+
+def model_path(data_dir=None):
+    return Path(data_dir or data_store.DATA_DIR) / MODEL_FILE_NAME
+
+
+def record_text(record, data_dir=None):
+    """Full stored text of a record, or its preview if the full text was never stored"""
+    text = content_store.get(record['content_hash'], data_dir) if record.get('content_hash') else None
+    return text if text is not None else record.get('content_preview', '')
+
+
+class TopicModel:
+    """Spherical mini-batch k-means over hashed TF-IDF vectors"""
+
+    def __init__(self, n_clusters=DEFAULT_CLUSTERS, n_features=N_FEATURES, seed=0):
+        self.n_clusters = n_clusters
+        self.n_features = n_features
+        self.seed = seed
+        self.centroids = None
+        self.counts = np.zeros(n_clusters, dtype=np.int64)
+        self.doc_freq = np.zeros(n_features, dtype=np.int64)
+        self.n_docs = 0
+        self.bucket_terms = {}
+        # record key -> cluster
+        self.assignments = {}
+        self.built_at = None
+
+    def _hashed(self, texts):
+        return funnel_classifier.featurize(texts, self.n_features, analyzer=words, bucket_terms=self.bucket_terms)
+
+    def _count_terms(self, buckets, n_docs):
+        self.doc_freq += np.bincount(buckets, minlength=self.n_features)
+        self.n_docs += n_docs
+
+    def count_terms(self, texts):
+        """Add a batch to the document frequencies that weight terms by rarity"""
+        self._count_terms(self._hashed(texts)[1], len(texts))
+
+    def vectorize(self, texts, update_doc_freq=False):
+        """Unit-length TF-IDF vectors as sparse (doc index, bucket, weight) arrays"""
+        doc_ids, buckets, counts = self._hashed(texts)
+        if update_doc_freq:
+            self._count_terms(buckets, len(texts))
+        idf = np.log((1 + self.n_docs) / (1 + self.doc_freq[buckets])) + 1
+        weights = (1 + np.log(counts)) * idf
+        norms = np.sqrt(np.bincount(doc_ids, weights=weights ** 2, minlength=len(texts)))
+        return doc_ids, buckets, weights / norms[doc_ids]
+
+    def _similarities(self, vectors, n_docs):
+        doc_ids, buckets, weights = vectors
+        norms = np.linalg.norm(self.centroids, axis=1, keepdims=True)
+        unit = self.centroids / np.where(norms > 0, norms, 1)
+        similarities = np.zeros((n_docs, len(self.centroids)))
+        np.add.at(similarities, doc_ids, unit[:, buckets].T * weights[:, None])
+        return similarities
+
+    def _seed_centroids(self, vectors, n_docs):
+        """k-means++ seeding from the documents of the first batch"""
+        doc_ids, buckets, weights = vectors
+        rng = np.random.default_rng(self.seed)
+        candidates = np.unique(doc_ids)
+        k = min(self.n_clusters, len(candidates))
+        chosen = [int(rng.choice(candidates))]
+        closest = np.full(n_docs, -np.inf)
+        for _ in range(k):
+            row = np.zeros(self.n_features)
+            mask = doc_ids == chosen[-1]
+            row[buckets[mask]] = weights[mask]
+            closest = np.maximum(closest, np.bincount(doc_ids, weights=weights * row[buckets], minlength=n_docs))
+            if len(chosen) == k:
+                break
+            distance = np.clip(1 - closest[candidates], 0, None)
+            if distance.sum() == 0:
+                break
+            chosen.append(int(rng.choice(candidates, p=distance / distance.sum())))
+
+        self.centroids = np.zeros((self.n_clusters, self.n_features), dtype=np.float32)
+        for cluster, doc in enumerate(chosen):
+            mask = doc_ids == doc
+            self.centroids[cluster, buckets[mask]] = weights[mask]
+        self.n_clusters = len(chosen)
+        self.centroids = self.centroids[:self.n_clusters]
+        self.counts = np.zeros(self.n_clusters, dtype=np.int64)
+
+    def assign(self, texts):
+        """Nearest cluster of each document (UNCLUSTERED for documents without words)"""
+        vectors = self.vectorize(texts)
+        if self.centroids is None:
+            return np.full(len(texts), UNCLUSTERED)
+        return self._assign(vectors, len(texts))
+
+    def _assign(self, vectors, n_docs):
+        clusters = self._similarities(vectors, n_docs).argmax(axis=1)
+        has_words = np.bincount(vectors[0], minlength=n_docs) > 0
+        return np.where(has_words, clusters, UNCLUSTERED)
+
+    def partial_fit(self, texts, update_doc_freq=True):
+        """Assign a batch and move each centroid towards the mean of its new members; returns the clusters"""
+        vectors = self.vectorize(texts, update_doc_freq)
+        if self.centroids is None:
+            if len(vectors[0]) == 0:
+                return np.full(len(texts), UNCLUSTERED)
+            self._seed_centroids(vectors, len(texts))
+        clusters = self._assign(vectors, len(texts))
+
+        doc_ids, buckets, weights = vectors
+        member_clusters = clusters[doc_ids]
+        sums = np.zeros(self.centroids.shape)
+        np.add.at(sums, (member_clusters, buckets), weights)
+        batch_counts = np.bincount(clusters[clusters != UNCLUSTERED], minlength=self.n_clusters)
+        updated = batch_counts > 0
+        # Per-cluster learning rate 1/count: each centroid is the running mean of every document it absorbed
+        totals = self.counts[updated] + batch_counts[updated]
+        self.centroids[updated] = (self.centroids[updated] * self.counts[updated, None] + sums[updated]) / totals[:, None]
+        self.counts += batch_counts
+        return clusters
+
+    def top_terms(self, n_terms=TOP_TERMS):
+        """The highest-weighted terms of each centroid"""
+        if self.centroids is None:
+            return []
+        top = np.argsort(-self.centroids, axis=1)[:, :n_terms]
+        return [[self.bucket_terms.get(int(b), f"#{b}") for b in row if self.centroids[i, b] > 0]
+                for i, row in enumerate(top)]
+
+    def labels(self, n_terms=TOP_TERMS):
+        return [', '.join(terms) or f"Cluster {i + 1}" for i, terms in enumerate(self.top_terms(n_terms))]
+
+    def save(self, path):
+        """Write the model atomically as an .npz artifact"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Only the terms of buckets some centroid uses are worth keeping
+        used = np.flatnonzero(self.centroids.any(axis=0)) if self.centroids is not None else []
+        named = [int(b) for b in used if int(b) in self.bucket_terms]
+        meta = {'n_clusters': self.n_clusters, 'n_features': self.n_features, 'seed': self.seed,
+                'n_docs': self.n_docs, 'built_at': self.built_at}
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                centroids=self.centroids if self.centroids is not None else np.zeros((0, self.n_features), np.float32),
+                counts=self.counts,
+                doc_freq=self.doc_freq,
+                term_buckets=np.array(named, dtype=np.int64),
+                terms=np.array([self.bucket_terms[b] for b in named], dtype=str),
+                record_keys=np.array(list(self.assignments), dtype=str),
+                record_clusters=np.array(list(self.assignments.values()), dtype=np.int64),
+                meta=np.array(json.dumps(meta))
+            )
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Load a saved model, or None if none has been built"""
+        path = Path(path)
+        if not path.exists():
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            model = cls(meta['n_clusters'], meta['n_features'], meta['seed'])
+            model.centroids = data['centroids'] if len(data['centroids']) else None
+            model.counts = data['counts']
+            model.doc_freq = data['doc_freq']
+            model.n_docs = meta['n_docs']
+            model.built_at = meta['built_at']
+            model.bucket_terms = dict(zip(data['term_buckets'].tolist(), data['terms'].tolist()))
+            model.assignments = dict(zip(data['record_keys'].tolist(), data['record_clusters'].tolist()))
+        return model
+
+
+def stored_records(data_dir=None):
+    """(data type, record) pairs of every saved analysis, rebuilt to their full form"""
+    import record_schema
+
+    personas = data_store.load_data('personas', default=[], data_dir=data_dir)
+    return [(data_type, record)
+            for data_type in RECORD_TYPES
+            for record in record_schema.expand_records(data_store.load_data(data_type, default=[], data_dir=data_dir),
+                                                       personas)]
+
+
+def _batches(items, batch_size):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def build_clusters(n_clusters=DEFAULT_CLUSTERS, epochs=DEFAULT_EPOCHS, records=None, data_dir=None,
+                   batch_size=BATCH_SIZE, on_progress=None):
+    """Cluster the whole library from scratch and save the model; returns it
+
+    One pass counts document frequencies, then each epoch streams shuffled
+    batches through mini-batch k-means and a last pass assigns every record.
+    """
+    records = stored_records(data_dir) if records is None else records
+    items = [r for _, r in records]
+    model = TopicModel(n_clusters)
+    passes = epochs + 2
+    done = 0
+
+    def batch_texts(batch):
+        nonlocal done
+        done += len(batch)
+        if on_progress:
+            on_progress(done, passes * len(items))
+        return [record_text(r, data_dir) for r in batch]
+
+    for batch in _batches(items, batch_size):
+        model.count_terms(batch_texts(batch))
+    order = list(items)
+    for epoch in range(epochs):
+        random.Random(epoch).shuffle(order)
+        for batch in _batches(order, batch_size):
+            model.partial_fit(batch_texts(batch), update_doc_freq=False)
+    for batch in _batches(items, batch_size):
+        clusters = model.assign(batch_texts(batch))
+        model.assignments.update(zip((record_key(r) for r in batch), clusters.tolist()))
+
+    model.built_at = datetime.now().isoformat()
+    with _model_lock:
+        model.save(model_path(data_dir))
+    return model
+
+
+def update_clusters(records=None, data_dir=None, batch_size=BATCH_SIZE, on_progress=None):
+    """Fold records the model has not seen into their nearest clusters; returns how many were added
+
+    Builds the model first if there is none yet.
+    """
+    records = stored_records(data_dir) if records is None else records
+    with _model_lock:
+        model = TopicModel.load(model_path(data_dir))
+        if model is None or model.centroids is None:
+            model = build_clusters(records=records, data_dir=data_dir, batch_size=batch_size, on_progress=on_progress)
+            return len(model.assignments)
+
+        new_records = [r for _, r in records if record_key(r) not in model.assignments]
+        for done, batch in enumerate(_batches(new_records, batch_size), start=1):
+            clusters = model.partial_fit([record_text(r, data_dir) for r in batch])
+            model.assignments.update(zip((record_key(r) for r in batch), clusters.tolist()))
+            if on_progress:
+                on_progress(min(done * batch_size, len(new_records)), len(new_records))
+        if new_records:
+            model.save(model_path(data_dir))
+        return len(new_records)
+
+
+def load_clusters(data_dir=None):
+    """The saved model, cached until it is rebuilt or updated; None if none has been built"""
+    path = model_path(data_dir)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return resources.topic_model(str(path), stat.st_mtime_ns)
+
+
+def unclustered_count(model, records):
+    """How many records the model has not assigned yet"""
+    return sum(1 for _, r in records if record_key(r) not in model.assignments)
+
+
+def _persona_and_stage(data_type, record):
+    if data_type == 'persona_analyses':
+        return (record.get('persona') or {}).get('name', NO_PERSONA), record.get('funnel_stage')
+    return NO_PERSONA, (record.get('funnel_analysis') or {}).get('primary_stage')
+
+
+def cluster_coverage(model, records):
+    """Per cluster: its label, size, record count per type and persona x funnel stage counts of our own content
+
+    Competitor records count towards 'competitor_assets' only, so a cluster
+    where competitors publish and we don't stands out. Largest clusters first.
+    """
+    labels = model.labels()
+    clusters = [{'cluster': i, 'label': label, 'size': 0, 'by_type': {}, 'competitor_assets': 0, 'coverage': {}}
+                for i, label in enumerate(labels)]
+    for data_type, record in records:
+        cluster = model.assignments.get(record_key(record), UNCLUSTERED)
+        if cluster == UNCLUSTERED or cluster >= len(clusters):
+            continue
+        entry = clusters[cluster]
+        entry['size'] += 1
+        entry['by_type'][data_type] = entry['by_type'].get(data_type, 0) + 1
+        if data_type == 'competitor_analyses':
+            entry['competitor_assets'] += 1
+            continue
+        persona, stage = _persona_and_stage(data_type, record)
+        stages = entry['coverage'].setdefault(persona, {})
+        stages[stage] = stages.get(stage, 0) + 1
+    return sorted((c for c in clusters if c['size']), key=lambda c: -c['size'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Topic clusters of the content library")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="Cluster every saved analysis from scratch")
+    build_parser.add_argument('--clusters', type=int, default=DEFAULT_CLUSTERS)
+    build_parser.add_argument('--epochs', type=int, default=DEFAULT_EPOCHS)
+    build_parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    update_parser = subparsers.add_parser('update', help="Assign analyses saved since the last build or update")
+    show_parser = subparsers.add_parser('show', help="List clusters with their coverage")
+    for sub in (build_parser, update_parser, show_parser):
+        sub.add_argument('--data-dir')
+    args = parser.parse_args(argv)
+
+    def progress(done, total):
+        print(f"\r  {done:,}/{total:,}", end='', flush=True)
+
+    records = stored_records(args.data_dir)
+    if args.command == 'build':
+        model = build_clusters(args.clusters, args.epochs, records, args.data_dir, args.batch_size, progress)
+        print(f"\n🗂️ Clustered {len(model.assignments):,} records into {model.n_clusters} topics")
+    elif args.command == 'update':
+        added = update_clusters(records, args.data_dir, on_progress=progress)
+        print(f"\n🗂️ Assigned {added:,} new record(s)")
+
+    model = TopicModel.load(model_path(args.data_dir))
+    if model is None:
+        print("No topic clusters yet; run 'python topic_clusters.py build' first")
+        return 1
+    for cluster in cluster_coverage(model, records):
+        own = sum(n for stages in cluster['coverage'].values() for n in stages.values())
+        print(f"{cluster['size']:>7,}  {cluster['label']}  (own {own:,}, competitor {cluster['competitor_assets']:,})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,427 @@
+"""
+Tracked URLs: scheduled re-fetching with change detection and version history
+
+Tracked pages are re-fetched when due, with conditional requests
+(If-None-Match / If-Modified-Since) so unchanged pages usually cost no body
+download. A page is only re-analyzed when the fingerprint of its normalized
+text changes; case, whitespace and volatile dates or times do not count as
+changes. Each change is kept as a version in analyzer_data/tracked/<id>.json
+with the sections that were added, removed or modified since the previous one.
+
+Run the check from cron or a scheduler, e.g. hourly:
+    python tracked_urls.py add https://competitor.com/pricing --competitor "Competitor Inc." --every 24
+    python tracked_urls.py check
+    python tracked_urls.py history https://competitor.com/pricing
+"""
+
+import argparse
+import difflib
+import hashlib
+import re
+import sys
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+import content_store
+import data_store
+import llm_analysis
+import record_store
+import site_crawler
+
+REGISTRY_KEY = 'tracked_urls'
+DEFAULT_INTERVAL_HOURS = 24
+# Failed fetches are retried sooner than the regular interval
+FAILED_RETRY_HOURS = 1
+DEFAULT_CONCURRENCY = 4
+# Older versions beyond this are dropped from a URL's history
+MAX_VERSIONS = 52
+MAX_DIFF_LINES = 40
+# Entry fields a check updates; the others are settings that may be edited while it runs
+CHECK_FIELDS = ('next_check', 'last_checked', 'last_changed', 'last_status', 'last_error', 'etag', 'last_modified',
+                'fingerprint', 'versions')
+
+# Check outcomes
+NEW = 'new'
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+NOT_MODIFIED = 'not_modified'
+FAILED = 'failed'
+
+# Dates, times and relative ages that change on every render without the page changing
+_VOLATILE_PATTERN = re.compile(
+    r'\b\d{4}-\d{2}-\d{2}(?:t[\d:.]+z?)?'
+    r'|\b\d{1,2}:\d{2}(?::\d{2})?(?:\s*[ap]m\b)?'
+    r'|\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.? \d{1,2}(?:st|nd|rd|th)?,? \d{4}\b'
+    r'|\b\d+ (?:second|minute|hour|day|week|month|year)s? ago\b'
+    r'|©\s*\d{4}(?:\s*[-–]\s*\d{4})?'
+)
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+
+
+def _versions_key(entry_id):
+    return f"tracked/{entry_id}"
+
+
+def normalize_text(text):
+    """Casefold text, drop volatile dates and times and collapse whitespace"""
+    return ' '.join(_VOLATILE_PATTERN.sub(' ', text.casefold()).split())
+
+
+def fingerprint(text):
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+def content_sections(content, headings):
+    """The page's heading sections with the fingerprint of each: [{'title', 'start', 'end', 'fingerprint'}]"""
+    return [
+        {'title': title, 'start': start, 'end': end, 'fingerprint': fingerprint(content[start:end])}
+        for title, start, end in llm_analysis.heading_sections(content, headings)
+    ]
+
+
+def _section_keys(sections):
+    """Key sections by title and occurrence so repeated titles (e.g. several 'Learn more') pair up in order"""
+    seen = Counter()
+    keys = []
+    for section in sections:
+        keys.append((section['title'], seen[section['title']]))
+        seen[section['title']] += 1
+    return keys
+
+
+def _sentence_diff(old_text, new_text):
+    """Removed (-) and added (+) sentences between two versions of a section"""
+    lines = [
+        line for line in difflib.unified_diff(
+            _SENTENCE_BREAK.split(old_text.strip()), _SENTENCE_BREAK.split(new_text.strip()), lineterm='', n=0
+        )
+        if not line.startswith(('---', '+++', '@@'))
+    ]
+    if len(lines) > MAX_DIFF_LINES:
+        lines = lines[:MAX_DIFF_LINES] + [f"… {len(lines) - MAX_DIFF_LINES} more lines"]
+    return lines
+
+
+def diff_sections(old_sections, old_content, new_sections, new_content):
+    """Sections added, removed and modified between two versions, with a sentence diff per modified section
+
+    old_content may be None when the previous text is no longer stored; the
+    modified sections are still listed, without a diff.
+    """
+    old = dict(zip(_section_keys(old_sections), old_sections))
+    new = dict(zip(_section_keys(new_sections), new_sections))
+    changes = {'added': [], 'removed': [], 'modified': []}
+    for key, section in new.items():
+        before = old.get(key)
+        if before is None:
+            changes['added'].append(section['title'])
+        elif before['fingerprint'] != section['fingerprint']:
+            diff = []
+            if old_content is not None:
+                diff = _sentence_diff(old_content[before['start']:before['end']],
+                                      new_content[section['start']:section['end']])
+            changes['modified'].append({'title': section['title'], 'diff': diff})
+    changes['removed'] = [section['title'] for key, section in old.items() if key not in new]
+    return changes
+
+
+def describe_changes(changes):
+    """One-line summary of a version's section changes"""
+    if changes is None:
+        return "First version"
+    parts = [f"{len(changes[kind])} {kind}" for kind in ('modified', 'added', 'removed') if changes[kind]]
+    return f"Sections: {', '.join(parts)}" if parts else "Text outside sections changed"
+
+
+def load_registry(data_dir=None):
+    return data_store.load_data(REGISTRY_KEY, default=[], data_dir=data_dir)
+
+
+def load_versions(entry_id, data_dir=None):
+    return data_store.load_data(_versions_key(entry_id), default=[], data_dir=data_dir)
+
+
+def find_entry(url, data_dir=None):
+    canonical = site_crawler.canonicalize_url(url)
+    return next((entry for entry in load_registry(data_dir) if entry['url'] == canonical), None)
+
+
+def track_url(url, kind='own', competitor_name='', target_keywords=(), interval_hours=DEFAULT_INTERVAL_HOURS,
+              data_dir=None):
+    """Add a URL to the registry, or update the settings of an already tracked one; returns its entry"""
+    canonical = site_crawler.canonicalize_url(url)
+    if canonical is None:
+        raise ValueError(f"Not a web address: {url}")
+
+    with data_store._store_lock:
+        registry = load_registry(data_dir)
+        entry = next((e for e in registry if e['url'] == canonical), None)
+        if entry is None:
+            entry = {
+                'id': uuid.uuid4().hex[:12],
+                'url': canonical,
+                'added_at': datetime.now().isoformat(),
+                'next_check': datetime.now().isoformat(),
+                'last_checked': None,
+                'last_changed': None,
+                'last_status': None,
+                'last_error': None,
+                'etag': None,
+                'last_modified': None,
+                'fingerprint': None,
+                'versions': 0
+            }
+            registry.append(entry)
+        entry.update(kind=kind, competitor_name=competitor_name, target_keywords=list(target_keywords),
+                     interval_hours=interval_hours)
+        data_store.save_data(REGISTRY_KEY, registry, data_dir=data_dir)
+    return entry
+
+
+def untrack_url(url, data_dir=None):
+    """Remove a URL and its version history; returns True if it was tracked"""
+    canonical = site_crawler.canonicalize_url(url)
+    with data_store._store_lock:
+        registry = load_registry(data_dir)
+        remaining = [e for e in registry if e['url'] != canonical]
+        if len(remaining) == len(registry):
+            return False
+        data_store.save_data(REGISTRY_KEY, remaining, data_dir=data_dir)
+        for entry in registry:
+            if entry['url'] == canonical:
+                data_store.delete_data(_versions_key(entry['id']), data_dir=data_dir)
+    return True
+
+
+def is_due(entry, now):
+    return not entry.get('next_check') or entry['next_check'] <= now.isoformat()
+
+
+def _conditional_headers(entry):
+    """Validators from the last fetch; only sent once there is a version to compare against"""
+    headers = {}
+    if entry.get('fingerprint'):
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+def fetch_url(url, headers):
+    from analysis_modules import extract_content_from_url
+    return extract_content_from_url(url, headers=headers)
+
+
+def analyze_entry(entry, content, headings):
+    """Run the analyzers a tracked URL was registered with"""
+    import batch_jobs
+
+    item = {'source': entry['url'], 'kind': entry['kind'], 'competitor_name': entry['competitor_name'],
+            'target_keywords': entry['target_keywords']}
+    return batch_jobs.analyze_item(item, content, headings)
+
+
+def _apply_fetch(entry, page, now, analyze, data_dir):
+    """Update an entry from one fetch; returns (status, new record or None, new version or None)
+
+    The new version is not saved here; check_urls writes it after the record and the registry.
+    """
+    entry['last_checked'] = now.isoformat()
+    entry['next_check'] = (now + timedelta(hours=entry['interval_hours'])).isoformat()
+    entry['last_error'] = None
+
+    if not page['success']:
+        entry['last_error'] = page['error']
+        entry['next_check'] = (now + timedelta(hours=min(entry['interval_hours'], FAILED_RETRY_HOURS))).isoformat()
+        return FAILED, None, None
+    if page.get('not_modified'):
+        return NOT_MODIFIED, None, None
+
+    entry['etag'] = page.get('etag')
+    entry['last_modified'] = page.get('last_modified')
+    content_fingerprint = fingerprint(page['content'])
+    if content_fingerprint == entry['fingerprint']:
+        return UNCHANGED, None, None
+
+    sections = content_sections(page['content'], page['headings'])
+    versions = load_versions(entry['id'], data_dir)
+    changes = None
+    if versions:
+        previous = versions[-1]
+        changes = diff_sections(previous['sections'], content_store.get(previous['content_hash'], data_dir),
+                                sections, page['content'])
+
+    record = analyze(entry, page['content'], page['headings'])
+    record['tracked_url_id'] = entry['id']
+    record['version'] = entry['versions'] + 1
+    version = {
+        'version': record['version'],
+        'fetched_at': now.isoformat(),
+        'fingerprint': content_fingerprint,
+        'content_hash': content_store.put(page['content'], data_dir),
+        'record_id': record['id'],
+        'sections': sections,
+        'changes': changes
+    }
+
+    status = CHANGED if entry['fingerprint'] else NEW
+    entry['fingerprint'] = content_fingerprint
+    entry['versions'] = record['version']
+    entry['last_changed'] = now.isoformat()
+    return status, record, version
+
+
+def _save_entries(entries, data_dir=None):
+    """Write checked entries' check fields back; returns the ids still tracked
+
+    The registry is re-read under the store lock so URLs added or removed and
+    settings changed while the check ran are kept.
+    """
+    by_id = {entry['id']: entry for entry in entries}
+    with data_store._store_lock:
+        registry = load_registry(data_dir)
+        for entry in registry:
+            if entry['id'] in by_id:
+                entry.update({field: by_id[entry['id']][field] for field in CHECK_FIELDS})
+        data_store.save_data(REGISTRY_KEY, registry, data_dir=data_dir)
+    return {entry['id'] for entry in registry}
+
+
+def _save_version(entry_id, version, data_dir=None):
+    """Append a version to a URL's history, replacing one with the same number left by an interrupted check"""
+    with data_store._store_lock:
+        versions = [v for v in load_versions(entry_id, data_dir) if v['version'] != version['version']]
+        data_store.save_data(_versions_key(entry_id), (versions + [version])[-MAX_VERSIONS:], data_dir=data_dir)
+
+
+def _data_type(entry):
+    return 'competitor_analyses' if entry['kind'] == 'competitor' else 'analyses'
+
+
+def _save_records(pending, data_dir=None):
+    """Append re-analyzed records to their data files, the search index and the competitor rollups"""
+    for data_type, records in pending.items():
+        record_store.store_records(data_type, records, data_dir)
+
+
+def check_urls(force=False, kind=None, fetch=fetch_url, analyze=analyze_entry, concurrency=DEFAULT_CONCURRENCY,
+               delay=site_crawler.DEFAULT_DELAY, data_dir=None, on_progress=None, now=None):
+    """Re-fetch due tracked URLs (all of them with force) and re-analyze those whose content changed
+
+    Fetches run concurrently, spaced out per host; analysis and storage run
+    on the calling thread. Returns {'counts': {status: n}, 'rows': [...],
+    'records': [...]} where records are the new analyses, already saved.
+    """
+    now = now or datetime.now()
+    entries = [
+        entry for entry in load_registry(data_dir)
+        if (kind is None or entry['kind'] == kind) and (force or is_due(entry, now))
+    ]
+    throttle = site_crawler.HostThrottle()
+
+    def fetch_entry(entry):
+        throttle.wait(urlsplit(entry['url']).netloc, delay)
+        return fetch(entry['url'], _conditional_headers(entry))
+
+    counts = Counter()
+    rows = []
+    pending = {'analyses': [], 'competitor_analyses': []}
+    new_versions = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='tracked-fetch') as pool:
+        futures = {pool.submit(fetch_entry, entry): entry for entry in entries}
+        for done, future in enumerate(as_completed(futures), 1):
+            entry = futures[future]
+            try:
+                page = future.result()
+            except Exception as e:
+                page = {'success': False, 'error': str(e)}
+            try:
+                status, record, version = _apply_fetch(entry, page, now, analyze, data_dir)
+            except Exception as e:
+                entry['last_error'] = str(e)
+                status, record, version = FAILED, None, None
+            entry['last_status'] = status
+            counts[status] += 1
+            if record is not None:
+                pending[_data_type(entry)].append(record)
+                new_versions.append((entry['id'], version))
+            rows.append({
+                'url': entry['url'],
+                'status': status,
+                'version': entry['versions'],
+                'changes': describe_changes(version['changes']) if version else '',
+                'error': entry['last_error'] or ''
+            })
+            if on_progress:
+                on_progress(done, len(entries))
+
+    # Versions are written last, so a crash never leaves a version the registry has not counted; the
+    # next check would number its change the same and both would end up in the history
+    _save_records(pending, data_dir)
+    tracked = _save_entries(entries, data_dir)
+    for entry_id, version in new_versions:
+        if entry_id in tracked:
+            _save_version(entry_id, version, data_dir)
+    return {'counts': dict(counts), 'rows': rows, 'records': pending['analyses'] + pending['competitor_analyses']}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tracked URLs with change detection")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add_parser = subparsers.add_parser('add', help="Track a URL")
+    add_parser.add_argument('url')
+    add_parser.add_argument('--competitor', help="Analyze as this competitor's page")
+    add_parser.add_argument('--keyword', action='append', default=[], help="Keyword to analyze (repeatable)")
+    add_parser.add_argument('--every', type=float, default=DEFAULT_INTERVAL_HOURS, help="Hours between checks")
+
+    remove_parser = subparsers.add_parser('remove', help="Stop tracking a URL and drop its history")
+    remove_parser.add_argument('url')
+
+    list_parser = subparsers.add_parser('list', help="Show tracked URLs")
+
+    check_parser = subparsers.add_parser('check', help="Re-fetch due URLs and re-analyze changed ones")
+    check_parser.add_argument('--all', action='store_true', help="Check every URL, due or not")
+
+    history_parser = subparsers.add_parser('history', help="Show a URL's versions and section changes")
+    history_parser.add_argument('url')
+
+    for sub in (add_parser, remove_parser, list_parser, check_parser, history_parser):
+        sub.add_argument('--data-dir')
+    args = parser.parse_args(argv)
+
+    if args.command == 'add':
+        entry = track_url(args.url, 'competitor' if args.competitor else 'own', args.competitor or '', args.keyword,
+                          args.every, data_dir=args.data_dir)
+        print(f"📡 Tracking {entry['url']} every {entry['interval_hours']:g}h")
+    elif args.command == 'remove':
+        print("🗑️ Removed" if untrack_url(args.url, args.data_dir) else "Not tracked")
+    elif args.command == 'list':
+        for entry in load_registry(args.data_dir):
+            print(f"{entry['url']:<60} {entry['kind']:<10} v{entry['versions']:<3} {entry['last_status'] or '-':<12} "
+                  f"next {entry['next_check'][:16]}")
+    elif args.command == 'check':
+        result = check_urls(force=args.all, data_dir=args.data_dir)
+        for row in result['rows']:
+            print(f"  {row['status']:<12} {row['url']} {row['changes']} {row['error']}")
+        print(f"📊 {result['counts']}")
+    else:
+        entry = find_entry(args.url, args.data_dir)
+        if entry is None:
+            print("Not tracked")
+            return 1
+        for version in load_versions(entry['id'], args.data_dir):
+            print(f"v{version['version']} {version['fetched_at'][:16]} {describe_changes(version['changes'])}")
+            for section in (version['changes'] or {}).get('modified', []):
+                print(f"    ~ {section['title'] or '(intro)'}")
+                for line in section['diff']:
+                    print(f"        {line}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())